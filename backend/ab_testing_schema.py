@@ -55,6 +55,8 @@ def _init_mysql_ab_tables(conn):
             variant VARCHAR(100) NOT NULL,
             assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             ip_address VARCHAR(45),
+            ip_packed VARBINARY(16),
+            ip_prefix VARBINARY(16),
             UNIQUE KEY unique_assignment (experiment_id, user_id),
             INDEX idx_experiment_id (experiment_id),
             INDEX idx_user_id (user_id),
@@ -74,6 +76,8 @@ def _init_mysql_ab_tables(conn):
             conversion_value DECIMAL(10,2) DEFAULT 1.00,
             converted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             ip_address VARCHAR(45),
+            ip_packed VARBINARY(16),
+            ip_prefix VARBINARY(16),
             INDEX idx_experiment_id (experiment_id),
             INDEX idx_user_id (user_id),
             INDEX idx_variant (variant),
@@ -102,6 +106,39 @@ def _init_mysql_ab_tables(conn):
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
     ''')
     
+    # Packed and anonymized client addresses (see services/ip_storage.py)
+    for table in ('ab_assignments', 'ab_conversions'):
+        db_config.add_ip_columns(cursor, table)
+    
+    # Variant bucketing scheme; experiments from before hash64 keep md5 (see services/bucketing.py)
+    db_config._add_missing_columns(cursor, 'ab_experiments', {'bucketing': "VARCHAR(16) NOT NULL DEFAULT 'md5'"})
+    
+    # Experiment config version stamp (see services/experiment_registry.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ab_config_version (
+            id INT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+    ''')
+    cursor.execute('INSERT IGNORE INTO ab_config_version (id, version) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        trigger = f'trg_ab_experiments_version_{event.lower()}'
+        cursor.execute(
+            'SELECT COUNT(*) AS count FROM information_schema.TRIGGERS '
+            'WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s',
+            (trigger,)
+        )
+        if cursor.fetchone()['count'] == 0:
+            try:
+                cursor.execute(f'''
+                    CREATE TRIGGER {trigger} AFTER {event} ON ab_experiments FOR EACH ROW
+                    UPDATE ab_config_version SET version = version + 1 WHERE id = 1
+                ''')
+            except Exception as e:
+                # e.g. binary logging without SUPER; the API bumps the stamp itself
+                print(f"WARNING: Could not create {trigger}; experiment changes made outside "
+                      f"the API will not reach running workers: {str(e)}")
+    
     conn.commit()
 
 def _init_sqlite_ab_tables(conn):
@@ -133,6 +170,8 @@ def _init_sqlite_ab_tables(conn):
             variant TEXT NOT NULL,
             assigned_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             ip_address TEXT,
+            ip_packed BLOB,
+            ip_prefix BLOB,
             UNIQUE(experiment_id, user_id),
             FOREIGN KEY (experiment_id) REFERENCES ab_experiments(id) ON DELETE CASCADE
         )
@@ -149,6 +188,8 @@ def _init_sqlite_ab_tables(conn):
             conversion_value REAL DEFAULT 1.0,
             converted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             ip_address TEXT,
+            ip_packed BLOB,
+            ip_prefix BLOB,
             FOREIGN KEY (experiment_id) REFERENCES ab_experiments(id) ON DELETE CASCADE
         )
     ''')
@@ -184,6 +225,34 @@ def _init_sqlite_ab_tables(conn):
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ab_events_type ON ab_events(event_type)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ab_events_created_at ON ab_events(created_at)')
     
+    # Packed and anonymized client addresses (see services/ip_storage.py)
+    for table in ('ab_assignments', 'ab_conversions'):
+        db_config.add_ip_columns(cursor, table)
+    
+    # Integer event times for range scans and day buckets
+    for table in ('ab_assignments', 'ab_conversions', 'ab_events'):
+        db_config.add_epoch_column(cursor, table)
+    
+    # Variant bucketing scheme; experiments from before hash64 keep md5 (see services/bucketing.py)
+    db_config._add_missing_columns(cursor, 'ab_experiments', {'bucketing': "TEXT NOT NULL DEFAULT 'md5'"})
+    
+    # Experiment config version stamp (see services/experiment_registry.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ab_config_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO ab_config_version (id, version) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ab_experiments_version_{event.lower()}
+            AFTER {event} ON ab_experiments
+            BEGIN
+                UPDATE ab_config_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+    
     conn.commit()
 
 if __name__ == '__main__':
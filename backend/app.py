@@ -1,13 +1,13 @@
-from flask import Flask, request, jsonify, send_file, make_response
+from flask import Flask, Response, request, jsonify, send_file, make_response, stream_with_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import json
-import requests
 import re
 import html
 import time
@@ -15,7 +15,26 @@ from functools import wraps
 from dotenv import load_dotenv
 from database import db_config
 from routes.ab_testing import ab_testing_bp
+from routes.analytics import analytics_bp
+from routes.export import export_bp
+from routes.changes import changes_bp
 from ab_testing_schema import init_ab_testing_tables
+from services.visit_buffer import VisitBuffer, VisitBufferFullError, visit_buffer
+from services.geo_enrichment import PENDING, geo_client, geo_enrichment
+from services.geoip import local_geoip
+from services.geo_cache import geo_cache
+from rate_limiter import limiter, rate_limit
+from services.analytics_rollups import (
+    GRANULARITIES, apply_deltas, bucket_count, iter_time_series, message_deltas, read_top, read_total
+)
+from services.analytics_cache import analytics_cache
+from services.change_feed import change_feed
+from services.analytics_engine import BREAKDOWN_DIMENSIONS, analytics_engine
+from services.visitor_strings import visitor_strings
+from services.ip_storage import ip_storage
+from services.visitor_partitions import visitor_partitions
+from services.experiment_registry import experiment_registry
+from services.exposure_log import exposure_log
 
 # Load environment variables
 load_dotenv()
@@ -25,6 +44,15 @@ app = Flask(__name__)
 # Register A/B testing blueprint
 app.register_blueprint(ab_testing_bp, url_prefix='/api/ab')
 
+# Register analytics blueprint (paginated visitor rows)
+app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
+
+# Register data export blueprint (bulk CSV/NDJSON downloads)
+app.register_blueprint(export_bp, url_prefix='/api/export')
+
+# Register change feed blueprint (incremental tail by id watermark)
+app.register_blueprint(changes_bp, url_prefix='/api/changes')
+
 # Production configuration
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -40,6 +68,13 @@ class Config:
 
 app.config.from_object(Config)
 
+# Behind Render's proxy remote_addr is the proxy itself. Take the client
+# address from the X-Forwarded-For entries appended by the trusted hops, so
+# stored visits and the rate limiter key on the real client
+trusted_proxies = int(os.getenv('TRUSTED_PROXY_COUNT', 1 if app.config['FLASK_ENV'] == 'production' else 0))
+if trusted_proxies > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
+
 # Environment variable validation
 def validate_environment():
     """Validate required environment variables for production"""
@@ -77,11 +112,6 @@ else:
     CORS(app)  # Allow all origins in development
     print("CORS configured to allow all origins in development mode")
 
-# Database connection handling with retry logic
-def get_db_connection(max_retries=3, retry_delay=1):
-    """Get database connection with retry logic for cloud environments"""
-    return db_config.get_connection(max_retries, retry_delay)
-
 # Input validation and sanitization utilities
 def validate_email(email):
     """Validate email format"""
@@ -128,43 +158,6 @@ def validate_contact_data(data):
     
     return errors
 
-# Rate limiting decorator
-def rate_limit(max_requests=10, window=60):
-    """Simple rate limiting decorator"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            # Simple in-memory rate limiting (for production, use Redis or similar)
-            client_ip = request.remote_addr
-            current_time = time.time()
-            
-            # Clean up old entries (simple cleanup)
-            if not hasattr(rate_limit, 'requests'):
-                rate_limit.requests = {}
-            
-            if client_ip not in rate_limit.requests:
-                rate_limit.requests[client_ip] = []
-            
-            # Remove old requests outside the window
-            rate_limit.requests[client_ip] = [
-                req_time for req_time in rate_limit.requests[client_ip]
-                if current_time - req_time < window
-            ]
-            
-            # Check if rate limit exceeded
-            if len(rate_limit.requests[client_ip]) >= max_requests:
-                return jsonify({
-                    'error': 'Rate limit exceeded. Please try again later.',
-                    'status': 'error'
-                }), 429
-            
-            # Add current request
-            rate_limit.requests[client_ip].append(current_time)
-            
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
-
 # Error handler for consistent error responses
 @app.errorhandler(400)
 def bad_request(error):
@@ -198,22 +191,36 @@ def internal_error(error):
         'message': 'An unexpected error occurred'
     }), 500
 
+# Time-series limits for /api/analytics?from=&to=&granularity=
+ANALYTICS_MAX_BUCKETS = int(os.getenv('ANALYTICS_MAX_BUCKETS', 2000))
+ANALYTICS_STREAM_THRESHOLD = int(os.getenv('ANALYTICS_STREAM_THRESHOLD', 200))
+
 # Database setup
 def init_db():
     """Initialize database with proper error handling"""
     return db_config.init_database()
 
 # Get visitor info from IP
-def get_visitor_info(ip_address):
-    try:
-        response = requests.get(f'http://ip-api.com/json/{ip_address}', timeout=5)
-        data = response.json()
-        return {
-            'country': data.get('country', 'Unknown'),
-            'city': data.get('city', 'Unknown')
-        }
-    except:
-        return {'country': 'Unknown', 'city': 'Unknown'}
+def get_visitor_info(ip_address, allow_remote=True):
+    """Resolve an IP address to country/city.
+    
+    Cached results are returned first, then the local GeoIP database is
+    consulted; the remote geo API is only used as a fallback and its result
+    is cached. With allow_remote=False, returns None instead of making the
+    remote call.
+    """
+    location = geo_cache.get(ip_address)
+    if location:
+        return location
+    if local_geoip:
+        location = local_geoip.lookup(ip_address)
+        if location:
+            return location
+    if not allow_remote:
+        return None
+    location = geo_client.lookup(ip_address)
+    geo_cache.put(ip_address, location)
+    return location
 
 # Check if visitor is a GitHub user
 def check_github_user(user_agent):
@@ -244,37 +251,17 @@ def track_visit():
         page_visited = sanitize_input(data.get('page', '/'), max_length=500)
         referrer = sanitize_input(data.get('referrer', ''), max_length=500)
         
-        # Get location info with error handling
-        try:
-            location_info = get_visitor_info(ip_address)
-        except Exception as e:
-            print(f"Failed to get location info: {str(e)}")
-            location_info = {'country': 'Unknown', 'city': 'Unknown'}
-        
         github_user = check_github_user(user_agent)
         
-        # Use improved database connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Resolve from the local GeoIP database when possible; anything else
+        # is left to the background enrichment worker
+        location_info = get_visitor_info(ip_address, allow_remote=False)
+        if location_info is None:
+            location_info = {'country': PENDING, 'city': PENDING}
         
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                INSERT INTO visitors (ip_address, user_agent, country, city, github_user, page_visited, referrer)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                ip_address,
-                user_agent,
-                location_info['country'],
-                location_info['city'],
-                github_user,
-                page_visited,
-                referrer
-            ))
-        else:
-            cursor.execute('''
-                INSERT INTO visitors (ip_address, user_agent, country, city, github_user, page_visited, referrer)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
+        # Buffer the row; it is written in a batch by the write-behind flusher
+        try:
+            visit_buffer.add(VisitBuffer.make_row(
                 ip_address,
                 user_agent,
                 location_info['country'],
@@ -283,9 +270,14 @@ def track_visit():
                 page_visited,
                 referrer
             ))
-        
-        conn.commit()
-        conn.close()
+        except VisitBufferFullError as e:
+            print(f"Visit buffer rejected row: {str(e)}")
+            return jsonify({
+                'error': 'Visit tracking is temporarily overloaded',
+                'status': 'error'
+            }), 503
+        if location_info['country'] == PENDING:
+            geo_enrichment.wake()
         
         return jsonify({
             'status': 'success',
@@ -339,23 +331,26 @@ def send_contact_email():
         subject = sanitize_input(data.get('subject'), max_length=200)
         message = sanitize_input(data.get('message'), max_length=2000)
         
-        # Store in database with improved connection handling
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
+        # Store in database through the database writer
         if db_config.db_type == 'mysql':
-            cursor.execute('''
-                INSERT INTO contact_messages (name, email, subject, message, ip_address)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (name, email, subject, message, request.remote_addr))
+            query = '''
+                INSERT INTO contact_messages (name, email, subject, message, ip_address, ip_packed, ip_prefix)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            '''
         else:
-            cursor.execute('''
-                INSERT INTO contact_messages (name, email, subject, message, ip_address)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, email, subject, message, request.remote_addr))
+            query = '''
+                INSERT INTO contact_messages (name, email, subject, message, ip_address, ip_packed, ip_prefix)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            '''
+        params = (name, email, subject, message) + ip_storage.values(request.remote_addr)
+        deltas = message_deltas()
         
-        conn.commit()
-        conn.close()
+        def store_message(cursor):
+            cursor.execute(query, params)
+            apply_deltas(cursor, deltas)
+        
+        db_config.execute_write(store_message)
+        analytics_cache.bump()
         
         # Send email using configuration
         smtp_server = "smtp.gmail.com"
@@ -474,72 +469,117 @@ def download_resume():
             'status': 'error'
         }), 500
 
+def build_analytics_payload():
+    """Assemble the /api/analytics data payload"""
+    # Analytics reads use the read-only pool so they never block ingest
+    with db_config.connection(readonly=True) as conn:
+        cursor = conn.cursor()
+        
+        # Totals and breakdowns come from the daily rollups, so their cost
+        # does not grow with the number of visitors rows
+        total_visitors = read_total(cursor, 'total')
+        visitors_by_country = read_top(cursor, 'country', 10)
+        visitors_by_page = read_top(cursor, 'page', 50)
+        visitors_by_referrer = read_top(cursor, 'referrer', 10)
+        github_users = read_total(cursor, 'github', '1')
+        total_messages = read_total(cursor, 'messages')
+
+    return {
+        'total_visitors': total_visitors,
+        'visitors_by_country': visitors_by_country,
+        'visitors_by_page': visitors_by_page,
+        'visitors_by_referrer': visitors_by_referrer,
+        'github_users': github_users,
+        'total_messages': total_messages
+    }
+
+def parse_time_param(value):
+    """Parse an ISO 8601 date or datetime query parameter as naive UTC"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def analytics_time_series():
+    """Bucketed visit counts for ?from=&to=&granularity=, read from the rollups"""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({
+            'error': f"granularity must be one of: {', '.join(GRANULARITIES)}",
+            'status': 'error'
+        }), 400
+    try:
+        end = parse_time_param(request.args['to']) if request.args.get('to') else datetime.utcnow()
+        start = parse_time_param(request.args['from'])
+    except KeyError:
+        return jsonify({'error': 'from is required with to or granularity', 'status': 'error'}), 400
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 dates', 'status': 'error'}), 400
+    
+    buckets = bucket_count(start, end, granularity)
+    if buckets > ANALYTICS_MAX_BUCKETS:
+        return jsonify({
+            'error': f'Range covers {buckets} buckets; the maximum is {ANALYTICS_MAX_BUCKETS}',
+            'status': 'error'
+        }), 400
+    
+    header = {'from': start.isoformat(), 'to': end.isoformat(), 'granularity': granularity, 'buckets': buckets}
+    if buckets <= ANALYTICS_STREAM_THRESHOLD:
+        series = [{'bucket': bucket, 'visits': visits}
+                  for bucket, visits in iter_time_series(start, end, granularity)]
+        return jsonify({'status': 'success', 'data': dict(header, series=series)}), 200
+    
+    # Long ranges are streamed bucket by bucket instead of built in memory
+    def generate():
+        yield '{"status": "success", "data": ' + json.dumps(header)[:-1] + ', "series": ['
+        for i, (bucket, visits) in enumerate(iter_time_series(start, end, granularity)):
+            yield (',' if i else '') + json.dumps({'bucket': bucket, 'visits': visits})
+        yield ']}}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def analytics_breakdown():
+    """Visit counts grouped by ?group_by= dimensions, run on the analytics engine"""
+    dimensions = [d.strip() for d in request.args['group_by'].split(',') if d.strip()]
+    if not dimensions or len(dimensions) > 3 or any(d not in BREAKDOWN_DIMENSIONS for d in dimensions):
+        return jsonify({
+            'error': f"group_by takes 1-3 of: {', '.join(BREAKDOWN_DIMENSIONS)}",
+            'status': 'error'
+        }), 400
+    try:
+        start = parse_time_param(request.args['from']) if request.args.get('from') else None
+        end = parse_time_param(request.args['to']) if request.args.get('to') else None
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({'error': 'from and to must be ISO 8601 dates and limit a number', 'status': 'error'}), 400
+    
+    rows = analytics_engine.visitor_breakdown(dimensions, start, end, limit)
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'group_by': dimensions,
+            'from': start.isoformat() if start else None,
+            'to': end.isoformat() if end else None,
+            'engine': analytics_engine.name,
+            'rows': rows
+        }
+    }), 200
+
 @app.route('/api/analytics')
 @rate_limit(max_requests=30, window=60)  # Allow frequent analytics requests
 def get_analytics():
     try:
-        # Use improved database connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Total visitors
-        cursor.execute('SELECT COUNT(*) FROM visitors')
-        result = cursor.fetchone()
-        total_visitors = result[0] if db_config.db_type == 'sqlite' else result['COUNT(*)']
+        if request.args.get('group_by'):
+            return analytics_breakdown()
+        if any(request.args.get(param) for param in ('from', 'to', 'granularity')):
+            return analytics_time_series()
         
-        # Visitors by country
-        cursor.execute('SELECT country, COUNT(*) as count FROM visitors GROUP BY country ORDER BY count DESC LIMIT 10')
-        visitors_by_country = []
-        for row in cursor.fetchall():
-            if db_config.db_type == 'mysql':
-                visitors_by_country.append([row['country'], row['count']])
-            else:
-                visitors_by_country.append([row[0], row[1]])
-        
-        # Visitors by page
-        cursor.execute('SELECT page_visited, COUNT(*) as count FROM visitors GROUP BY page_visited ORDER BY count DESC')
-        visitors_by_page = []
-        for row in cursor.fetchall():
-            if db_config.db_type == 'mysql':
-                visitors_by_page.append([row['page_visited'], row['count']])
-            else:
-                visitors_by_page.append([row[0], row[1]])
-        
-        # Recent visitors
-        cursor.execute('SELECT * FROM visitors ORDER BY timestamp DESC LIMIT 20')
-        recent_visitors = []
-        for row in cursor.fetchall():
-            if db_config.db_type == 'mysql':
-                recent_visitors.append([
-                    row['id'], row['ip_address'], row['user_agent'], 
-                    str(row['timestamp']), row['country'], row['city'],
-                    row['github_user'], row['page_visited'], row['referrer']
-                ])
-            else:
-                recent_visitors.append(list(row))
-        
-        # GitHub users
-        cursor.execute('SELECT COUNT(*) FROM visitors WHERE github_user IS NOT NULL')
-        result = cursor.fetchone()
-        github_users = result[0] if db_config.db_type == 'sqlite' else result['COUNT(*)']
-        
-        # Contact messages
-        cursor.execute('SELECT COUNT(*) FROM contact_messages')
-        result = cursor.fetchone()
-        total_messages = result[0] if db_config.db_type == 'sqlite' else result['COUNT(*)']
-        
-        conn.close()
+        # Served from cache until a write bumps the version or the TTL lapses
+        data = analytics_cache.get_or_compute('summary', build_analytics_payload)
         
         return jsonify({
             'status': 'success',
-            'data': {
-                'total_visitors': total_visitors,
-                'visitors_by_country': visitors_by_country,
-                'visitors_by_page': visitors_by_page,
-                'recent_visitors': recent_visitors,
-                'github_users': github_users,
-                'total_messages': total_messages
-            }
+            'data': data
         }), 200
     
     except Exception as e:
@@ -580,16 +620,31 @@ def health_check():
     """Health check endpoint for monitoring"""
     try:
         # Test database connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT 1')
-        conn.close()
+        with db_config.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
         
         # Add CORS headers directly to this response for better debugging
         response = jsonify({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
             'version': '1.0.0',
+            'database_pool': db_config.pool_stats(),
+            'database_read_pool': db_config.pool_stats(readonly=True),
+            'database_writer': db_config.writer_stats(),
+            'visit_buffer': visit_buffer.stats(),
+            'geo_enrichment': geo_enrichment.stats(),
+            'geoip_database': local_geoip.stats() if local_geoip else None,
+            'geo_cache': geo_cache.stats(),
+            'rate_limiter': limiter.stats(),
+            'analytics_cache': analytics_cache.stats(),
+            'change_feed': change_feed.stats(),
+            'analytics_engine': analytics_engine.stats(),
+            'visitor_strings': visitor_strings.stats(),
+            'ip_storage': ip_storage.stats(),
+            'visitor_partitions': visitor_partitions.stats(),
+            'experiment_registry': experiment_registry.stats(),
+            'exposure_log': exposure_log.stats(),
             'cors_config': {
                 'origins': app.config['CORS_ORIGINS'],
                 'env': app.config['FLASK_ENV']
@@ -624,12 +679,19 @@ if __name__ == '__main__':
     # Validate environment variables
     validate_environment()
     
+    # Flush buffered visits before exiting on SIGTERM
+    db_config.install_signal_handlers()
+    
+    # Monthly rotation and retention of the visitors table (VISITOR_PARTITIONS)
+    visitor_partitions.start()
+    
     # Initialize database
     init_db()
     
     # Initialize A/B testing tables
     try:
         init_ab_testing_tables()
+        experiment_registry.load()
         print("A/B testing functionality initialized successfully")
     except Exception as e:
         print(f"Warning: Failed to initialize A/B testing tables: {str(e)}")
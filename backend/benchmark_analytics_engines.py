@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the sql and duckdb analytics engines on the same data.
+
+Fills a scratch SQLite database with synthetic visits and A/B events, then
+times the breakdown and variant stats queries on both engines (DuckDB reads
+a Parquet snapshot; its build time is reported separately):
+
+    pip install duckdb
+    python benchmark_analytics_engines.py            # 500k visits
+    python benchmark_analytics_engines.py 2000000
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'engine_bench.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from services.analytics_engine import DuckDBAnalyticsEngine, SQLAnalyticsEngine, duckdb
+
+QUERIES = [
+    ('country', lambda e: e.visitor_breakdown(['country'])),
+    ('country x page x day', lambda e: e.visitor_breakdown(['country', 'page', 'day'], limit=1000)),
+    ('referrer, last 30 days', lambda e: e.visitor_breakdown(
+        ['referrer'], datetime(2024, 12, 1), datetime(2024, 12, 31))),
+    ('github x hour', lambda e: e.visitor_breakdown(['github', 'hour'], limit=1000)),
+    ('A/B variant stats', lambda e: e.variant_stats('bench')),
+]
+
+
+def seed(visits, batch_size=50000):
+    rng = random.Random(42)
+    countries = [f'Country {i}' for i in range(120)] + [None]
+    pages = [f'/page/{i}' for i in range(200)]
+    referrers = [''] + [f'https://ref{i}.example' for i in range(50)]
+    start = datetime(2024, 1, 1)
+
+    def rows(count):
+        for _ in range(count):
+            moment = start + timedelta(seconds=rng.randrange(365 * 86400))
+            yield (f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}', 'bench-agent',
+                   moment.strftime('%Y-%m-%d %H:%M:%S'), rng.choice(countries), 'City',
+                   'octocat' if rng.random() < 0.1 else None, rng.choice(pages), rng.choice(referrers))
+
+    for offset in range(0, visits, batch_size):
+        batch = list(rows(min(batch_size, visits - offset)))
+        db_config.execute_write(lambda cursor: cursor.executemany('''
+            INSERT INTO visitors (ip_address, user_agent, timestamp, country, city, github_user, page_visited, referrer)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch))
+
+    assignments = visits // 5
+    variants = ['control', 'treatment_a', 'treatment_b']
+
+    def write_ab(cursor):
+        cursor.execute('''
+            INSERT INTO ab_experiments (id, name, variants, traffic_split, status)
+            VALUES ('bench', 'Benchmark', '[]', '{}', 'active')
+        ''')
+        cursor.executemany(
+            "INSERT INTO ab_assignments (experiment_id, user_id, variant, assigned_at) VALUES ('bench', ?, ?, ?)",
+            [(f'user{i}', variants[i % 3], f'2024-{1 + i % 12:02d}-15 12:00:00') for i in range(assignments)]
+        )
+        cursor.executemany(
+            "INSERT INTO ab_conversions (experiment_id, user_id, variant, conversion_type, conversion_value) "
+            "VALUES ('bench', ?, ?, 'signup', ?)",
+            [(f'user{i}', variants[i % 3], rng.random() * 100) for i in range(0, assignments, 7)]
+        )
+    db_config.execute_write(write_ab)
+
+
+def time_query(engine, query, runs):
+    query(engine)  # warm up caches and the snapshot
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        query(engine)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    if duckdb is None:
+        print("duckdb is not installed; run `pip install duckdb` first")
+        sys.exit(1)
+    visits = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    runs = 5
+
+    db_config.init_database()
+    init_ab_testing_tables()
+    started = time.perf_counter()
+    seed(visits)
+    print(f"Seeded {visits:,} visits in {time.perf_counter() - started:.1f}s")
+
+    sql = SQLAnalyticsEngine()
+    duck = DuckDBAnalyticsEngine(mode='snapshot', snapshot_dir=tempfile.mkdtemp())
+    started = time.perf_counter()
+    duck.refresh()
+    print(f"Built Parquet snapshot in {time.perf_counter() - started:.1f}s")
+
+    print(f"=== Analytics engine benchmark (median of {runs} runs) ===")
+    print(f"{'query':<26}{'sql':>12}{'duckdb':>12}{'speedup':>10}")
+    for label, query in QUERIES:
+        sql_time = time_query(sql, query, runs)
+        duck_time = time_query(duck, query, runs)
+        print(f"{label:<26}{sql_time * 1000:>10.1f}ms{duck_time * 1000:>10.1f}ms{sql_time / duck_time:>9.1f}x")
+
+    duck.close()
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
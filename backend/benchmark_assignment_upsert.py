@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Latency and error report for first-time variant assignment under
+concurrency (see store_assignment() in routes/ab_testing.py).
+
+Sends bursts of simultaneous first requests for the same users through the
+old read-then-insert path (SELECT ab_assignments, SELECT ab_experiments,
+INSERT) and through the single upsert, and prints errors and latency
+percentiles for each:
+
+    python benchmark_assignment_upsert.py              # 2000 users, 4 requests each, 32 threads
+    python benchmark_assignment_upsert.py 5000 8 64
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'upsert_bench.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from routes.ab_testing import assign_variant, store_assignment
+from services.experiment_registry import experiment_registry
+from services.ip_storage import ip_storage
+
+
+def create_experiment(experiment_id):
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "INSERT INTO ab_experiments (id, name, description, variants, traffic_split, status) "
+        "VALUES (?, 'Bench', 'd', ?, ?, 'active')",
+        (experiment_id, json.dumps(['control', 'b']), json.dumps({'control': 50, 'b': 50}))
+    ))
+
+
+def read_then_insert(experiment_id, user_id):
+    """The assignment path before the upsert"""
+    with db_config.connection() as conn:
+        row = conn.execute('SELECT variant FROM ab_assignments WHERE experiment_id = ? AND user_id = ?',
+                           (experiment_id, user_id)).fetchone()
+        if row:
+            return row[0]
+        traffic_split = json.loads(conn.execute('SELECT traffic_split FROM ab_experiments WHERE id = ?',
+                                                (experiment_id,)).fetchone()[0])
+    variant = assign_variant(experiment_id, user_id, traffic_split)
+    params = (experiment_id, user_id, variant) + ip_storage.values('10.0.0.1')
+    db_config.execute_write(lambda cursor: cursor.execute(
+        'INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix) '
+        'VALUES (?, ?, ?, ?, ?, ?)', params
+    ))
+    return variant
+
+
+def upsert(experiment_id, user_id):
+    experiment = experiment_registry.get(experiment_id)
+    return store_assignment(experiment_id, user_id, experiment.assign(user_id), '10.0.0.1')[0]
+
+
+def run(assign, experiment_id, users, repeats, threads):
+    def timed(user_id):
+        started = time.perf_counter()
+        try:
+            assign(experiment_id, user_id)
+            error = False
+        except Exception:
+            error = True
+        return (time.perf_counter() - started) * 1000, error
+
+    # Each user's requests arrive back to back, as from a page firing several calls
+    calls = [f'user{i}' for i in range(users) for _ in range(repeats)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(timed, calls))
+    elapsed = time.perf_counter() - started
+    timings = sorted(ms for ms, _ in results)
+    return {
+        'errors': sum(error for _, error in results),
+        'p50 (ms)': statistics.median(timings),
+        'p99 (ms)': timings[int(len(timings) * 0.99) - 1],
+        'requests/s': len(results) / elapsed,
+    }
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    db_config.init_database()
+    init_ab_testing_tables()
+    create_experiment('bench-old')
+    create_experiment('bench-upsert')
+
+    before = run(read_then_insert, 'bench-old', users, repeats, threads)
+    after = run(upsert, 'bench-upsert', users, repeats, threads)
+    print(f"{users:,} users x {repeats} simultaneous first requests, {threads} threads")
+    print(f"{'':<14}{'read+insert':>14}{'upsert':>12}")
+    for label in before:
+        spec = ',' if label == 'errors' else ',.1f'
+        print(f"{label:<14}{before[label]:>14{spec}}{after[label]:>12{spec}}")
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
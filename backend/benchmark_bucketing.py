@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Per-call cost of variant assignment (see services/bucketing.py).
+
+Times the original assign_variant() (md5 hex digest, int conversion,
+linear walk over the split) against the registry's Bucketer with the md5
+and hash64 schemes, for a two-way and a ten-way split:
+
+    python benchmark_bucketing.py            # 200k calls per case
+    python benchmark_bucketing.py 1000000
+"""
+
+import sys
+import time
+
+from routes.ab_testing import assign_variant
+from services.bucketing import Bucketer
+
+SPLITS = {
+    '2 variants': {'control': 50, 'b': 50},
+    '10 variants': {f'v{i}': 10 for i in range(10)},
+}
+
+
+def ns_per_call(assign, users, runs=7):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for user_id in users:
+            assign(user_id)
+        timings.append((time.perf_counter() - started) / len(users) * 1e9)
+    return min(timings)  # the least disturbed run
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    # Ids shaped like get_user_id()'s md5 hex digests
+    users = [f'{i * 2654435761 % (1 << 128):032x}' for i in range(calls)]
+    print(f"{'ns per call':<14}{'assign_variant':>16}{'md5 table':>12}{'hash64':>10}")
+    for label, split in SPLITS.items():
+        md5 = Bucketer('bench-experiment', split, 'md5')
+        fast = Bucketer('bench-experiment', split, 'hash64')
+        legacy = ns_per_call(lambda user_id: assign_variant('bench-experiment', user_id, split), users)
+        print(f"{label:<14}{legacy:>16.0f}{ns_per_call(md5.assign, users):>12.0f}"
+              f"{ns_per_call(fast.assign, users):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
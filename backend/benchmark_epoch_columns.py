@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark hour/day bucketing and time-range scans before and after the
+integer epoch columns (see migrate_epoch_columns.py).
+
+Fills a scratch SQLite database laid out the old way (text timestamps only)
+with a year of visits and A/B assignments, times the queries on the text
+columns, runs the migration and times the same queries through the
+analytics engine:
+
+    python benchmark_epoch_columns.py            # 5M visits, 1M assignments
+    python benchmark_epoch_columns.py 1000000
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'epoch_bench.db').lstrip('/')
+
+from database import DatabaseConfig, db_config
+from ab_testing_schema import init_ab_testing_tables
+from migrate_epoch_columns import migrate
+from services.analytics_engine import SQLAnalyticsEngine
+
+RANGE = (datetime(2024, 6, 1), datetime(2024, 7, 1))
+
+# label -> (query on the text timestamps, the same question through the engine)
+QUERIES = [
+    ('visits per day', '''
+        SELECT strftime('%Y-%m-%d', timestamp) AS day, COUNT(*) AS visits FROM visitors
+        GROUP BY 1 ORDER BY visits DESC, 1 LIMIT 1000
+     ''', lambda engine: engine.visitor_breakdown(['day'], limit=1000)),
+    ('visits per hour, 30 days', '''
+        SELECT strftime('%Y-%m-%d %H:00:00', timestamp) AS hour, COUNT(*) AS visits FROM visitors
+        WHERE timestamp >= '2024-06-01 00:00:00' AND timestamp < '2024-07-01 00:00:00'
+        GROUP BY 1 ORDER BY visits DESC, 1 LIMIT 1000
+     ''', lambda engine: engine.visitor_breakdown(['hour'], *RANGE, limit=1000)),
+    ('country x day, 30 days', '''
+        SELECT COALESCE(country, 'Unknown'), strftime('%Y-%m-%d', timestamp), COUNT(*) AS visits FROM visitors
+        WHERE timestamp >= '2024-06-01 00:00:00' AND timestamp < '2024-07-01 00:00:00'
+        GROUP BY 1, 2 ORDER BY visits DESC, 1, 2 LIMIT 1000
+     ''', lambda engine: engine.visitor_breakdown(['country', 'day'], *RANGE, limit=1000)),
+    ('A/B active days', '''
+        SELECT variant, COUNT(*), COUNT(DISTINCT DATE(assigned_at)) FROM ab_assignments
+        WHERE experiment_id = 'bench' GROUP BY variant
+     ''', lambda engine: engine.variant_stats('bench')),
+]
+
+
+def legacy_layout():
+    """Drop the epoch columns so the tables look like they did before them"""
+    conn = db_config.get_connection()
+    for table, column in DatabaseConfig.EVENT_TIME_COLUMNS.items():
+        epoch = f'{column}_epoch'
+        conn.execute(f'DROP TRIGGER IF EXISTS trg_{table}_{epoch}')
+        conn.execute(f'DROP INDEX IF EXISTS idx_{table}_{epoch}')
+        conn.execute(f'ALTER TABLE {table} DROP COLUMN {epoch}')
+    conn.commit()
+    conn.close()
+
+
+def seed(visits):
+    # One year of second-resolution timestamps, generated inside SQLite
+    conn = db_config.get_connection()
+    conn.execute(f'''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {int(visits)})
+        INSERT INTO visitors (ip_address, timestamp, country, city, page_visited, referrer)
+        SELECT '10.0.0.1', datetime(1704067200 + abs(random()) % 31536000, 'unixepoch'),
+               'Country ' || (abs(random()) % 120), 'City', '/page/' || (abs(random()) % 200), ''
+        FROM n
+    ''')
+    conn.execute("""
+        INSERT INTO ab_experiments (id, name, variants, traffic_split, status)
+        VALUES ('bench', 'Benchmark', '[]', '{}', 'active')
+    """)
+    conn.execute(f'''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {int(visits) // 5})
+        INSERT INTO ab_assignments (experiment_id, user_id, variant, assigned_at)
+        SELECT 'bench', 'user' || i, 'variant_' || (i % 3),
+               datetime(1704067200 + abs(random()) % 31536000, 'unixepoch')
+        FROM n
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def median_ms(run, runs=5):
+    run()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    visits = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+    db_config.init_database()
+    init_ab_testing_tables()
+    legacy_layout()
+
+    started = time.perf_counter()
+    seed(visits)
+    print(f"Seeded {visits:,} visits and {visits // 5:,} assignments in {time.perf_counter() - started:.1f}s")
+
+    def legacy(sql):
+        def run():
+            with db_config.connection(readonly=True) as conn:
+                conn.execute(sql).fetchall()
+        return run
+    before = {label: median_ms(legacy(sql)) for label, sql, _ in QUERIES}
+
+    started = time.perf_counter()
+    migrate(log=lambda message: None)
+    print(f"Migrated in {time.perf_counter() - started:.1f}s")
+
+    engine = SQLAnalyticsEngine()
+    print(f"{'query':<28}{'text':>12}{'epoch':>12}{'speedup':>10}")
+    for label, _, query in QUERIES:
+        after = median_ms(lambda: query(engine))
+        print(f"{label:<28}{before[label]:>10.1f}ms{after:>10.1f}ms{before[label] / after:>9.1f}x")
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
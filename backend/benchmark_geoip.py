@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for GeoIP lookups.
+
+Builds a synthetic database (or uses the one given on the command line) and
+measures lookup throughput for IPv4 and IPv6 addresses:
+
+    python benchmark_geoip.py               # synthetic 200k IPv4 + 50k IPv6 ranges
+    python benchmark_geoip.py geoip.bin     # an existing database
+"""
+
+import ipaddress
+import os
+import random
+import sys
+import tempfile
+import time
+from services.geoip import GeoIPDatabase, build_database
+
+
+def synthetic_ranges(v4_count=200000, v6_count=50000, seed=42):
+    """Generate non-overlapping ranges spread over the address spaces"""
+    rng = random.Random(seed)
+    countries = [f'Country {i}' for i in range(250)]
+    
+    v4_step = (2 ** 32) // v4_count
+    for i in range(v4_count):
+        start = i * v4_step
+        yield (str(ipaddress.IPv4Address(start)),
+               str(ipaddress.IPv4Address(start + v4_step // 2)),
+               rng.choice(countries), f'City {rng.randrange(5000)}')
+    
+    base = int(ipaddress.IPv6Address('2000::'))
+    v6_step = 2 ** 96
+    for i in range(v6_count):
+        start = base + i * v6_step
+        yield (str(ipaddress.IPv6Address(start)),
+               str(ipaddress.IPv6Address(start + v6_step // 2)),
+               rng.choice(countries), f'City {rng.randrange(5000)}')
+
+
+def time_lookups(database, addresses):
+    started = time.perf_counter()
+    hits = 0
+    for address in addresses:
+        if database.lookup(address) is not None:
+            hits += 1
+    elapsed = time.perf_counter() - started
+    return elapsed, hits
+
+
+def main():
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'geoip_bench.bin')
+        started = time.perf_counter()
+        stats = build_database(synthetic_ranges(), path)
+        print(f"Built synthetic database in {time.perf_counter() - started:.2f}s: {stats}")
+    
+    database = GeoIPDatabase(path)
+    rng = random.Random(7)
+    samples = 200000
+    v4_addresses = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(samples)]
+    v6_addresses = [str(ipaddress.IPv6Address(int(ipaddress.IPv6Address('2000::')) + rng.getrandbits(100)))
+                    for _ in range(samples)]
+    
+    print(f"=== GeoIP lookup benchmark ({samples} lookups each) ===")
+    for label, addresses in (('IPv4', v4_addresses), ('IPv6', v6_addresses)):
+        elapsed, hits = time_lookups(database, addresses)
+        print(f"{label}: {samples / elapsed:,.0f} lookups/s, "
+              f"{elapsed / samples * 1e6:.2f} µs/lookup, {hits} hits")
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Size and latency report for packed IP address storage.
+
+Fills a scratch SQLite database with visits whose addresses are stored the
+old way (ip_address text only; a tenth of them IPv6), times a "visits from
+this /24" lookup, then runs the packing migration and prints the address
+bytes, storage and lookup latency before and after:
+
+    python benchmark_ip_storage.py                 # 300k visits, --mode packed
+    python benchmark_ip_storage.py 1000000 anonymized
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'ip_bench.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from migrate_ip_storage import run
+from services.ip_storage import network_filter
+
+
+def synthetic_addresses(count, seed=42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        if rng.random() < 0.1:
+            yield (f'2001:db8:{rng.randrange(0x10000):x}:{rng.randrange(0x10000):x}::{rng.randrange(0x10000):x}',)
+        else:
+            yield (f'{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}',)
+
+
+def network_latency(query, params, runs=20):
+    """Median milliseconds of one network lookup"""
+    timings = []
+    with db_config.connection(readonly=True) as conn:
+        for _ in range(runs):
+            started = time.perf_counter()
+            conn.execute(query, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    visits = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    mode = sys.argv[2] if len(sys.argv) > 2 else 'packed'
+    db_config.init_database()
+    init_ab_testing_tables()
+
+    started = time.perf_counter()
+    rows = list(synthetic_addresses(visits))
+    for offset in range(0, visits, 50000):
+        batch = rows[offset:offset + 50000]
+        db_config.execute_write(lambda cursor: cursor.executemany(
+            "INSERT INTO visitors (ip_address, country, page_visited) VALUES (?, 'Korea', '/')", batch
+        ))
+    print(f"Seeded {visits:,} plain-text visits in {time.perf_counter() - started:.1f}s")
+
+    network = rows[0][0].rsplit('.', 1)[0]
+    before = network_latency(
+        "SELECT id FROM visitors WHERE ip_address LIKE ? ORDER BY id DESC LIMIT 100", (network + '.%',)
+    )
+    run(mode=mode, batch_size=20000)
+    condition, params = network_filter(network + '.0/24')
+    after = network_latency(f"SELECT id FROM visitors WHERE {condition} ORDER BY id DESC LIMIT 100", params)
+    print(f"{'/24 lookup (ms)':<22}{before:>29.2f}{after:>28.2f}")
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
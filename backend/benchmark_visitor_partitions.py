@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Disk and query cost of the visitors table before and after monthly
+partitioning with a retention window (see services/visitor_partitions.py).
+
+Fills a scratch SQLite database with two years of visits in one table,
+times a 30-day breakdown, an all-time breakdown and a recent-visitors page,
+then rotates every closed month into its partition, drops those outside a
+12-month window, vacuums and runs the same queries again:
+
+    python benchmark_visitor_partitions.py            # 2.4M visits over 24 months
+    python benchmark_visitor_partitions.py 6000000 6
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'partition_bench.db').lstrip('/')
+
+from database import db_config
+from partition_visitors import file_bytes
+from services.analytics_engine import SQLAnalyticsEngine
+from services.visitor_partitions import VisitorPartitions
+from services.visitor_strings import visitor_select
+
+START = 1672531200  # 2023-01-01
+SPAN = 730 * 86400
+NOW = datetime(2025, 1, 5)
+LAST_30_DAYS = (datetime(2024, 12, 1), datetime(2024, 12, 31))
+
+
+def seed(visits):
+    # Evenly spread over two years, so ids grow with time as they do live
+    conn = db_config.get_connection()
+    conn.execute(f'''
+        WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {int(visits) - 1})
+        INSERT INTO visitors (ip_address, timestamp, timestamp_epoch, country, city, page_visited, referrer)
+        SELECT '10.0.0.1', datetime(epoch, 'unixepoch'), epoch,
+               'Country ' || (abs(random()) % 120), 'City', '/page/' || (abs(random()) % 200), ''
+        FROM (SELECT {START} + i * {SPAN} / {int(visits)} AS epoch FROM n)
+    ''')
+    conn.commit()
+    conn.close()
+    # Empty rollups are filled from the seeded visits at startup
+    db_config.init_database()
+
+
+def median_ms(run, runs=5):
+    run()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def recent_page(partitions):
+    select, source = visitor_select(['id', 'timestamp', 'country', 'page_visited'], source=partitions.source())
+
+    def run():
+        with db_config.connection(readonly=True) as conn:
+            conn.execute(f'SELECT {select} FROM {source} ORDER BY id DESC LIMIT 50').fetchall()
+    return run
+
+
+def measure(engine, partitions):
+    return {
+        'country x day, 30 days': median_ms(
+            lambda: engine.visitor_breakdown(['country', 'day'], *LAST_30_DAYS, limit=1000)),
+        'visits per day, all': median_ms(lambda: engine.visitor_breakdown(['day'], limit=1000)),
+        'recent visitors page': median_ms(recent_page(partitions)),
+    }
+
+
+def main():
+    visits = int(sys.argv[1]) if len(sys.argv) > 1 else 2400000
+    retention = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    db_config.init_database()
+
+    started = time.perf_counter()
+    seed(visits)
+    print(f"Seeded {visits:,} visits in {time.perf_counter() - started:.1f}s")
+
+    engine = SQLAnalyticsEngine()
+    partitions = VisitorPartitions(mode='monthly', retention_months=retention)
+    size_before = file_bytes()
+    before = measure(engine, partitions)
+
+    started = time.perf_counter()
+    moved = partitions.rotate(NOW)
+    rotated_in = time.perf_counter() - started
+    started = time.perf_counter()
+    dropped = partitions.apply_retention(NOW)
+    pages = partitions.vacuum()
+    db_config.get_connection().execute('PRAGMA wal_checkpoint(TRUNCATE)').close()
+    print(f"Moved {moved:,} visits in {rotated_in:.1f}s; dropped {dropped:,} and "
+          f"freed {pages:,} pages in {time.perf_counter() - started:.1f}s")
+
+    after = measure(engine, partitions)
+    print(f"{'':<26}{'one table':>12}{'partitioned':>14}")
+    print(f"{'file size (MB)':<26}{size_before / 1e6:>12.1f}{file_bytes() / 1e6:>14.1f}")
+    for label in before:
+        print(f"{label + ' (ms)':<26}{before[label]:>12.1f}{after[label]:>14.1f}")
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
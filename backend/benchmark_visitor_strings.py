@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Size and latency report for dictionary-encoded visitor strings.
+
+Fills a scratch SQLite database with visits stored the old way (full
+user_agent, page_visited and referrer text on every row), then runs the
+normalizing migration and prints storage and breakdown latency before and
+after:
+
+    python benchmark_visitor_strings.py            # 300k visits
+    python benchmark_visitor_strings.py 1000000
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'strings_bench.db').lstrip('/')
+
+from database import db_config
+from migrate_visitor_strings import run
+
+
+def synthetic_visits(count, seed=42):
+    """Visits with realistic repetition: few agents and pages, a long referrer tail"""
+    rng = random.Random(seed)
+    agents = [f'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+              f'Chrome/{100 + i}.0.{rng.randrange(6000)}.{rng.randrange(200)} Safari/537.36' for i in range(400)]
+    pages = [f'/projects/{i}/details' for i in range(150)]
+    referrers = [''] * 50 + [f'https://www.example{i}.com/articles/{rng.randrange(10 ** 6)}' for i in range(3000)]
+    for i in range(count):
+        yield (f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}',
+               agents[min(int(rng.expovariate(0.05)), len(agents) - 1)], 'Korea', 'Seoul',
+               rng.choice(pages), rng.choice(referrers))
+
+
+def main():
+    visits = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    db_config.init_database()
+
+    started = time.perf_counter()
+    rows = list(synthetic_visits(visits))
+    for offset in range(0, visits, 50000):
+        batch = rows[offset:offset + 50000]
+        db_config.execute_write(lambda cursor: cursor.executemany('''
+            INSERT INTO visitors (ip_address, user_agent, country, city, page_visited, referrer)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', batch))
+    print(f"Seeded {visits:,} plain-text visits in {time.perf_counter() - started:.1f}s")
+
+    run(normalize=True, batch_size=20000)
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Build the binary GeoIP database used by services/geoip.py from a CSV file.
+
+The CSV needs one IP range per row: start address, end address, country and
+city. Column positions are configurable so DB-IP / IP2Location style exports
+can be converted directly, e.g. for the DB-IP "IP to City Lite" CSV:
+
+    python build_geoip_db.py dbip-city-lite.csv geoip.bin --country-col 3 --city-col 5
+"""
+
+import argparse
+import csv
+import gzip
+import sys
+import time
+from services.geoip import GeoIPDatabase, build_database
+
+
+def read_ranges(path, start_col, end_col, country_col, city_col, skip_header):
+    """Yield (start_ip, end_ip, country, city) tuples from a CSV file"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        if skip_header:
+            next(reader, None)
+        for row in reader:
+            if not row or row[0].startswith('#'):
+                continue
+            city = row[city_col] if city_col is not None and city_col < len(row) else ''
+            yield row[start_col], row[end_col], row[country_col], city
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert an IP range CSV into a GeoIP binary database')
+    parser.add_argument('csv_path', help='Input CSV (optionally .gz)')
+    parser.add_argument('output_path', help='Binary database to write')
+    parser.add_argument('--start-col', type=int, default=0)
+    parser.add_argument('--end-col', type=int, default=1)
+    parser.add_argument('--country-col', type=int, default=2)
+    parser.add_argument('--city-col', type=int, default=3)
+    parser.add_argument('--skip-header', action='store_true', help='Ignore the first CSV row')
+    args = parser.parse_args()
+    
+    started = time.time()
+    try:
+        stats = build_database(
+            read_ranges(args.csv_path, args.start_col, args.end_col,
+                        args.country_col, args.city_col, args.skip_header),
+            args.output_path
+        )
+    except (OSError, ValueError) as e:
+        print(f"❌ Failed to build GeoIP database: {e}")
+        sys.exit(1)
+    
+    # Re-open the result to make sure it parses
+    GeoIPDatabase(args.output_path).close()
+    
+    print(f"✅ Wrote {args.output_path} in {time.time() - started:.1f}s")
+    for key, value in stats.items():
+        print(f"   {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
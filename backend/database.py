@@ -4,22 +4,471 @@ Database configuration and connection handling for portfolio backend.
 Supports both SQLite (development) and MySQL (production).
 """
 
+import atexit
 import os
+import pathlib
+import queue
+import signal
 import sqlite3
 import pymysql
+import threading
 import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from urllib.parse import urlparse
 from dotenv import load_dotenv
 
 load_dotenv()
 
+class PoolTimeoutError(Exception):
+    """Raised when no pooled database connection becomes available in time"""
+
+
+class WriteQueueFullError(Exception):
+    """Raised when the database write queue stays full past the submit timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections.
+    
+    Idle connections are kept in a LIFO list so the warmest connection is
+    reused first. With ``thread_affinity`` enabled (used for SQLite) a thread
+    gets back the connection it released last whenever that one is idle.
+    """
+    
+    def __init__(self, connect, validate, min_size=1, max_size=10,
+                 idle_timeout=300, checkout_timeout=30, thread_affinity=False):
+        self._connect = connect
+        self._validate = validate
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.thread_affinity = thread_affinity
+        
+        self._cond = threading.Condition()
+        self._idle = []  # [(conn, owner_thread_ident, released_at)]
+        self._size = 0
+        self._closed = False
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'evicted': 0,
+            'invalidated': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'peak_in_use': 0
+        }
+    
+    def acquire(self):
+        """Check out a live connection, waiting up to checkout_timeout seconds"""
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+        
+        while True:
+            expired = []
+            conn = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeoutError('Database connection pool is closed')
+                expired = self._evict_idle_locked()
+                
+                if self._idle:
+                    conn = self._pop_idle_locked()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f'Timed out after {self.checkout_timeout}s waiting for a database connection'
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+            
+            self._close_all(expired)
+            
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._counters['created'] += 1
+            elif conn is not None and not self._is_alive(conn):
+                self._discard(conn)
+                with self._cond:
+                    self._counters['invalidated'] += 1
+                continue
+            
+            if conn is not None:
+                self._record_checkout(started, waited)
+                return conn
+    
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if it is unusable"""
+        if not discard:
+            try:
+                # End any open transaction so the next borrower starts clean
+                conn.rollback()
+            except Exception:
+                discard = True
+        
+        if discard:
+            self._discard(conn)
+            return
+        
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                close_now = True
+            else:
+                self._idle.append((conn, threading.get_ident(), time.monotonic()))
+                close_now = False
+            self._cond.notify()
+        
+        if close_now:
+            self._close_all([conn])
+    
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._idle = []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_all(idle)
+    
+    def stats(self):
+        """Return occupancy and checkout wait counters"""
+        with self._cond:
+            in_use = self._size - len(self._idle)
+            checkouts = self._counters['checkouts']
+            stats = dict(self._counters)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'occupancy': round(in_use / self.max_size, 3),
+                'avg_wait_ms': round(stats['total_wait_ms'] / checkouts, 3) if checkouts else 0.0
+            })
+        stats['total_wait_ms'] = round(stats['total_wait_ms'], 3)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 3)
+        return stats
+    
+    def _pop_idle_locked(self):
+        if self.thread_affinity:
+            ident = threading.get_ident()
+            for index in range(len(self._idle) - 1, -1, -1):
+                if self._idle[index][1] == ident:
+                    return self._idle.pop(index)[0]
+        return self._idle.pop()[0]
+    
+    def _evict_idle_locked(self):
+        """Remove connections idle longer than idle_timeout, keeping min_size open"""
+        if not self.idle_timeout:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        kept = []
+        # Oldest entries sit at the front of the list
+        for entry in self._idle:
+            if entry[2] < cutoff and self._size - len(expired) > self.min_size:
+                expired.append(entry[0])
+            else:
+                kept.append(entry)
+        if expired:
+            self._idle = kept
+            self._size -= len(expired)
+            self._counters['evicted'] += len(expired)
+        return expired
+    
+    def _record_checkout(self, started, waited):
+        wait_ms = (time.monotonic() - started) * 1000
+        with self._cond:
+            self._counters['checkouts'] += 1
+            if waited:
+                self._counters['waits'] += 1
+            self._counters['total_wait_ms'] += wait_ms
+            self._counters['max_wait_ms'] = max(self._counters['max_wait_ms'], wait_ms)
+            in_use = self._size - len(self._idle)
+            self._counters['peak_in_use'] = max(self._counters['peak_in_use'], in_use)
+    
+    def _is_alive(self, conn):
+        try:
+            self._validate(conn)
+            return True
+        except Exception:
+            return False
+    
+    def _discard(self, conn):
+        self._close_all([conn])
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+    
+    @staticmethod
+    def _close_all(connections):
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class SQLiteMaintenance:
+    """Background thread that keeps a WAL-mode SQLite database in shape.
+    
+    Runs ``wal_checkpoint(PASSIVE)`` so the WAL file does not grow without
+    bound between automatic checkpoints, and ``PRAGMA optimize`` so the query
+    planner statistics stay current. Passive checkpoints never block readers
+    or writers.
+    """
+    
+    def __init__(self, db_path, checkpoint_interval=60, optimize_interval=3600):
+        self.db_path = db_path
+        self.checkpoint_interval = checkpoint_interval
+        self.optimize_interval = optimize_interval
+        self.last_checkpoint = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sqlite-maintenance', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+    
+    def _run(self):
+        next_optimize = time.monotonic() + self.optimize_interval
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                conn = sqlite3.connect(self.db_path, timeout=5)
+                try:
+                    busy, wal_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+                    self.last_checkpoint = {
+                        'busy': busy,
+                        'wal_pages': wal_pages,
+                        'checkpointed_pages': checkpointed,
+                        'at': time.time()
+                    }
+                    if time.monotonic() >= next_optimize:
+                        conn.execute('PRAGMA optimize')
+                        next_optimize = time.monotonic() + self.optimize_interval
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"SQLite maintenance failed: {str(e)}")
+
+
+class SQLiteWriter:
+    """Single writer thread that owns the only SQLite write connection.
+    
+    Handlers submit write operations - callables taking a cursor - and get a
+    Future back. The thread drains whatever is queued into one transaction,
+    running each operation inside its own savepoint so a failing operation
+    only rolls back itself. Concurrent writers therefore share one commit
+    instead of racing for the write lock.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, connect, max_batch=256, max_queue=10000):
+        self._connect = connect
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {
+            'submitted': 0,
+            'committed': 0,
+            'failed': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'total_commit_ms': 0.0
+        }
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+    
+    def submit(self, operation, timeout=5):
+        """Queue a write operation and return a Future for its result"""
+        future = Future()
+        try:
+            self._queue.put((operation, future), timeout=timeout)
+        except queue.Full:
+            raise WriteQueueFullError(f'Database write queue full ({self._queue.maxsize} pending writes)')
+        with self._lock:
+            self._counters['submitted'] += 1
+        return future
+    
+    def close(self, timeout=10):
+        """Flush everything already queued, then stop the writer thread"""
+        if self._thread and self._thread.is_alive():
+            self._queue.put((self._STOP, None))
+            self._thread.join(timeout)
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        batches = stats['batches']
+        stats['queue_depth'] = self._queue.qsize()
+        stats['avg_batch_size'] = round(stats['committed'] / batches, 2) if batches else 0.0
+        stats['avg_commit_ms'] = round(stats['total_commit_ms'] / batches, 3) if batches else 0.0
+        stats['total_commit_ms'] = round(stats['total_commit_ms'], 3)
+        return stats
+    
+    def _run(self):
+        conn = None
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(item[0] is self._STOP for item in batch):
+                stopping = True
+                batch = [item for item in batch if item[0] is not self._STOP]
+                # Drain anything that raced in behind the stop marker
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            
+            for start in range(0, len(batch), self.max_batch):
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                        conn.isolation_level = None  # Explicit BEGIN/COMMIT below
+                    self._commit_batch(conn, batch[start:start + self.max_batch])
+                except Exception as e:
+                    print(f"Database writer error: {str(e)}")
+                    for _, future in batch[start:start + self.max_batch]:
+                        if not future.done():
+                            future.set_exception(e)
+                    if conn is not None:
+                        try:
+                            conn.close()
+                        except Exception:
+                            pass
+                        conn = None
+        if conn is not None:
+            conn.close()
+    
+    def _commit_batch(self, conn, batch):
+        started = time.monotonic()
+        cursor = conn.cursor()
+        results = []
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for operation, future in batch:
+                cursor.execute('SAVEPOINT write_op')
+                try:
+                    results.append((future, operation(cursor), None))
+                    cursor.execute('RELEASE write_op')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO write_op')
+                    cursor.execute('RELEASE write_op')
+                    results.append((future, None, e))
+            cursor.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        
+        failed = 0
+        for future, result, error in results:
+            if error is not None:
+                failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['committed'] += len(batch) - failed
+            self._counters['failed'] += failed
+            self._counters['last_batch_size'] = len(batch)
+            self._counters['max_batch_size'] = max(self._counters['max_batch_size'], len(batch))
+            self._counters['total_commit_ms'] += (time.monotonic() - started) * 1000
+
+
 class DatabaseConfig:
     """Database configuration handler"""
     
-    def __init__(self):
-        self.database_url = os.getenv('DATABASE_URL', 'sqlite:///portfolio.db')
+    # (lookup table, id column in visitors) for dictionary-encoded visitor strings
+    VISITOR_DICTIONARIES = (
+        ('visitor_user_agents', 'user_agent_id'),
+        ('visitor_pages', 'page_id'),
+        ('visitor_referrers', 'referrer_id')
+    )
+    
+    # Event table -> time column; SQLite also keeps it as indexed integer
+    # seconds in <column>_epoch for range scans and hour/day bucketing
+    EVENT_TIME_COLUMNS = {
+        'visitors': 'timestamp',
+        'contact_messages': 'timestamp',
+        'ab_assignments': 'assigned_at',
+        'ab_conversions': 'converted_at',
+        'ab_events': 'created_at'
+    }
+    
+    # Leading columns of the <column>_epoch index; assignments' also covers per-variant day counts
+    EPOCH_INDEX_PREFIXES = {'ab_assignments': ('experiment_id', 'variant')}
+    
+    # Run on every new SQLite connection of every instance (see on_sqlite_connect)
+    _sqlite_connect_hooks = []
+    
+    def __init__(self, database_url=None):
+        self.database_url = database_url or os.getenv('DATABASE_URL', 'sqlite:///portfolio.db')
         self.db_type = self._detect_db_type()
         
+        # Connection pool settings
+        self.pool_min_size = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+        self.pool_max_size = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+        self.pool_idle_timeout = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+        self.pool_checkout_timeout = float(os.getenv('DB_POOL_TIMEOUT', 30))
+        self._pools = {}
+        self._pool_lock = threading.Lock()
+        
+        # SQLite tuning profile ('default' or 'production')
+        self.sqlite_profile = os.getenv('SQLITE_PROFILE', 'default').lower()
+        self.sqlite_mmap_size = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+        self.sqlite_cache_kib = int(os.getenv('SQLITE_CACHE_KIB', 64 * 1024))
+        self.sqlite_checkpoint_interval = float(os.getenv('SQLITE_CHECKPOINT_INTERVAL', 60))
+        self.sqlite_optimize_interval = float(os.getenv('SQLITE_OPTIMIZE_INTERVAL', 3600))
+        self._maintenance = None
+        
+        # Route SQLite writes through a single writer thread
+        self.sqlite_single_writer = os.getenv('SQLITE_SINGLE_WRITER', 'true').lower() == 'true'
+        self.write_batch_size = int(os.getenv('DB_WRITE_BATCH_SIZE', 256))
+        self.write_queue_size = int(os.getenv('DB_WRITE_QUEUE_SIZE', 10000))
+        self._writer = None
+        
+        self._shutdown_hooks = []
+        self._shutdown_lock = threading.Lock()
+        atexit.register(self.shutdown)
+        
     def _detect_db_type(self):
         """Detect database type from URL"""
         if self.database_url.startswith('mysql'):
@@ -30,14 +479,19 @@ class DatabaseConfig:
             # Default to sqlite for file paths
             return 'sqlite'
     
-    def get_connection(self, max_retries=3, retry_delay=1):
+    @property
+    def sqlite_tuned(self):
+        """True when SQLite runs with the WAL production profile"""
+        return self.db_type == 'sqlite' and self.sqlite_profile == 'production'
+    
+    def get_connection(self, max_retries=3, retry_delay=1, readonly=False):
         """Get database connection with retry logic"""
         for attempt in range(max_retries):
             try:
                 if self.db_type == 'mysql':
                     return self._get_mysql_connection()
                 else:
-                    return self._get_sqlite_connection()
+                    return self._get_sqlite_connection(readonly=readonly)
             except Exception as e:
                 if attempt < max_retries - 1:
                     print(f"Database connection attempt {attempt + 1} failed: {str(e)}. Retrying in {retry_delay} seconds...")
@@ -47,6 +501,168 @@ class DatabaseConfig:
                     print(f"Database connection failed after {max_retries} attempts: {str(e)}")
                     raise
     
+    @contextmanager
+    def connection(self, readonly=False, existing=None):
+        """Borrow a pooled connection for the duration of a with-block.
+        
+        Callers still commit explicitly; anything left uncommitted is rolled
+        back when the connection goes back to the pool. With ``readonly=True``
+        the production SQLite profile hands out a connection from a separate
+        read-only pool so analytics reads never contend with ingest. Helpers
+        called with a connection their caller already holds pass it as
+        ``existing``; it is used as is instead of borrowing a second one.
+        """
+        if existing is not None:
+            yield existing
+            return
+        pool = self._get_pool(readonly=readonly)
+        conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+    
+    def submit_write(self, operation):
+        """Run ``operation(cursor)`` as a write and return a Future for its result.
+        
+        On SQLite the operation is queued to the single writer thread, which
+        groups queued writes into one transaction. Operations must not commit
+        themselves. On MySQL the operation runs immediately on a pooled
+        connection and the returned Future is already resolved.
+        """
+        if self.db_type == 'sqlite' and self.sqlite_single_writer:
+            return self._get_writer().submit(operation)
+        
+        future = Future()
+        try:
+            with self.connection() as conn:
+                result = operation(conn.cursor())
+                conn.commit()
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def execute_write(self, operation, timeout=30):
+        """Run a write operation and wait for its result"""
+        return self.submit_write(operation).result(timeout)
+    
+    def writer_stats(self):
+        """Return write queue depth and commit batch counters"""
+        return self._writer.stats() if self._writer else {}
+    
+    @classmethod
+    def on_sqlite_connect(cls, hook):
+        """Register a callable run with each new SQLite connection, e.g. to add SQL functions.
+        
+        Register at import time: connections already pooled do not get it.
+        """
+        if hook not in cls._sqlite_connect_hooks:
+            cls._sqlite_connect_hooks.append(hook)
+    
+    def on_shutdown(self, hook):
+        """Register a callable to run at shutdown, before pending writes are flushed"""
+        with self._shutdown_lock:
+            self._shutdown_hooks.append(hook)
+    
+    def shutdown(self):
+        """Run shutdown hooks, flush pending writes and release every database resource"""
+        with self._shutdown_lock:
+            hooks, self._shutdown_hooks = self._shutdown_hooks, []
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Database shutdown hook failed: {str(e)}")
+        
+        with self._pool_lock:
+            writer, self._writer = self._writer, None
+        if writer:
+            writer.close()
+        self.close_pool()
+    
+    def install_signal_handlers(self):
+        """Flush buffered writes on SIGTERM (e.g. a Render redeploy) before exiting.
+        
+        Any previously installed SIGTERM handler is still called afterwards.
+        Must be called from the main thread.
+        """
+        previous = signal.getsignal(signal.SIGTERM)
+        
+        def handle_sigterm(signum, frame):
+            print("SIGTERM received, flushing pending database writes...")
+            self.shutdown()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(0)
+        
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    def _get_writer(self):
+        if self._writer is None:
+            with self._pool_lock:
+                if self._writer is None:
+                    writer = SQLiteWriter(
+                        connect=self.get_connection,
+                        max_batch=self.write_batch_size,
+                        max_queue=self.write_queue_size
+                    )
+                    writer.start()
+                    self._writer = writer
+        return self._writer
+    
+    def pool_stats(self, readonly=False):
+        """Return connection pool counters (empty until the pool is first used)"""
+        pool = self._pools.get(self._pool_key(readonly))
+        return pool.stats() if pool else {}
+    
+    def close_pool(self):
+        """Stop background maintenance and close all pooled connections"""
+        with self._pool_lock:
+            pools, self._pools = list(self._pools.values()), {}
+            maintenance, self._maintenance = self._maintenance, None
+        if maintenance:
+            maintenance.stop()
+        for pool in pools:
+            pool.close()
+    
+    def _pool_key(self, readonly):
+        return 'read' if readonly and self.sqlite_tuned else 'write'
+    
+    def _get_pool(self, readonly=False):
+        key = self._pool_key(readonly)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._pool_lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = ConnectionPool(
+                        connect=lambda: self.get_connection(readonly=key == 'read'),
+                        validate=self._validate_connection,
+                        min_size=self.pool_min_size,
+                        max_size=self.pool_max_size,
+                        idle_timeout=self.pool_idle_timeout,
+                        checkout_timeout=self.pool_checkout_timeout,
+                        thread_affinity=self.db_type == 'sqlite'
+                    )
+                    self._pools[key] = pool
+                    if self.sqlite_tuned and self._maintenance is None:
+                        self._maintenance = SQLiteMaintenance(
+                            self._sqlite_path(),
+                            checkpoint_interval=self.sqlite_checkpoint_interval,
+                            optimize_interval=self.sqlite_optimize_interval
+                        )
+                        self._maintenance.start()
+        return pool
+    
+    def _validate_connection(self, conn):
+        """Liveness check run on every checkout"""
+        if self.db_type == 'mysql':
+            conn.ping(reconnect=False)
+        else:
+            conn.execute('SELECT 1')
+    
     def _get_mysql_connection(self):
         """Get MySQL connection"""
         parsed = urlparse(self.database_url)
@@ -59,12 +675,15 @@ class DatabaseConfig:
             database=parsed.path.lstrip('/'),
             charset='utf8mb4',
             cursorclass=pymysql.cursors.DictCursor,
-            autocommit=False
+            autocommit=False,
+            # Visits are stamped in UTC by the app; keep TIMESTAMP columns from
+            # converting them (and CURRENT_TIMESTAMP defaults) from server time
+            init_command="SET time_zone = '+00:00'"
         )
         return connection
     
-    def _get_sqlite_connection(self):
-        """Get SQLite connection"""
+    def _sqlite_path(self):
+        """Resolve the SQLite file path from the database URL"""
         # Handle SQLite URL format
         if self.database_url.startswith('sqlite:///'):
             db_path = self.database_url.replace('sqlite:///', '/')
@@ -75,20 +694,50 @@ class DatabaseConfig:
             db_path = self.database_url.replace('sqlite://', '')
         else:
             db_path = self.database_url
+        return db_path
+    
+    def _get_sqlite_connection(self, readonly=False):
+        """Get SQLite connection"""
+        db_path = self._sqlite_path()
         
         # Ensure directory exists
         db_dir = os.path.dirname(db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
         
-        conn = sqlite3.connect(
-            db_path,
-            timeout=30,
-            check_same_thread=False
-        )
+        if readonly and self.sqlite_tuned:
+            # as_uri() percent-encodes '?', '#' and '%' in the path
+            conn = sqlite3.connect(
+                pathlib.Path(db_path).resolve().as_uri() + '?mode=ro',
+                uri=True,
+                timeout=30,
+                check_same_thread=False
+            )
+        else:
+            conn = sqlite3.connect(
+                db_path,
+                timeout=30,
+                check_same_thread=False
+            )
         conn.row_factory = sqlite3.Row  # Enable dict-like access
+        for hook in self._sqlite_connect_hooks:
+            hook(conn)
+        if self.sqlite_tuned:
+            self._apply_sqlite_pragmas(conn, readonly=readonly)
         return conn
     
+    def _apply_sqlite_pragmas(self, conn, readonly=False):
+        """Apply the production profile pragmas to a fresh SQLite connection"""
+        if not readonly:
+            # journal_mode is persistent in the file; setting it needs write access
+            conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={self.sqlite_mmap_size}')
+        conn.execute(f'PRAGMA cache_size=-{self.sqlite_cache_kib}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        if readonly:
+            conn.execute('PRAGMA query_only=1')
+    
     def init_database(self):
         """Initialize database tables"""
         try:
@@ -123,11 +772,33 @@ class DatabaseConfig:
                 github_user VARCHAR(100),
                 page_visited VARCHAR(500),
                 referrer VARCHAR(500),
+                user_agent_id INT,
+                page_id INT,
+                referrer_id INT,
+                ip_packed VARBINARY(16),
+                ip_prefix VARBINARY(16),
                 INDEX idx_timestamp (timestamp),
                 INDEX idx_country (country)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
         ''')
         
+        # Dictionaries for repeated visitor strings (see services/visitor_strings.py)
+        for table, id_column in self.VISITOR_DICTIONARIES:
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {id_column} INT AUTO_INCREMENT PRIMARY KEY,
+                    value_hash CHAR(32) NOT NULL,
+                    value TEXT NOT NULL,
+                    UNIQUE KEY uq_value_hash (value_hash)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            ''')
+        self._add_missing_columns(cursor, 'visitors', {
+            id_column: 'INT' for _, id_column in self.VISITOR_DICTIONARIES
+        })
+        for _, id_column in self.VISITOR_DICTIONARIES[1:]:
+            self._add_missing_index(cursor, 'visitors', id_column)
+        self.add_ip_columns(cursor, 'visitors')
+        
         # Contact messages table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS contact_messages (
@@ -138,9 +809,47 @@ class DatabaseConfig:
                 message TEXT NOT NULL,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 ip_address VARCHAR(45),
+                ip_packed VARBINARY(16),
+                ip_prefix VARBINARY(16),
                 INDEX idx_timestamp (timestamp)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
         ''')
+        self.add_ip_columns(cursor, 'contact_messages')
+        
+        # Persisted geo lookup cache (exact IPs and /24 or /48 prefixes)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS geo_cache (
+                cache_key VARCHAR(64) PRIMARY KEY,
+                country VARCHAR(100),
+                city VARCHAR(100),
+                expires_at BIGINT NOT NULL,
+                INDEX idx_expires_at (expires_at)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''')
+        
+        # Hourly and daily analytics rollups (see services/analytics_rollups.py)
+        for table in ('analytics_hourly_rollups', 'analytics_daily_rollups'):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    dimension VARCHAR(16) NOT NULL,
+                    bucket VARCHAR(19) NOT NULL,
+                    value VARCHAR(500) NOT NULL,
+                    visits BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (dimension, bucket, value)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            ''')
+        self._backfill_rollups(cursor)
+        
+        # Change feed consumer watermarks (see services/change_feed.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_feed_offsets (
+                consumer VARCHAR(100) NOT NULL,
+                table_name VARCHAR(64) NOT NULL,
+                last_id BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (consumer, table_name)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        ''')
         
         conn.commit()
     
@@ -148,6 +857,13 @@ class DatabaseConfig:
         """Initialize SQLite tables"""
         cursor = conn.cursor()
         
+        # Lets dropped partitions be released with incremental VACUUM. Only a
+        # new file is converted here (a WAL file needs the VACUUM to apply it);
+        # convert older ones with partition_visitors.py --enable-incremental-vacuum
+        if cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0] == 0:
+            cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            cursor.execute('VACUUM')
+        
         # Visitors table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS visitors (
@@ -159,10 +875,30 @@ class DatabaseConfig:
                 city TEXT,
                 github_user TEXT,
                 page_visited TEXT,
-                referrer TEXT
+                referrer TEXT,
+                user_agent_id INTEGER,
+                page_id INTEGER,
+                referrer_id INTEGER,
+                ip_packed BLOB,
+                ip_prefix BLOB
             )
         ''')
         
+        # Dictionaries for repeated visitor strings (see services/visitor_strings.py)
+        for table, id_column in self.VISITOR_DICTIONARIES:
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {id_column} INTEGER PRIMARY KEY AUTOINCREMENT,
+                    value_hash TEXT NOT NULL UNIQUE,
+                    value TEXT NOT NULL
+                )
+            ''')
+        self._add_missing_columns(cursor, 'visitors', {
+            id_column: 'INTEGER' for _, id_column in self.VISITOR_DICTIONARIES
+        })
+        self.add_ip_columns(cursor, 'visitors')
+        self.add_epoch_column(cursor, 'visitors')
+        
         # Contact messages table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS contact_messages (
@@ -172,16 +908,214 @@ class DatabaseConfig:
                 subject TEXT NOT NULL,
                 message TEXT NOT NULL,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                ip_address TEXT
+                ip_address TEXT,
+                ip_packed BLOB,
+                ip_prefix BLOB
+            )
+        ''')
+        self.add_ip_columns(cursor, 'contact_messages')
+        self.add_epoch_column(cursor, 'contact_messages')
+        
+        # Persisted geo lookup cache (exact IPs and /24 or /48 prefixes)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS geo_cache (
+                cache_key TEXT PRIMARY KEY,
+                country TEXT,
+                city TEXT,
+                expires_at INTEGER NOT NULL
+            )
+        ''')
+        
+        # Hourly and daily analytics rollups (see services/analytics_rollups.py)
+        for table in ('analytics_hourly_rollups', 'analytics_daily_rollups'):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    dimension TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    visits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (dimension, bucket, value)
+                ) WITHOUT ROWID
+            ''')
+        self._backfill_rollups(cursor)
+        
+        # Change feed consumer watermarks (see services/change_feed.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_feed_offsets (
+                consumer TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (consumer, table_name)
+            )
+        ''')
+        
+        # Monthly visitors partitions and their id/time ranges (see services/visitor_partitions.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS visitor_partitions (
+                table_name TEXT PRIMARY KEY,
+                month TEXT NOT NULL,
+                first_id INTEGER,
+                last_id INTEGER,
+                start_epoch INTEGER,
+                end_epoch INTEGER,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
         # Create indexes for better performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_visitors_timestamp ON visitors(timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_visitors_country ON visitors(country)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_visitors_page_id ON visitors(page_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_visitors_referrer_id ON visitors(referrer_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_contact_timestamp ON contact_messages(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_geo_cache_expires_at ON geo_cache(expires_at)')
         
         conn.commit()
 
+    def _add_missing_columns(self, cursor, table, columns):
+        """Add columns introduced after table was first created"""
+        if self.db_type == 'mysql':
+            cursor.execute(
+                'SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                (table,)
+            )
+            existing = {row['name'] for row in cursor.fetchall()}
+        else:
+            # table_xinfo also lists generated columns
+            cursor.execute(f'PRAGMA table_xinfo({table})')
+            existing = {row[1] for row in cursor.fetchall()}
+        for column, definition in columns.items():
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    
+    def _add_missing_index(self, cursor, table, column):
+        """Index a column added after the table was first created"""
+        if self.db_type == 'mysql':
+            # MySQL has no CREATE INDEX IF NOT EXISTS
+            cursor.execute(
+                "SELECT COUNT(*) AS count FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+                (table, f'idx_{column}')
+            )
+            if cursor.fetchone()['count'] == 0:
+                cursor.execute(f'CREATE INDEX idx_{column} ON {table} ({column})')
+        else:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})')
+    
+    def add_ip_columns(self, cursor, table):
+        """Add the packed and anonymized address columns (see services/ip_storage.py)"""
+        binary = 'VARBINARY(16)' if self.db_type == 'mysql' else 'BLOB'
+        self._add_missing_columns(cursor, table, {'ip_packed': binary, 'ip_prefix': binary})
+        self._add_missing_index(cursor, table, 'ip_prefix')
+        if table == 'visitors':
+            # Exact-address and narrower-than-prefix range lookups
+            self._add_missing_index(cursor, table, 'ip_packed')
+    
+    def add_epoch_column(self, cursor, table, backfill=True):
+        """Keep an indexed integer copy of a SQLite event table's time column.
+        
+        Text timestamps cost a parse per row and sort as strings, so range
+        filters and hour/day buckets use <column>_epoch instead. Rows inserted
+        without it are filled by a trigger. With backfill, rows stored before
+        it existed are filled here and the column indexed; otherwise the
+        caller does both (see migrate_epoch_columns.py). MySQL TIMESTAMP
+        columns are already stored as integers.
+        """
+        if self.db_type == 'mysql':
+            return
+        column = self.EVENT_TIME_COLUMNS[table]
+        epoch = f'{column}_epoch'
+        self._add_missing_columns(cursor, table, {epoch: 'INTEGER'})
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{epoch} AFTER INSERT ON {table}
+            WHEN NEW.{epoch} IS NULL AND NEW.{column} IS NOT NULL
+            BEGIN
+                UPDATE {table} SET {epoch} = {self.epoch_sql(f'NEW.{column}')} WHERE id = NEW.id;
+            END
+        ''')
+        if backfill:
+            self.index_epoch_column(cursor, table)
+            # The index keeps this a seek once every row has been filled
+            cursor.execute(f'''
+                UPDATE {table} SET {epoch} = {self.epoch_sql(column)}
+                WHERE {epoch} IS NULL AND {column} IS NOT NULL
+            ''')
+    
+    def index_epoch_column(self, cursor, table):
+        """Create the <column>_epoch index of a SQLite event table"""
+        epoch = f'{self.EVENT_TIME_COLUMNS[table]}_epoch'
+        columns = ', '.join(self.EPOCH_INDEX_PREFIXES.get(table, ()) + (epoch,))
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{epoch} ON {table}({columns})')
+    
+    @staticmethod
+    def epoch_sql(column):
+        """SQLite expression converting a 'YYYY-MM-DD HH:MM:SS' UTC column to epoch seconds"""
+        return f"CAST(strftime('%s', {column}) AS INTEGER)"
+    
+    def _backfill_rollups(self, cursor):
+        """Populate empty rollup tables from existing visitors and contact messages"""
+        cursor.execute('SELECT COUNT(*) AS count FROM analytics_daily_rollups')
+        row = cursor.fetchone()
+        if (row['count'] if self.db_type == 'mysql' else row[0]) > 0:
+            return
+        
+        # (grouping key, label for a grouped key); SQLite groups on integer
+        # epoch buckets and formats each group once
+        if self.db_type == 'mysql':
+            buckets = {
+                'analytics_hourly_rollups': ("DATE_FORMAT(timestamp, '%Y-%m-%d %H:00:00')", '{}'),
+                'analytics_daily_rollups': ("DATE_FORMAT(timestamp, '%Y-%m-%d 00:00:00')", '{}')
+            }
+        else:
+            buckets = {
+                'analytics_hourly_rollups': (
+                    'timestamp_epoch / 3600', "strftime('%Y-%m-%d %H:00:00', {} * 3600, 'unixepoch')"
+                ),
+                'analytics_daily_rollups': (
+                    'timestamp_epoch / 86400', "strftime('%Y-%m-%d 00:00:00', {} * 86400, 'unixepoch')"
+                )
+            }
+        dimensions = [
+            ('total', "''", 'visitors'),
+            ('country', "COALESCE(country, 'Unknown')", 'visitors'),
+            ('github', "CASE WHEN github_user IS NOT NULL THEN '1' ELSE '0' END", 'visitors'),
+            ('messages', "''", 'contact_messages')
+        ]
+        for table, (bucket, label) in buckets.items():
+            for dimension, value, source in dimensions:
+                cursor.execute(f'''
+                    INSERT INTO {table} (dimension, bucket, value, visits)
+                    SELECT '{dimension}', {label.format('grouped.bucket')}, grouped.value, grouped.visits
+                    FROM (
+                        SELECT {bucket} AS bucket, {value} AS value, COUNT(*) AS visits
+                        FROM {source}
+                        GROUP BY 1, 2
+                    ) grouped
+                ''')
+            
+            # Pages and referrers group on their dictionary ids and are decoded
+            # afterwards; rows written without ids fall back to the inline text
+            for dimension, text_column, lookup, id_column in (
+                ('page', 'page_visited', 'visitor_pages', 'page_id'),
+                ('referrer', 'referrer', 'visitor_referrers', 'referrer_id')
+            ):
+                cursor.execute(f'''
+                    INSERT INTO {table} (dimension, bucket, value, visits)
+                    SELECT '{dimension}', {label.format('grouped.bucket')}, COALESCE({lookup}.value, grouped.text_value, ''),
+                           SUM(grouped.visits)
+                    FROM (
+                        SELECT {bucket} AS bucket, {id_column},
+                               CASE WHEN {id_column} IS NULL THEN {text_column} END AS text_value,
+                               COUNT(*) AS visits
+                        FROM visitors
+                        GROUP BY 1, 2, 3
+                    ) grouped
+                    LEFT JOIN {lookup} ON {lookup}.{id_column} = grouped.{id_column}
+                    GROUP BY 2, 3
+                ''')
+
 # Global database instance
 db_config = DatabaseConfig()
\ No newline at end of file
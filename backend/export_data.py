@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Export visitors, contact messages or A/B testing data for offline analysis.
+
+Streams the table straight from the database in constant memory. With
+--checkpoint the last exported id is saved after every batch, so re-running
+the same command appends only the rows added (or not yet written) since:
+
+    python export_data.py visitors visitors.ndjson.gz --gzip --checkpoint visitors.ckpt
+"""
+
+import argparse
+import os
+import sys
+import time
+from services.data_export import EXPORT_FORMATS, EXPORT_TABLES, TableExport
+
+
+def read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    return 0
+
+
+def write_checkpoint(path, last_id):
+    # Atomic replace so a crash never leaves a truncated checkpoint
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(str(last_id))
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a table to CSV or NDJSON')
+    parser.add_argument('table', choices=sorted(EXPORT_TABLES))
+    parser.add_argument('output_path', help="Output file, or '-' for stdout")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+    parser.add_argument('--gzip', action='store_true', help='Compress the output on the fly')
+    parser.add_argument('--since-id', type=int, help='Only export rows with a higher id')
+    parser.add_argument('--checkpoint', help='File holding the last exported id; resumes from it')
+    parser.add_argument('--limit', type=int, help='Stop after this many rows')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    since_id = args.since_id if args.since_id is not None else read_checkpoint(args.checkpoint)
+    to_stdout = args.output_path == '-'
+    # Resumed exports append; gzip members and CSV rows concatenate cleanly
+    appending = not to_stdout and since_id > 0 and os.path.exists(args.output_path)
+
+    export = TableExport(
+        args.table,
+        fmt=args.format,
+        since_id=since_id,
+        limit=args.limit,
+        compress=args.gzip,
+        include_header=not appending,
+        batch_size=args.batch_size
+    )
+
+    started = time.time()
+    out = sys.stdout.buffer if to_stdout else open(args.output_path, 'ab' if appending else 'wb')
+    try:
+        for chunk in export.chunks():
+            out.write(chunk)
+            if args.checkpoint and export.rows:
+                out.flush()
+                write_checkpoint(args.checkpoint, export.last_id)
+    except Exception as e:
+        print(f"❌ Export failed after {export.rows} rows (last id {export.last_id}): {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if not to_stdout:
+            out.close()
+
+    print(f"✅ Exported {export.rows} {args.table} rows after id {since_id} (last id {export.last_id}) "
+          f"in {time.time() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Add the integer <column>_epoch copies of the SQLite event tables' time
+columns (see DatabaseConfig.add_epoch_column).
+
+Startup fills the column for existing rows in a single UPDATE per table,
+which holds the write lock for the whole table. Run this before upgrading
+a large database instead: it adds the column and insert trigger, fills
+existing rows in id-ordered batches (safe while serving, resumable after
+an interruption) and builds each index once the column is filled:
+
+    python migrate_epoch_columns.py
+    python migrate_epoch_columns.py --batch-size 100000
+
+MySQL needs no migration; its TIMESTAMP columns are already integers.
+"""
+
+import argparse
+import time
+from typing import Callable
+from database import DatabaseConfig, db_config
+
+
+def _table_exists(database, table: str) -> bool:
+    with database.connection(readonly=True) as conn:
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+
+def migrate(database=None, batch_size: int = 50000, log: Callable[[str], None] = print) -> int:
+    """Fill <column>_epoch for every event table; returns rows updated"""
+    database = database or db_config
+    if database.db_type == 'mysql':
+        log("MySQL TIMESTAMP columns need no epoch copy")
+        return 0
+
+    updated = 0
+    for table, column in DatabaseConfig.EVENT_TIME_COLUMNS.items():
+        if not _table_exists(database, table):
+            continue
+        epoch = f'{column}_epoch'
+        database.execute_write(lambda cursor: database.add_epoch_column(cursor, table, backfill=False))
+
+        with database.connection(readonly=True) as conn:
+            max_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0]
+        update = f'''
+            UPDATE {table} SET {epoch} = {database.epoch_sql(column)}
+            WHERE id > ? AND id <= ? AND {epoch} IS NULL AND {column} IS NOT NULL
+        '''
+        for start in range(0, max_id, batch_size):
+            bounds = (start, start + batch_size)
+            updated += database.execute_write(lambda cursor: cursor.execute(update, bounds).rowcount)
+            log(f"  {table}: filled through id {min(start + batch_size, max_id)} of {max_id}")
+
+        started = time.perf_counter()
+        database.execute_write(lambda cursor: database.index_epoch_column(cursor, table))
+        log(f"  {table}: indexed {epoch} in {time.perf_counter() - started:.1f}s")
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add integer epoch columns to the SQLite event tables')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    started = time.time()
+    updated = migrate(batch_size=args.batch_size)
+    print(f"✅ Filled {updated} rows in {time.time() - started:.1f}s")
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
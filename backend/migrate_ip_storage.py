@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Pack the client addresses of visitors, contact_messages, ab_assignments and
+ab_conversions into ip_packed/ip_prefix (see services/ip_storage.py).
+
+Fills the binary columns for rows stored before they existed, in id order
+and in batches, so it can run while the app is serving traffic and be
+re-run after an interruption. --mode packed also clears the ip_address
+text; --mode anonymized clears the text and the full packed address,
+keeping only the /24 or /48 prefix. Both compact the tables afterwards
+(VACUUM on SQLite, OPTIMIZE TABLE on MySQL). Prints the bytes spent on
+addresses and the storage size before and after:
+
+    python migrate_ip_storage.py
+    python migrate_ip_storage.py --mode packed
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, Tuple
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from migrate_visitor_strings import compact, storage_bytes
+from services.ip_storage import IP_STORAGE_MODES, IP_TABLES, IPStorage
+
+
+def address_bytes(database=None) -> Dict[str, Tuple[int, int]]:
+    """Per table: (bytes in ip_address text, bytes in ip_packed + ip_prefix)"""
+    database = database or db_config
+    sizes = {}
+    with database.connection(readonly=True) as conn:
+        cursor = conn.cursor()
+        for table in IP_TABLES:
+            cursor.execute(f'''
+                SELECT COALESCE(SUM(LENGTH(ip_address)), 0) AS text_bytes,
+                       COALESCE(SUM(LENGTH(ip_packed)), 0) + COALESCE(SUM(LENGTH(ip_prefix)), 0) AS binary_bytes
+                FROM {table}
+            ''')
+            row = cursor.fetchone()
+            if database.db_type == 'mysql':
+                sizes[table] = (int(row['text_bytes']), int(row['binary_bytes']))
+            else:
+                sizes[table] = (row[0], row[1])
+    return sizes
+
+
+def migrate(database=None, mode: str = 'inline', batch_size: int = 5000,
+            log: Callable[[str], None] = print) -> int:
+    """Fill missing binary addresses (and clear what mode does not keep); returns rows updated"""
+    database = database or db_config
+    placeholder = '%s' if database.db_type == 'mysql' else '?'
+    storage = IPStorage(mode)
+
+    if mode == 'inline':
+        pending = 'ip_address IS NOT NULL AND ip_prefix IS NULL'
+    elif mode == 'packed':
+        pending = 'ip_address IS NOT NULL'
+    else:
+        pending = 'ip_address IS NOT NULL OR ip_packed IS NOT NULL'
+
+    updated = 0
+    for table in IP_TABLES:
+        update = (f'UPDATE {table} SET ip_address = {placeholder}, ip_packed = {placeholder}, '
+                  f'ip_prefix = {placeholder} WHERE id = {placeholder}')
+        last_id = 0
+        while True:
+            with database.connection(readonly=True) as conn:
+                cursor = conn.cursor()
+                # Rows cleared by an earlier packed run decode from ip_packed
+                cursor.execute(f'''
+                    SELECT id, COALESCE(ip_address, INET6_NTOA(ip_packed)) AS ip FROM {table}
+                    WHERE id > {placeholder} AND ({pending})
+                    ORDER BY id LIMIT {int(batch_size)}
+                ''', (last_id,))
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            if database.db_type == 'mysql':
+                rows = [(row['id'], row['ip']) for row in rows]
+            else:
+                rows = [tuple(row) for row in rows]
+
+            params = [storage.values(ip) + (row_id,) for row_id, ip in rows]
+            database.execute_write(lambda cursor: cursor.executemany(update, params))
+
+            last_id = rows[-1][0]
+            updated += len(rows)
+            log(f"  {table}: {updated} rows migrated (through id {last_id})")
+    return updated
+
+
+def run(mode: str = 'inline', batch_size: int = 5000) -> None:
+    """Migrate and print the before/after address bytes and storage report"""
+    size_before, bytes_before = storage_bytes(tables=IP_TABLES), address_bytes()
+
+    started = time.time()
+    updated = migrate(mode=mode, batch_size=batch_size)
+    if mode != 'inline':
+        compact(tables=IP_TABLES)
+    elapsed = time.time() - started
+
+    size_after, bytes_after = storage_bytes(tables=IP_TABLES), address_bytes()
+    print(f"✅ Migrated {updated} rows in {elapsed:.1f}s")
+    print(f"{'address bytes':<22}{'text before':>14}{'binary before':>15}{'text after':>14}{'binary after':>14}")
+    for table in IP_TABLES:
+        print(f"{table:<22}{bytes_before[table][0]:>14}{bytes_before[table][1]:>15}"
+              f"{bytes_after[table][0]:>14}{bytes_after[table][1]:>14}")
+    print(f"{'storage (MB)':<22}{size_before / 1e6:>29.2f}{size_after / 1e6:>28.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack stored client IP addresses')
+    parser.add_argument('--mode', choices=IP_STORAGE_MODES, default='inline',
+                        help='What to keep: inline text too, packed only, or the anonymized prefix only')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    db_config.init_database()
+    init_ab_testing_tables()
+    run(mode=args.mode, batch_size=args.batch_size)
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
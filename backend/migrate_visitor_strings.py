@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Move visitors' user_agent, page_visited and referrer strings into their
+dictionary tables (see services/visitor_strings.py).
+
+Fills user_agent_id, page_id and referrer_id for rows stored before the
+dictionaries existed, in id order and in batches, so it can run while the
+app is serving traffic and be re-run after an interruption. With
+--normalize the inline text is cleared as well and the table compacted
+(VACUUM on SQLite, OPTIMIZE TABLE on MySQL). Prints the storage size and
+page/referrer breakdown latency before and after:
+
+    python migrate_visitor_strings.py
+    python migrate_visitor_strings.py --normalize
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, Optional, Sequence
+from database import db_config
+from services.analytics_engine import SQLAnalyticsEngine
+from services.visitor_strings import DICTIONARIES, visitor_strings
+
+
+def storage_bytes(database=None, tables: Optional[Sequence[str]] = None) -> int:
+    """Bytes used by tables, visitors and its dictionaries by default (whole file on SQLite)"""
+    database = database or db_config
+    with database.connection(readonly=True) as conn:
+        cursor = conn.cursor()
+        if database.db_type == 'mysql':
+            tables = list(tables or ['visitors'] + [table for table, _ in DICTIONARIES.values()])
+            cursor.execute(
+                'SELECT COALESCE(SUM(data_length + index_length), 0) AS size FROM information_schema.TABLES '
+                f"WHERE table_schema = DATABASE() AND table_name IN ({', '.join(['%s'] * len(tables))})",
+                tables
+            )
+            return int(cursor.fetchone()['size'])
+        # Free pages are reusable, so only count the ones holding data
+        page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+        free_pages = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+
+def breakdown_latency(database=None, runs: int = 5) -> Dict[str, float]:
+    """Median milliseconds of the page and referrer breakdowns"""
+    engine = SQLAnalyticsEngine(database)
+    latencies = {}
+    for dimension in ('page', 'referrer'):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            engine.visitor_breakdown([dimension], limit=1000)
+            timings.append((time.perf_counter() - started) * 1000)
+        latencies[dimension] = statistics.median(timings)
+    return latencies
+
+
+def migrate(database=None, normalize: bool = False, batch_size: int = 5000,
+            log: Callable[[str], None] = print) -> int:
+    """Fill missing dictionary ids (and clear inline text with normalize); returns rows updated"""
+    database = database or db_config
+    placeholder = '%s' if database.db_type == 'mysql' else '?'
+    columns = list(DICTIONARIES)
+    id_columns = [id_column for _, id_column in DICTIONARIES.values()]
+
+    if normalize:
+        pending = ' OR '.join(f'{column} IS NOT NULL' for column in columns)
+    else:
+        pending = ' OR '.join(f'({id_column} IS NULL AND {column} IS NOT NULL)'
+                              for column, id_column in zip(columns, id_columns))
+    assignments = [f'{id_column} = COALESCE({placeholder}, {id_column})' for id_column in id_columns]
+    if normalize:
+        assignments += [f'{column} = NULL' for column in columns]
+    update = f"UPDATE visitors SET {', '.join(assignments)} WHERE id = {placeholder}"
+
+    last_id, updated = 0, 0
+    while True:
+        with database.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, {', '.join(columns)} FROM visitors
+                WHERE id > {placeholder} AND ({pending})
+                ORDER BY id LIMIT {int(batch_size)}
+            ''', (last_id,))
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        if database.db_type == 'mysql':
+            rows = [tuple(row[column] for column in ['id'] + columns) for row in rows]
+        else:
+            rows = [tuple(row) for row in rows]
+
+        ids = visitor_strings.resolve({
+            column: [row[i + 1] for row in rows] for i, column in enumerate(columns)
+        })
+        params = [
+            tuple(ids[column].get(row[i + 1]) if row[i + 1] is not None else None
+                  for i, column in enumerate(columns)) + (row[0],)
+            for row in rows
+        ]
+        database.execute_write(lambda cursor: cursor.executemany(update, params))
+
+        last_id = rows[-1][0]
+        updated += len(rows)
+        log(f"  {updated} rows migrated (through id {last_id})")
+    return updated
+
+
+def compact(database=None, tables: Sequence[str] = ('visitors',)) -> None:
+    """Return the space freed by clearing inline text to the filesystem"""
+    database = database or db_config
+    if database.db_type == 'mysql':
+        with database.connection() as conn:
+            conn.cursor().execute(f"OPTIMIZE TABLE {', '.join(tables)}")
+        return
+    conn = database.get_connection()
+    try:
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+def run(normalize: bool = False, batch_size: int = 5000) -> None:
+    """Migrate and print the before/after size and latency report"""
+    size_before, latency_before = storage_bytes(), breakdown_latency()
+
+    started = time.time()
+    updated = migrate(normalize=normalize, batch_size=batch_size)
+    if normalize:
+        compact()
+    elapsed = time.time() - started
+
+    size_after, latency_after = storage_bytes(), breakdown_latency()
+    print(f"✅ Migrated {updated} visitors rows in {elapsed:.1f}s")
+    print(f"{'':<22}{'before':>12}{'after':>12}")
+    print(f"{'storage (MB)':<22}{size_before / 1e6:>12.2f}{size_after / 1e6:>12.2f}")
+    for dimension in ('page', 'referrer'):
+        print(f"{dimension + ' breakdown (ms)':<22}{latency_before[dimension]:>12.1f}{latency_after[dimension]:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dictionary-encode visitor strings')
+    parser.add_argument('--normalize', action='store_true',
+                        help='Also clear the inline text columns and compact the table')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    db_config.init_database()
+    run(normalize=args.normalize, batch_size=args.batch_size)
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
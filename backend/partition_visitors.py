@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Rotate closed months of the visitors table into monthly partitions, drop
+partitions outside the retention window and release the freed pages (see
+services/visitor_partitions.py).
+
+With VISITOR_PARTITIONS=monthly the app does the same every
+VISITOR_PARTITION_INTERVAL seconds. Running this script rotates whatever
+the setting; run it by hand for the first rotation of a large table, or to
+see where the disk goes:
+
+    python partition_visitors.py --status
+    python partition_visitors.py
+    python partition_visitors.py --retention-months 12
+
+Databases created before incremental VACUUM was enabled keep freed pages
+inside the file (new rows reuse them). Converting one rewrites the whole
+file once; stop the app first on a nearly full disk, since VACUUM needs
+room for a second copy:
+
+    python partition_visitors.py --enable-incremental-vacuum
+"""
+
+import argparse
+import os
+import time
+from database import db_config
+from services.visitor_partitions import visitor_partitions
+
+
+def file_bytes(database=None) -> int:
+    """Size of the SQLite file plus its WAL"""
+    database = database or db_config
+    path = database._sqlite_path()
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def enable_incremental_vacuum(database=None) -> bool:
+    """Switch an existing SQLite file to auto_vacuum=INCREMENTAL; returns True if it changed"""
+    database = database or db_config
+    conn = database.get_connection()
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        conn.isolation_level = None
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+    finally:
+        conn.close()
+
+
+def status(database=None) -> None:
+    database = database or db_config
+    with database.connection(readonly=True) as conn:
+        live = conn.execute('SELECT COUNT(*) FROM visitors').fetchone()[0]
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    print(f"{'table':<22}{'month':>9}{'rows':>12}")
+    for partition in visitor_partitions.partitions():
+        print(f"{partition['table_name']:<22}{partition['month']:>9}{partition['row_count']:>12,}")
+    print(f"{'visitors (live)':<22}{'':>9}{live:>12,}")
+    print(f"File: {file_bytes(database) / 1e6:.1f} MB, {free_pages * page_size / 1e6:.1f} MB free, "
+          f"auto_vacuum={('none', 'full', 'incremental')[auto_vacuum]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partition the visitors table by month and apply retention')
+    parser.add_argument('--status', action='store_true', help='list partitions and file usage only')
+    parser.add_argument('--retention-months', type=int, help='override VISITOR_RETENTION_MONTHS')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='convert the file to auto_vacuum=INCREMENTAL with one full VACUUM')
+    args = parser.parse_args()
+
+    if db_config.db_type != 'sqlite':
+        print("Visitor partitions are SQLite only; use native partitioning on MySQL")
+        return
+    db_config.init_database()
+    try:
+        if args.enable_incremental_vacuum:
+            started = time.time()
+            before = file_bytes()
+            if enable_incremental_vacuum():
+                print(f"✅ Enabled incremental VACUUM in {time.time() - started:.1f}s "
+                      f"({before / 1e6:.1f} MB -> {file_bytes() / 1e6:.1f} MB)")
+            else:
+                print("Incremental VACUUM is already enabled")
+        elif not args.status:
+            # Running the script is the opt-in
+            visitor_partitions.mode = 'monthly'
+            if args.retention_months is not None:
+                visitor_partitions.retention_months = args.retention_months
+            started = time.time()
+            result = visitor_partitions.run_once()
+            print(f"✅ Moved {result['moved_rows']} visits, dropped {result['dropped_rows']} and "
+                  f"freed {result['vacuumed_pages']} pages in {time.time() - started:.1f}s")
+        status()
+    finally:
+        db_config.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Rate Limiting
+Shared rate limiter for the Flask routes. Uses a sliding-window counter
+(current and previous window counts, weighted by overlap), so every check
+is O(1) in time and memory per client regardless of the limit.
+
+Counters live in one of three backends, selected with RATE_LIMIT_BACKEND:
+    memory  per-process dictionaries (default)
+    shared  memory-mapped file shared by every worker process on the host
+    redis   Redis-protocol server, shared across hosts
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+from flask import request, jsonify, make_response
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the shared backend is unavailable, memory still works
+    fcntl = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class RateLimitBackend(ABC):
+    """Interface for rate limit counter stores"""
+
+    name = 'base'
+
+    @abstractmethod
+    def hit(self, key: str, max_requests: int, window: float) -> Tuple[bool, int]:
+        """Count one request for key; returns (allowed, retry_after_seconds)"""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Forget every counter"""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        """Counters reported under rate_limiter in /api/health"""
+
+
+class SlidingWindowLimiter(RateLimitBackend):
+    """In-process sliding-window counter keyed by an arbitrary string.
+
+    Keys are spread over lock stripes so concurrent requests from different
+    clients rarely contend. Each stripe keeps its keys in least recently
+    seen order: idle keys are swept once they are two windows old, and when
+    the global max_keys cap is reached the least recently seen key of the
+    stripe is evicted.
+    """
+
+    name = 'memory'
+
+    def __init__(self, stripes: int = 16, max_keys: int = 100000, sweep_interval: float = 60):
+        self.stripes = stripes
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+
+        # key -> [window_start, previous_count, current_count, window, last_seen]
+        self._tables: List['OrderedDict[str, list]'] = [OrderedDict() for _ in range(stripes)]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._next_sweep = [time.monotonic() + sweep_interval] * stripes
+        self._max_keys_per_stripe = max(1, max_keys // stripes)
+        self._counters = {'allowed': 0, 'limited': 0, 'evictions': 0, 'expired': 0}
+
+    def hit(self, key: str, max_requests: int, window: float) -> Tuple[bool, int]:
+        now = time.monotonic()
+        stripe = hash(key) % self.stripes
+        table = self._tables[stripe]
+
+        with self._locks[stripe]:
+            if now >= self._next_sweep[stripe]:
+                self._sweep_locked(stripe, now)
+
+            entry = table.get(key)
+            if entry is None:
+                if len(table) >= self._max_keys_per_stripe:
+                    table.popitem(last=False)
+                    self._counters['evictions'] += 1
+                entry = table[key] = [now, 0, 0, window, now]
+            else:
+                table.move_to_end(key)
+            entry[4] = now
+
+            entry[0], entry[1], entry[2] = _slide(entry[0], entry[1], entry[2], now, window)
+            allowed, retry_after = _check(entry[0], entry[1], entry[2], now, max_requests, window)
+            if allowed:
+                entry[2] += 1
+                self._counters['allowed'] += 1
+            else:
+                self._counters['limited'] += 1
+            return allowed, retry_after
+
+    def reset(self) -> None:
+        for stripe, table in enumerate(self._tables):
+            with self._locks[stripe]:
+                table.clear()
+
+    def stats(self) -> Dict:
+        keys = 0
+        for stripe, table in enumerate(self._tables):
+            with self._locks[stripe]:
+                keys += len(table)
+        stats = dict(self._counters)
+        stats['backend'] = self.name
+        stats['keys'] = keys
+        stats['max_keys'] = self.max_keys
+        return stats
+
+    def _sweep_locked(self, stripe: int, now: float) -> None:
+        table = self._tables[stripe]
+        expired = [key for key, entry in table.items() if now - entry[4] > 2 * entry[3]]
+        for key in expired:
+            del table[key]
+        self._counters['expired'] += len(expired)
+        self._next_sweep[stripe] = now + self.sweep_interval
+
+
+class SharedMemoryLimiter(RateLimitBackend):
+    """Sliding-window counters in a memory-mapped file shared across processes.
+
+    The file is a fixed-size open-addressing hash table split into stripes.
+    A stripe is guarded by a thread lock plus an fcntl record lock on its
+    byte range, so read-modify-write of a slot is atomic across gunicorn
+    workers. Keys whose windows have lapsed are overwritten in place, and
+    when a probe sequence is full the least recently seen slot is reused,
+    so memory is bounded by the file size.
+    """
+
+    MAGIC = b'RLSHM001'
+    HEADER = struct.Struct('<8sII')
+    # key hash, window start, last seen, window length, previous count, current count
+    SLOT = struct.Struct('<QdddII')
+    PROBES = 8
+
+    name = 'shared'
+
+    def __init__(self, path: str, slots: int = 65536, stripes: int = 64):
+        if fcntl is None:
+            raise RuntimeError('fcntl record locks are not available on this platform')
+        self.path = path
+        self.stripes = stripes
+        self.slots_per_stripe = max(self.PROBES, slots // stripes)
+        self.slots = self.slots_per_stripe * stripes
+        size = self.HEADER.size + self.slots * self.SLOT.size
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, self.HEADER.size, 0)
+            if len(header) < self.HEADER.size or self.HEADER.unpack(header) != (self.MAGIC, self.slots, stripes):
+                # First process to start (or a layout change) initialises the table
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, self.slots, stripes), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._mmap = mmap.mmap(self._fd, size)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._stripe_bytes = self.slots_per_stripe * self.SLOT.size
+        self._counters = {'allowed': 0, 'limited': 0, 'evictions': 0}
+
+    def hit(self, key: str, max_requests: int, window: float) -> Tuple[bool, int]:
+        # Python's hash() is randomised per process, so use a stable digest
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        stripe = key_hash % self.stripes
+        base = self.HEADER.size + stripe * self._stripe_bytes
+        start = (key_hash // self.stripes) % self.slots_per_stripe
+        now = time.time()
+
+        with self._locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._stripe_bytes, base)
+            try:
+                offset, slot, evicted = self._probe(base, start, key_hash, now)
+                if slot is None:
+                    window_start, previous, current = now, 0, 0
+                else:
+                    window_start, previous, current = _slide(slot[1], slot[4], slot[5], now, window)
+                allowed, retry_after = _check(window_start, previous, current, now, max_requests, window)
+                if allowed:
+                    current += 1
+                self.SLOT.pack_into(self._mmap, offset, key_hash, window_start, now, window, previous, current)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._stripe_bytes, base)
+            self._counters['allowed' if allowed else 'limited'] += 1
+            if evicted:
+                self._counters['evictions'] += 1
+        return allowed, retry_after
+
+    def reset(self) -> None:
+        for stripe in range(self.stripes):
+            base = self.HEADER.size + stripe * self._stripe_bytes
+            with self._locks[stripe]:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, self._stripe_bytes, base)
+                try:
+                    self._mmap[base:base + self._stripe_bytes] = bytes(self._stripe_bytes)
+                finally:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, self._stripe_bytes, base)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        keys = 0
+        for index in range(self.slots):
+            key_hash, _, last_seen, window, _, _ = self.SLOT.unpack_from(
+                self._mmap, self.HEADER.size + index * self.SLOT.size)
+            if key_hash and now - last_seen <= 2 * window:
+                keys += 1
+        stats = dict(self._counters)
+        stats['backend'] = self.name
+        stats['path'] = self.path
+        stats['keys'] = keys
+        stats['max_keys'] = self.slots
+        return stats
+
+    def close(self) -> None:
+        self._mmap.close()
+        os.close(self._fd)
+
+    def _probe(self, base: int, start: int, key_hash: int, now: float):
+        """Find the slot for key_hash; returns (offset, slot or None, evicted)"""
+        free = None
+        oldest = None
+        for i in range(self.PROBES):
+            offset = base + ((start + i) % self.slots_per_stripe) * self.SLOT.size
+            slot = self.SLOT.unpack_from(self._mmap, offset)
+            if slot[0] == key_hash:
+                return offset, slot, False
+            if free is None and (slot[0] == 0 or now - slot[2] > 2 * slot[3]):
+                free = offset
+            if oldest is None or slot[2] < oldest[1]:
+                oldest = (offset, slot[2])
+        if free is not None:
+            return free, None, False
+        return oldest[0], None, True
+
+
+class RedisLimiter(RateLimitBackend):
+    """Sliding-window counters in a Redis-protocol server.
+
+    One Lua script per check reads the previous window count and increments
+    the current one atomically, so it works across workers and hosts.
+    """
+
+    SCRIPT = '''
+        local current_key = KEYS[1]
+        local previous_key = KEYS[2]
+        local max_requests = tonumber(ARGV[1])
+        local window = tonumber(ARGV[2])
+        local weight = tonumber(ARGV[3])
+        local previous = tonumber(redis.call('GET', previous_key) or '0')
+        local current = tonumber(redis.call('GET', current_key) or '0')
+        if previous * weight + current < max_requests then
+            current = redis.call('INCR', current_key)
+            redis.call('PEXPIRE', current_key, math.ceil(window * 2000))
+            return {1, previous, current}
+        end
+        return {0, previous, current}
+    '''
+
+    name = 'redis'
+
+    def __init__(self, url: str, prefix: str = 'ratelimit'):
+        if redis is None:
+            raise RuntimeError('The redis package is not installed')
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+        self._lock = threading.Lock()
+        self._counters = {'allowed': 0, 'limited': 0}
+
+    def hit(self, key: str, max_requests: int, window: float) -> Tuple[bool, int]:
+        now = time.time()
+        index = int(now // window)
+        elapsed = now - index * window
+        allowed, previous, current = self._script(
+            keys=[f'{self.prefix}:{key}:{index}', f'{self.prefix}:{key}:{index - 1}'],
+            args=[max_requests, window, 1 - elapsed / window]
+        )
+        with self._lock:
+            self._counters['allowed' if allowed else 'limited'] += 1
+        if allowed:
+            return True, 0
+        return False, _retry_after(int(previous), int(current), elapsed, max_requests, window)
+
+    def reset(self) -> None:
+        for key in self._client.scan_iter(f'{self.prefix}:*'):
+            self._client.delete(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats['backend'] = self.name
+        return stats
+
+
+def _slide(window_start: float, previous: int, current: int, now: float, window: float) -> Tuple[float, int, int]:
+    """Roll a counter forward to the window containing now"""
+    elapsed_windows = int((now - window_start) // window)
+    if elapsed_windows >= 2:
+        # More than one full window idle clears the history
+        return now, 0, 0
+    if elapsed_windows == 1:
+        return window_start + window, current, 0
+    return window_start, previous, current
+
+
+def _check(window_start: float, previous: int, current: int, now: float,
+           max_requests: int, window: float) -> Tuple[bool, int]:
+    elapsed = now - window_start
+    if previous * (1 - elapsed / window) + current < max_requests:
+        return True, 0
+    return False, _retry_after(previous, current, elapsed, max_requests, window)
+
+
+def _retry_after(previous: int, current: int, elapsed: float, max_requests: int, window: float) -> int:
+    """Whole seconds until the sliding-window estimate drops below max_requests"""
+    if current < max_requests and previous > 0:
+        # Wait for the previous window's weight to decay within this window
+        wait = window * (1 - (max_requests - current) / previous) - elapsed
+    else:
+        # Current window alone is over the limit: wait for it to become the
+        # previous window and decay enough
+        wait = (window - elapsed) + window * (1 - max_requests / max(current, 1))
+    return max(1, math.ceil(wait))
+
+
+def rate_limit(max_requests=10, window=60, scope=None):
+    """Rate limiting decorator keyed by client IP and endpoint.
+
+    Each endpoint has its own budget per client. Endpoints given the same
+    scope share one budget instead; they should use the same window.
+    Requests over the limit get a 429 with a Retry-After header.
+    """
+    def decorator(f):
+        bucket = scope or f.__name__
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            allowed, retry_after = limiter.hit(f'{bucket}:{request.remote_addr}', max_requests, window)
+            if not allowed:
+                response = make_response(jsonify({
+                    'error': 'Rate limit exceeded. Please try again later.',
+                    'status': 'error'
+                }), 429)
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def create_limiter(backend: Optional[str] = None) -> RateLimitBackend:
+    """Build the limiter selected by RATE_LIMIT_BACKEND, falling back to memory"""
+    backend = (backend or os.getenv('RATE_LIMIT_BACKEND', 'memory')).lower()
+    max_keys = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+    try:
+        if backend == 'shared':
+            return SharedMemoryLimiter(
+                os.getenv('RATE_LIMIT_SHARED_PATH', os.path.join(tempfile.gettempdir(), 'portfolio-ratelimit.bin')),
+                slots=max_keys
+            )
+        if backend == 'redis':
+            return RedisLimiter(os.getenv('RATE_LIMIT_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
+    except Exception as e:
+        print(f"WARNING: Rate limit backend '{backend}' unavailable, using memory: {str(e)}")
+
+    return SlidingWindowLimiter(
+        stripes=int(os.getenv('RATE_LIMIT_STRIPES', 16)),
+        max_keys=max_keys,
+        sweep_interval=float(os.getenv('RATE_LIMIT_SWEEP_INTERVAL', 60))
+    )
+
+
+# Global limiter shared by every rate-limited route
+limiter = create_limiter()
@@ -13,40 +13,19 @@ import hashlib
 import random
 from datetime import datetime, timedelta
 from database import db_config
+from rate_limiter import rate_limit
+from services.analytics_engine import analytics_engine
+from services.bucketing import BUCKETING_SCHEMES, default_bucketing
+from services.change_feed import change_feed
+from services.experiment_registry import bump_version, experiment_registry
+from services.exposure_log import exposure_log
+from services.ip_storage import ip_storage
 import uuid
 
 ab_testing_bp = Blueprint('ab_testing', __name__)
 
-# Rate limiting decorator (reuse from main app)
-def rate_limit(max_requests=30, window=60):
-    """Simple rate limiting decorator"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            client_ip = request.remote_addr
-            current_time = time.time()
-            
-            if not hasattr(rate_limit, 'requests'):
-                rate_limit.requests = {}
-            
-            if client_ip not in rate_limit.requests:
-                rate_limit.requests[client_ip] = []
-            
-            rate_limit.requests[client_ip] = [
-                req_time for req_time in rate_limit.requests[client_ip]
-                if current_time - req_time < window
-            ]
-            
-            if len(rate_limit.requests[client_ip]) >= max_requests:
-                return jsonify({
-                    'error': 'Rate limit exceeded',
-                    'status': 'error'
-                }), 429
-            
-            rate_limit.requests[client_ip].append(current_time)
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+# Experiments one bulk assignment request may name
+MAX_BULK_EXPERIMENTS = 100
 
 def get_user_id(request):
     """Generate consistent user ID from IP and User-Agent"""
@@ -56,7 +35,7 @@ def get_user_id(request):
     return hashlib.md5(combined.encode()).hexdigest()
 
 def assign_variant(experiment_id, user_id, traffic_split):
-    """Assign user to variant based on consistent hashing"""
+    """Assign user to variant based on consistent hashing (the md5 bucketing scheme)"""
     combined = f"{experiment_id}:{user_id}"
     hash_value = int(hashlib.md5(combined.encode()).hexdigest(), 16)
     percentage = (hash_value % 100) + 1
@@ -69,56 +48,179 @@ def assign_variant(experiment_id, user_id, traffic_split):
     
     return 'control'  # Fallback
 
+def store_assignment(experiment_id, user_id, variant, ip_address):
+    """Insert the assignment unless the user has one; returns (stored variant, existing).
+    
+    One upsert on the unique (experiment_id, user_id) key, so concurrent
+    first requests from the same user cannot both insert. SQLite returns the
+    new row's variant; MySQL has no RETURNING, so an existing row is read
+    back by primary key in the same transaction.
+    """
+    params = (experiment_id, user_id, variant) + ip_storage.values(ip_address)
+    
+    if db_config.db_type == 'mysql':
+        def upsert(cursor):
+            cursor.execute('''
+                INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+            ''', params)
+            if cursor.rowcount == 1:
+                return variant, False
+            # Affected rows is 0 when the key already existed
+            cursor.execute('SELECT variant FROM ab_assignments WHERE id = %s', (cursor.lastrowid,))
+            return cursor.fetchone()['variant'], True
+    else:
+        def upsert(cursor):
+            cursor.execute('''
+                INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (experiment_id, user_id) DO NOTHING
+                RETURNING variant
+            ''', params)
+            row = cursor.fetchone()
+            if row:
+                return row[0], False
+            cursor.execute(
+                'SELECT variant FROM ab_assignments WHERE experiment_id = ? AND user_id = ?',
+                (experiment_id, user_id)
+            )
+            return cursor.fetchone()[0], True
+    
+    return db_config.execute_write(upsert)
+
+def find_assignment(experiment_id, user_id):
+    """The user's stored variant for this experiment, or None"""
+    with db_config.connection(readonly=True) as conn:
+        cursor = conn.cursor()
+        if db_config.db_type == 'mysql':
+            cursor.execute('''
+                SELECT variant FROM ab_assignments 
+                WHERE experiment_id = %s AND user_id = %s
+            ''', (experiment_id, user_id))
+            row = cursor.fetchone()
+            return row['variant'] if row else None
+        cursor.execute('''
+            SELECT variant FROM ab_assignments 
+            WHERE experiment_id = ? AND user_id = ?
+        ''', (experiment_id, user_id))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+def find_assignments(experiment_ids, user_id):
+    """The user's stored variants for these experiments, by experiment id"""
+    if not experiment_ids:
+        return {}
+    with db_config.connection(readonly=True) as conn:
+        cursor = conn.cursor()
+        if db_config.db_type == 'mysql':
+            placeholders = ', '.join(['%s'] * len(experiment_ids))
+            cursor.execute(f'''
+                SELECT experiment_id, variant FROM ab_assignments 
+                WHERE user_id = %s AND experiment_id IN ({placeholders})
+            ''', (user_id, *experiment_ids))
+            return {row['experiment_id']: row['variant'] for row in cursor.fetchall()}
+        placeholders = ', '.join(['?'] * len(experiment_ids))
+        cursor.execute(f'''
+            SELECT experiment_id, variant FROM ab_assignments 
+            WHERE user_id = ? AND experiment_id IN ({placeholders})
+        ''', (user_id, *experiment_ids))
+        return dict(cursor.fetchall())
+
+def store_assignments(user_id, variants, ip_address):
+    """Insert one user's new assignments in one executemany.
+    
+    Returns {experiment_id: (stored variant, existing)}. Rows another
+    request inserted first are kept and read back in the same transaction.
+    """
+    mysql = db_config.db_type == 'mysql'
+    placeholder = '%s' if mysql else '?'
+    select = (
+        f'SELECT experiment_id, variant FROM ab_assignments WHERE user_id = {placeholder} '
+        f"AND experiment_id IN ({', '.join([placeholder] * len(variants))})"
+    )
+    if mysql:
+        query = '''
+            INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = id
+        '''
+    else:
+        query = '''
+            INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (experiment_id, user_id) DO NOTHING
+        '''
+    ip_values = ip_storage.values(ip_address)
+    
+    def read(cursor):
+        cursor.execute(select, (user_id, *variants))
+        rows = cursor.fetchall()
+        return {row['experiment_id']: row['variant'] for row in rows} if mysql else dict(rows)
+    
+    def insert(cursor):
+        # Assigned since the caller looked
+        result = {experiment_id: (variant, True) for experiment_id, variant in read(cursor).items()}
+        params = [(experiment_id, user_id, variant) + ip_values
+                  for experiment_id, variant in variants.items() if experiment_id not in result]
+        if params:
+            cursor.executemany(query, params)
+            if cursor.rowcount != len(params):
+                # A concurrent MySQL transaction won the race for some rows
+                return {experiment_id: (variant, True) for experiment_id, variant in read(cursor).items()}
+            result.update((row[0], (row[2], False)) for row in params)
+        return result
+    
+    return db_config.execute_write(insert)
+
 @ab_testing_bp.route('/experiments', methods=['GET'])
 @rate_limit(max_requests=50, window=60)
 def get_experiments():
     """Get all active experiments"""
     try:
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
-        
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT * FROM ab_experiments 
-                WHERE status = 'active' 
-                ORDER BY created_at DESC
-            ''')
-        else:
-            cursor.execute('''
-                SELECT * FROM ab_experiments 
-                WHERE status = 'active' 
-                ORDER BY created_at DESC
-            ''')
-        
-        experiments = []
-        for row in cursor.fetchall():
+        with db_config.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            
             if db_config.db_type == 'mysql':
-                experiment = {
-                    'id': row['id'],
-                    'name': row['name'],
-                    'description': row['description'],
-                    'variants': json.loads(row['variants']),
-                    'traffic_split': json.loads(row['traffic_split']),
-                    'status': row['status'],
-                    'created_at': str(row['created_at']),
-                    'start_date': str(row['start_date']) if row['start_date'] else None,
-                    'end_date': str(row['end_date']) if row['end_date'] else None
-                }
+                cursor.execute('''
+                    SELECT * FROM ab_experiments 
+                    WHERE status = 'active' 
+                    ORDER BY created_at DESC
+                ''')
             else:
-                experiment = {
-                    'id': row[0],
-                    'name': row[1],
-                    'description': row[2],
-                    'variants': json.loads(row[3]),
-                    'traffic_split': json.loads(row[4]),
-                    'status': row[5],
-                    'created_at': row[6],
-                    'start_date': row[7],
-                    'end_date': row[8]
-                }
-            experiments.append(experiment)
-        
-        conn.close()
+                cursor.execute('''
+                    SELECT * FROM ab_experiments 
+                    WHERE status = 'active' 
+                    ORDER BY created_at DESC
+                ''')
+            
+            experiments = []
+            for row in cursor.fetchall():
+                if db_config.db_type == 'mysql':
+                    experiment = {
+                        'id': row['id'],
+                        'name': row['name'],
+                        'description': row['description'],
+                        'variants': json.loads(row['variants']),
+                        'traffic_split': json.loads(row['traffic_split']),
+                        'status': row['status'],
+                        'created_at': str(row['created_at']),
+                        'start_date': str(row['start_date']) if row['start_date'] else None,
+                        'end_date': str(row['end_date']) if row['end_date'] else None
+                    }
+                else:
+                    experiment = {
+                        'id': row[0],
+                        'name': row[1],
+                        'description': row[2],
+                        'variants': json.loads(row[3]),
+                        'traffic_split': json.loads(row[4]),
+                        'status': row[5],
+                        'created_at': row[6],
+                        'start_date': row[7],
+                        'end_date': row[8]
+                    }
+                experiments.append(experiment)
         
         return jsonify({
             'status': 'success',
@@ -154,9 +256,9 @@ def create_experiment():
                     'status': 'error'
                 }), 400
         
-        # Validate traffic split adds up to 100
+        # Validate traffic split adds up to 100 (splits may be as fine as 0.01%)
         total_split = sum(data['traffic_split'].values())
-        if total_split != 100:
+        if abs(total_split - 100) > 1e-6:
             return jsonify({
                 'error': 'Traffic split must add up to 100%',
                 'status': 'error'
@@ -169,44 +271,45 @@ def create_experiment():
                 'status': 'error'
             }), 400
         
-        experiment_id = str(uuid.uuid4())
+        bucketing = data.get('bucketing', default_bucketing())
+        if bucketing not in BUCKETING_SCHEMES:
+            return jsonify({
+                'error': f"bucketing must be one of: {', '.join(BUCKETING_SCHEMES)}",
+                'status': 'error'
+            }), 400
         
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
+        experiment_id = str(uuid.uuid4())
         
         if db_config.db_type == 'mysql':
-            cursor.execute('''
+            query = '''
                 INSERT INTO ab_experiments 
-                (id, name, description, variants, traffic_split, status, start_date, end_date)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                experiment_id,
-                data['name'],
-                data['description'],
-                json.dumps(data['variants']),
-                json.dumps(data['traffic_split']),
-                data.get('status', 'draft'),
-                data.get('start_date'),
-                data.get('end_date')
-            ))
+                (id, name, description, variants, traffic_split, status, start_date, end_date, bucketing)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            '''
         else:
-            cursor.execute('''
+            query = '''
                 INSERT INTO ab_experiments 
-                (id, name, description, variants, traffic_split, status, start_date, end_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                experiment_id,
-                data['name'],
-                data['description'],
-                json.dumps(data['variants']),
-                json.dumps(data['traffic_split']),
-                data.get('status', 'draft'),
-                data.get('start_date'),
-                data.get('end_date')
-            ))
-        
-        conn.commit()
-        conn.close()
+                (id, name, description, variants, traffic_split, status, start_date, end_date, bucketing)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            '''
+        params = (
+            experiment_id,
+            data['name'],
+            data['description'],
+            json.dumps(data['variants']),
+            json.dumps(data['traffic_split']),
+            data.get('status', 'draft'),
+            data.get('start_date'),
+            data.get('end_date'),
+            bucketing
+        )
+        
+        def insert_experiment(cursor):
+            cursor.execute(query, params)
+            bump_version(cursor)
+        
+        db_config.execute_write(insert_experiment)
+        experiment_registry.invalidate()
         
         return jsonify({
             'status': 'success',
@@ -228,83 +331,114 @@ def assign_user_to_variant(experiment_id):
     try:
         user_id = get_user_id(request)
         
-        # Check if user already assigned
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
-        
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT variant FROM ab_assignments 
-                WHERE experiment_id = %s AND user_id = %s
-            ''', (experiment_id, user_id))
-        else:
-            cursor.execute('''
-                SELECT variant FROM ab_assignments 
-                WHERE experiment_id = ? AND user_id = ?
-            ''', (experiment_id, user_id))
-        
-        existing = cursor.fetchone()
-        if existing:
-            variant = existing['variant'] if db_config.db_type == 'mysql' else existing[0]
-            conn.close()
+        # Active experiments come pre-parsed from the in-process registry
+        experiment = experiment_registry.get(experiment_id)
+        if exposure_log.stateless:
+            if not experiment:
+                return jsonify({
+                    'error': 'Experiment not found or not active',
+                    'status': 'error'
+                }), 404
+            # The variant is a pure function of the user; the row is only an exposure record
+            variant = experiment.assign(user_id)
+            exposure_log.add(experiment_id, user_id, variant, request.remote_addr)
             return jsonify({
                 'status': 'success',
                 'variant': variant,
                 'user_id': user_id,
-                'existing_assignment': True
+                'existing_assignment': None  # unknown without a lookup
             }), 200
-        
-        # Get experiment details
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT traffic_split, status FROM ab_experiments 
-                WHERE id = %s AND status = 'active'
-            ''', (experiment_id,))
+        if not experiment:
+            # Users assigned before the experiment was paused keep their variant
+            variant = find_assignment(experiment_id, user_id)
+            if variant is None:
+                return jsonify({
+                    'error': 'Experiment not found or not active',
+                    'status': 'error'
+                }), 404
+            existing = True
         else:
-            cursor.execute('''
-                SELECT traffic_split, status FROM ab_experiments 
-                WHERE id = ? AND status = 'active'
-            ''', (experiment_id,))
+            variant, existing = store_assignment(
+                experiment_id, user_id, experiment.assign(user_id), request.remote_addr
+            )
+            if not existing:
+                change_feed.notify('ab_assignments')
         
-        experiment = cursor.fetchone()
-        if not experiment:
-            conn.close()
+        return jsonify({
+            'status': 'success',
+            'variant': variant,
+            'user_id': user_id,
+            'existing_assignment': existing
+        }), 200
+        
+    except Exception as e:
+        print(f"Error assigning variant: {str(e)}")
+        return jsonify({
+            'error': 'Failed to assign variant',
+            'status': 'error'
+        }), 500
+
+@ab_testing_bp.route('/assign', methods=['POST'])
+@rate_limit(max_requests=100, window=60)
+def assign_user_to_variants():
+    """Assign user to every active experiment, or to the requested ones, in one call"""
+    try:
+        data = request.get_json(silent=True) or {}
+        requested = data.get('experiment_ids')
+        if requested is not None and (
+            not isinstance(requested, list) or not all(isinstance(item, str) for item in requested)
+        ):
             return jsonify({
-                'error': 'Experiment not found or not active',
+                'error': 'experiment_ids must be a list of experiment ids',
                 'status': 'error'
-            }), 404
-        
-        traffic_split = json.loads(experiment['traffic_split'] if db_config.db_type == 'mysql' else experiment[0])
-        
-        # Assign variant
-        variant = assign_variant(experiment_id, user_id, traffic_split)
+            }), 400
+        if requested is not None and len(requested) > MAX_BULK_EXPERIMENTS:
+            return jsonify({
+                'error': f'At most {MAX_BULK_EXPERIMENTS} experiments per request',
+                'status': 'error'
+            }), 400
         
-        # Store assignment
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address)
-                VALUES (%s, %s, %s, %s)
-            ''', (experiment_id, user_id, variant, request.remote_addr))
+        user_id = get_user_id(request)
+        if requested is None:
+            experiments = {experiment.id: experiment for experiment in experiment_registry.active()}
+            experiment_ids = list(experiments)
         else:
-            cursor.execute('''
-                INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address)
-                VALUES (?, ?, ?, ?)
-            ''', (experiment_id, user_id, variant, request.remote_addr))
+            experiment_ids = list(dict.fromkeys(requested))
+            experiments = experiment_registry.get_many(experiment_ids)
         
-        conn.commit()
-        conn.close()
+        assignments = {}
+        if exposure_log.stateless:
+            for experiment_id, experiment in experiments.items():
+                variant = experiment.assign(user_id)
+                exposure_log.add(experiment_id, user_id, variant, request.remote_addr)
+                assignments[experiment_id] = {'variant': variant, 'existing_assignment': None}
+        else:
+            # One IN (...) lookup; users assigned before a pause keep their variant
+            for experiment_id, variant in find_assignments(experiment_ids, user_id).items():
+                assignments[experiment_id] = {'variant': variant, 'existing_assignment': True}
+            new = {
+                experiment_id: experiment.assign(user_id)
+                for experiment_id, experiment in experiments.items()
+                if experiment_id not in assignments
+            }
+            if new:
+                stored = store_assignments(user_id, new, request.remote_addr)
+                for experiment_id, (variant, existing) in stored.items():
+                    assignments[experiment_id] = {'variant': variant, 'existing_assignment': existing}
+                if not all(existing for _, existing in stored.values()):
+                    change_feed.notify('ab_assignments')
         
         return jsonify({
             'status': 'success',
-            'variant': variant,
             'user_id': user_id,
-            'existing_assignment': False
+            'assignments': assignments,
+            'not_found': [experiment_id for experiment_id in experiment_ids if experiment_id not in assignments]
         }), 200
         
     except Exception as e:
-        print(f"Error assigning variant: {str(e)}")
+        print(f"Error assigning variants: {str(e)}")
         return jsonify({
-            'error': 'Failed to assign variant',
+            'error': 'Failed to assign variants',
             'status': 'error'
         }), 500
 
@@ -332,47 +466,32 @@ def track_conversion():
         conversion_type = data.get('conversion_type', 'default')
         conversion_value = data.get('conversion_value', 1.0)
         
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
-        
-        # Get user's variant assignment
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT variant FROM ab_assignments 
-                WHERE experiment_id = %s AND user_id = %s
-            ''', (experiment_id, user_id))
-        else:
-            cursor.execute('''
-                SELECT variant FROM ab_assignments 
-                WHERE experiment_id = ? AND user_id = ?
-            ''', (experiment_id, user_id))
-        
-        assignment = cursor.fetchone()
-        if not assignment:
-            conn.close()
+        # Credit the variant the user was shown; stateless exposures may still be queued
+        variant = exposure_log.pending_variant(experiment_id, user_id) if exposure_log.stateless else None
+        if variant is None:
+            variant = find_assignment(experiment_id, user_id)
+        if variant is None:
             return jsonify({
                 'error': 'User not assigned to experiment',
                 'status': 'error'
             }), 400
         
-        variant = assignment['variant'] if db_config.db_type == 'mysql' else assignment[0]
-        
         # Track conversion
         if db_config.db_type == 'mysql':
-            cursor.execute('''
+            query = '''
                 INSERT INTO ab_conversions 
-                (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (experiment_id, user_id, variant, conversion_type, conversion_value, request.remote_addr))
+                (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address, ip_packed, ip_prefix)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            '''
         else:
-            cursor.execute('''
+            query = '''
                 INSERT INTO ab_conversions 
-                (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (experiment_id, user_id, variant, conversion_type, conversion_value, request.remote_addr))
-        
-        conn.commit()
-        conn.close()
+                (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address, ip_packed, ip_prefix)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            '''
+        params = (experiment_id, user_id, variant, conversion_type, conversion_value) + ip_storage.values(request.remote_addr)
+        db_config.execute_write(lambda cursor: cursor.execute(query, params))
+        change_feed.notify('ab_conversions')
         
         return jsonify({
             'status': 'success',
@@ -392,84 +511,30 @@ def track_conversion():
 def get_experiment_results(experiment_id):
     """Get experiment results and statistics"""
     try:
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
-        
-        # Get experiment details
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT * FROM ab_experiments WHERE id = %s
-            ''', (experiment_id,))
-        else:
-            cursor.execute('''
-                SELECT * FROM ab_experiments WHERE id = ?
-            ''', (experiment_id,))
-        
-        experiment = cursor.fetchone()
-        if not experiment:
-            conn.close()
-            return jsonify({
-                'error': 'Experiment not found',
-                'status': 'error'
-            }), 404
-        
-        # Get assignment counts by variant
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT variant, COUNT(*) as count 
-                FROM ab_assignments 
-                WHERE experiment_id = %s 
-                GROUP BY variant
-            ''', (experiment_id,))
-        else:
-            cursor.execute('''
-                SELECT variant, COUNT(*) as count 
-                FROM ab_assignments 
-                WHERE experiment_id = ? 
-                GROUP BY variant
-            ''', (experiment_id,))
-        
-        assignments = {}
-        for row in cursor.fetchall():
-            if db_config.db_type == 'mysql':
-                assignments[row['variant']] = row['count']
-            else:
-                assignments[row[0]] = row[1]
-        
-        # Get conversion counts by variant
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT variant, COUNT(*) as conversions, 
-                       SUM(conversion_value) as total_value,
-                       AVG(conversion_value) as avg_value
-                FROM ab_conversions 
-                WHERE experiment_id = %s 
-                GROUP BY variant
-            ''', (experiment_id,))
-        else:
-            cursor.execute('''
-                SELECT variant, COUNT(*) as conversions, 
-                       SUM(conversion_value) as total_value,
-                       AVG(conversion_value) as avg_value
-                FROM ab_conversions 
-                WHERE experiment_id = ? 
-                GROUP BY variant
-            ''', (experiment_id,))
-        
-        conversions = {}
-        for row in cursor.fetchall():
+        with db_config.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            # Get experiment details
             if db_config.db_type == 'mysql':
-                conversions[row['variant']] = {
-                    'count': row['conversions'],
-                    'total_value': float(row['total_value'] or 0),
-                    'avg_value': float(row['avg_value'] or 0)
-                }
+                cursor.execute('''
+                    SELECT * FROM ab_experiments WHERE id = %s
+                ''', (experiment_id,))
             else:
-                conversions[row[0]] = {
-                    'count': row[1],
-                    'total_value': float(row[2] or 0),
-                    'avg_value': float(row[3] or 0)
-                }
+                cursor.execute('''
+                    SELECT * FROM ab_experiments WHERE id = ?
+                ''', (experiment_id,))
+            
+            experiment = cursor.fetchone()
+            if not experiment:
+                return jsonify({
+                    'error': 'Experiment not found',
+                    'status': 'error'
+                }), 404
+            
+        # Per-variant counts are scan-heavy; the analytics engine runs them
+        # on DuckDB when ANALYTICS_ENGINE=duckdb
+        assignment_stats, conversions = analytics_engine.variant_stats(experiment_id)
+        assignments = {variant: data['count'] for variant, data in assignment_stats.items()}
         
         # Calculate conversion rates and statistics
         results = {}
@@ -488,8 +553,6 @@ def get_experiment_results(experiment_id):
                 'avg_value': conversion_data['avg_value']
             }
         
-        conn.close()
-        
         return jsonify({
             'status': 'success',
             'experiment_id': experiment_id,
@@ -532,32 +595,34 @@ def update_experiment_status(experiment_id):
                 'status': 'error'
             }), 400
         
-        conn = db_config.get_connection()
-        cursor = conn.cursor()
-        
         if db_config.db_type == 'mysql':
-            cursor.execute('''
+            query = '''
                 UPDATE ab_experiments 
                 SET status = %s, updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
-            ''', (data['status'], experiment_id))
+            '''
         else:
-            cursor.execute('''
+            query = '''
                 UPDATE ab_experiments 
                 SET status = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
-            ''', (data['status'], experiment_id))
-        
-        if cursor.rowcount == 0:
-            conn.close()
+            '''
+        params = (data['status'], experiment_id)
+        
+        def update_status(cursor):
+            cursor.execute(query, params)
+            if cursor.rowcount:
+                bump_version(cursor)
+            return cursor.rowcount
+        
+        updated = db_config.execute_write(update_status)
+        experiment_registry.invalidate()
+        if updated == 0:
             return jsonify({
                 'error': 'Experiment not found',
                 'status': 'error'
             }), 404
         
-        conn.commit()
-        conn.close()
-        
         return jsonify({
             'status': 'success',
             'message': f'Experiment status updated to {data["status"]}'
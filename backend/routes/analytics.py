@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Analytics API routes for portfolio backend.
+Serves raw visitor rows with keyset pagination, so browsing deep into the
+history costs the same as reading the first page.
+"""
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import json
+from database import db_config
+from rate_limiter import rate_limit
+from services.ip_storage import network_filter
+from services.visitor_partitions import visitor_partitions
+from services.visitor_strings import visitor_select
+
+analytics_bp = Blueprint('analytics', __name__)
+
+VISITOR_FIELDS = ('id', 'ip_address', 'user_agent', 'timestamp', 'country', 'city',
+                  'github_user', 'page_visited', 'referrer')
+DEFAULT_VISITOR_FIELDS = ('id', 'ip_address', 'timestamp', 'country', 'city', 'page_visited')
+MAX_PAGE_SIZE = 200
+
+
+@analytics_bp.route('/recent-visitors', methods=['GET'])
+@rate_limit(max_requests=30, window=60)
+def recent_visitors():
+    """Newest visitors first, one page per request.
+
+    Query parameters:
+        limit      rows per page (default 20, max 200)
+        before_id  return rows with id below this cursor (from next_before_id)
+        fields     comma-separated columns (id is always included)
+        network    only visitors inside this CIDR block, e.g. 203.0.113.0/24
+        format     json (default) or ndjson
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_PAGE_SIZE)
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id else None
+    except ValueError:
+        return jsonify({'error': 'limit and before_id must be integers', 'status': 'error'}), 400
+
+    requested = request.args.get('fields')
+    fields = [f.strip() for f in requested.split(',') if f.strip()] if requested else list(DEFAULT_VISITOR_FIELDS)
+    unknown = [f for f in fields if f not in VISITOR_FIELDS]
+    if unknown:
+        return jsonify({
+            'error': f"Unknown fields: {', '.join(unknown)}",
+            'status': 'error'
+        }), 400
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    conditions, params = [], []
+    network = request.args.get('network')
+    placeholder = '%s' if db_config.db_type == 'mysql' else '?'
+    if network:
+        try:
+            condition, network_params = network_filter(network, placeholder)
+        except ValueError:
+            return jsonify({'error': 'network must be a CIDR block', 'status': 'error'}), 400
+        conditions.append(condition)
+        params.extend(network_params)
+
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({'error': 'format must be json or ndjson', 'status': 'error'}), 400
+
+    # Keyset pagination on the primary key: one index range scan per page
+    # (per partition; archived months are merged in id order)
+    select, source = visitor_select(fields, source=visitor_partitions.source())
+    query = f"SELECT {select} FROM {source}"
+    if before_id is not None:
+        conditions.append(f'id < {placeholder}')
+        params.append(before_id)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY id DESC LIMIT {limit}'
+
+    def rows():
+        with db_config.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                batch = cursor.fetchmany(100)
+                if not batch:
+                    break
+                for row in batch:
+                    record = dict(row) if db_config.db_type == 'mysql' else dict(zip(fields, row))
+                    if record.get('timestamp') is not None:
+                        record['timestamp'] = str(record['timestamp'])
+                    yield record
+
+    if output_format == 'ndjson':
+        def generate_ndjson():
+            for record in rows():
+                yield json.dumps(record) + '\n'
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+
+    def generate_json():
+        yield '{"status": "success", "data": ['
+        last_id = None
+        count = 0
+        for record in rows():
+            yield (',' if count else '') + json.dumps(record)
+            last_id = record['id']
+            count += 1
+        # A short page means there is nothing older to fetch
+        next_before_id = last_id if count == limit else None
+        yield '], "next_before_id": ' + json.dumps(next_before_id) + '}'
+
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
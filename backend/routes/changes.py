@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Change feed API routes for portfolio backend.
+Lets downstream consumers tail visitors, ab_assignments and ab_conversions
+by id watermark, with long-polling and stored per-consumer offsets.
+Requires EXPORT_API_TOKEN as a bearer token.
+"""
+
+from flask import Blueprint, request, jsonify
+import re
+from rate_limiter import rate_limit
+from routes.export import has_api_token
+from services.change_feed import CHANGE_FEED_TABLES, change_feed
+
+changes_bp = Blueprint('changes', __name__)
+
+CONSUMER_PATTERN = re.compile(r'^[A-Za-z0-9_.-]{1,100}$')
+
+
+def _check_request(table):
+    if not has_api_token():
+        return jsonify({'error': 'Change feed requires a valid API token', 'status': 'error'}), 401
+    if table not in CHANGE_FEED_TABLES:
+        return jsonify({'error': 'Unknown table', 'status': 'error'}), 404
+    return None
+
+
+@changes_bp.route('/<table>', methods=['GET'])
+@rate_limit(max_requests=60, window=60)
+def tail_changes(table):
+    """Rows added after a watermark.
+
+    Query parameters:
+        after_id  watermark; defaults to the consumer's committed offset
+        consumer  consumer name, used to look up the committed offset
+        limit     maximum rows to return (capped by CHANGE_FEED_MAX_BATCH)
+        wait      seconds to long-poll when there are no new rows (capped by CHANGE_FEED_MAX_WAIT)
+    """
+    error = _check_request(table)
+    if error:
+        return error
+
+    consumer = request.args.get('consumer')
+    if consumer is not None and not CONSUMER_PATTERN.match(consumer):
+        return jsonify({'error': 'Invalid consumer name', 'status': 'error'}), 400
+    try:
+        after_id = request.args.get('after_id')
+        if after_id is not None:
+            after_id = int(after_id)
+        elif consumer:
+            after_id = change_feed.get_offset(consumer, table)
+        else:
+            after_id = 0
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({'error': 'after_id, limit and wait must be numbers', 'status': 'error'}), 400
+
+    try:
+        rows, next_after_id = change_feed.poll(table, after_id, limit=limit, wait=wait)
+    except Exception as e:
+        print(f"Database error in tail_changes: {str(e)}")
+        return jsonify({'error': 'Database error occurred', 'status': 'error'}), 500
+
+    return jsonify({
+        'status': 'success',
+        'table': table,
+        'after_id': after_id,
+        'next_after_id': next_after_id,
+        'rows': rows
+    }), 200
+
+
+@changes_bp.route('/<table>/offsets/<consumer>', methods=['PUT'])
+def commit_offset(table, consumer):
+    """Acknowledge rows up to last_id for a consumer"""
+    error = _check_request(table)
+    if error:
+        return error
+    if not CONSUMER_PATTERN.match(consumer):
+        return jsonify({'error': 'Invalid consumer name', 'status': 'error'}), 400
+
+    data = request.get_json(silent=True) or {}
+    try:
+        last_id = int(data['last_id'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'last_id is required', 'status': 'error'}), 400
+
+    try:
+        change_feed.commit_offset(consumer, table, last_id)
+    except Exception as e:
+        print(f"Database error in commit_offset: {str(e)}")
+        return jsonify({'error': 'Database error occurred', 'status': 'error'}), 500
+
+    return jsonify({
+        'status': 'success',
+        'consumer': consumer,
+        'table': table,
+        'last_id': change_feed.get_offset(consumer, table)
+    }), 200
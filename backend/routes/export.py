@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Data export API routes for portfolio backend.
+Streams visitors, contact messages and A/B testing tables as CSV or NDJSON
+for offline analysis. Requires EXPORT_API_TOKEN as a bearer token.
+"""
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import hmac
+import os
+from rate_limiter import rate_limit
+from services.data_export import EXPORT_FORMATS, EXPORT_TABLES, TableExport
+
+export_bp = Blueprint('export', __name__)
+
+
+def has_api_token():
+    """True when the request carries EXPORT_API_TOKEN as a bearer token"""
+    token = os.getenv('EXPORT_API_TOKEN')
+    if not token:
+        return False
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied, f'Bearer {token}')
+
+
+@export_bp.route('/<table>', methods=['GET'])
+@rate_limit(max_requests=10, window=300)
+def export_table(table):
+    """Stream a table in id order.
+
+    Query parameters:
+        format    ndjson (default) or csv
+        since_id  only rows with a higher id, to resume an earlier export
+        limit     stop after this many rows
+        gzip      1 to gzip the stream
+    """
+    if not has_api_token():
+        return jsonify({'error': 'Export requires a valid API token', 'status': 'error'}), 401
+    if table not in EXPORT_TABLES:
+        return jsonify({'error': 'Unknown table', 'status': 'error'}), 404
+
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be csv or ndjson', 'status': 'error'}), 400
+    try:
+        since_id = int(request.args.get('since_id', 0))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({'error': 'since_id and limit must be integers', 'status': 'error'}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true')
+
+    export = TableExport(table, fmt=fmt, since_id=since_id, limit=limit, compress=compress)
+    filename = f"{table}.{fmt}" + ('.gz' if compress else '')
+    mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+
+    response = Response(stream_with_context(export.chunks()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Export-Since-Id'] = str(since_id)
+    return response
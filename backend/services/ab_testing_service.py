@@ -11,6 +11,7 @@ import hashlib
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import db_config
+from services.analytics_engine import analytics_engine
 
 class ABTestingService:
     """Service class for A/B testing operations"""
@@ -182,133 +183,75 @@ class ABTestingService:
         return sample_size
     
     @staticmethod
-    def get_experiment_health_metrics(experiment_id: str) -> Dict:
+    def get_experiment_health_metrics(experiment_id: str, conn=None, variant_stats=None) -> Dict:
         """
         Get health metrics for an experiment
         
         Args:
             experiment_id: ID of the experiment
+            conn: read-only connection the caller already holds, if any
+            variant_stats: analytics_engine.variant_stats() result, if already read
         
         Returns:
             Dictionary with health metrics
         """
         try:
-            conn = db_config.get_connection()
-            cursor = conn.cursor()
-            
-            # Get experiment details
-            if db_config.db_type == 'mysql':
-                cursor.execute('''
-                    SELECT name, variants, traffic_split, created_at 
-                    FROM ab_experiments WHERE id = %s
-                ''', (experiment_id,))
-            else:
-                cursor.execute('''
-                    SELECT name, variants, traffic_split, created_at 
-                    FROM ab_experiments WHERE id = ?
-                ''', (experiment_id,))
-            
-            experiment = cursor.fetchone()
-            if not experiment:
-                return {'error': 'Experiment not found'}
-            
-            # Get assignment distribution
-            if db_config.db_type == 'mysql':
-                cursor.execute('''
-                    SELECT variant, COUNT(*) as count,
-                           COUNT(DISTINCT DATE(assigned_at)) as active_days
-                    FROM ab_assignments 
-                    WHERE experiment_id = %s 
-                    GROUP BY variant
-                ''', (experiment_id,))
-            else:
-                cursor.execute('''
-                    SELECT variant, COUNT(*) as count,
-                           COUNT(DISTINCT DATE(assigned_at)) as active_days
-                    FROM ab_assignments 
-                    WHERE experiment_id = ? 
-                    GROUP BY variant
-                ''', (experiment_id,))
-            
-            assignment_data = {}
-            total_assignments = 0
-            for row in cursor.fetchall():
+            with db_config.connection(readonly=True, existing=conn) as conn:
+                cursor = conn.cursor()
+                
+                # Get experiment details
                 if db_config.db_type == 'mysql':
-                    variant = row['variant']
-                    count = row['count']
-                    active_days = row['active_days']
+                    cursor.execute('''
+                        SELECT name, variants, traffic_split, created_at 
+                        FROM ab_experiments WHERE id = %s
+                    ''', (experiment_id,))
                 else:
-                    variant = row[0]
-                    count = row[1]
-                    active_days = row[2]
+                    cursor.execute('''
+                        SELECT name, variants, traffic_split, created_at 
+                        FROM ab_experiments WHERE id = ?
+                    ''', (experiment_id,))
                 
-                assignment_data[variant] = {
-                    'count': count,
-                    'active_days': active_days
-                }
-                total_assignments += count
-            
-            # Calculate traffic distribution health
-            expected_split = json.loads(experiment['traffic_split'] if db_config.db_type == 'mysql' else experiment[2])
-            traffic_health = {}
-            
-            for variant, expected_percent in expected_split.items():
-                actual_count = assignment_data.get(variant, {}).get('count', 0)
-                actual_percent = (actual_count / total_assignments * 100) if total_assignments > 0 else 0
-                expected_count = total_assignments * expected_percent / 100
+                experiment = cursor.fetchone()
+                if not experiment:
+                    return {'error': 'Experiment not found'}
                 
-                # Calculate chi-square contribution for this variant
-                chi_square_contrib = ((actual_count - expected_count) ** 2 / expected_count) if expected_count > 0 else 0
+                # Per-variant counts run on the analytics engine
+                assignment_data, conversion_stats = variant_stats or analytics_engine.variant_stats(experiment_id, conn)
+                total_assignments = sum(data['count'] for data in assignment_data.values())
                 
-                traffic_health[variant] = {
-                    'expected_percent': expected_percent,
-                    'actual_percent': round(actual_percent, 2),
-                    'deviation': round(actual_percent - expected_percent, 2),
-                    'chi_square_contrib': round(chi_square_contrib, 4)
-                }
-            
-            # Get conversion data
-            if db_config.db_type == 'mysql':
-                cursor.execute('''
-                    SELECT variant, COUNT(*) as conversions,
-                           COUNT(DISTINCT user_id) as unique_converters
-                    FROM ab_conversions 
-                    WHERE experiment_id = %s 
-                    GROUP BY variant
-                ''', (experiment_id,))
-            else:
-                cursor.execute('''
-                    SELECT variant, COUNT(*) as conversions,
-                           COUNT(DISTINCT user_id) as unique_converters
-                    FROM ab_conversions 
-                    WHERE experiment_id = ? 
-                    GROUP BY variant
-                ''', (experiment_id,))
-            
-            conversion_data = {}
-            for row in cursor.fetchall():
-                if db_config.db_type == 'mysql':
-                    variant = row['variant']
-                    conversions = row['conversions']
-                    unique_converters = row['unique_converters']
-                else:
-                    variant = row[0]
-                    conversions = row[1]
-                    unique_converters = row[2]
+                # Calculate traffic distribution health
+                expected_split = json.loads(experiment['traffic_split'] if db_config.db_type == 'mysql' else experiment[2])
+                traffic_health = {}
                 
-                conversion_data[variant] = {
-                    'conversions': conversions,
-                    'unique_converters': unique_converters
+                for variant, expected_percent in expected_split.items():
+                    actual_count = assignment_data.get(variant, {}).get('count', 0)
+                    actual_percent = (actual_count / total_assignments * 100) if total_assignments > 0 else 0
+                    expected_count = total_assignments * expected_percent / 100
+                    
+                    # Calculate chi-square contribution for this variant
+                    chi_square_contrib = ((actual_count - expected_count) ** 2 / expected_count) if expected_count > 0 else 0
+                    
+                    traffic_health[variant] = {
+                        'expected_percent': expected_percent,
+                        'actual_percent': round(actual_percent, 2),
+                        'deviation': round(actual_percent - expected_percent, 2),
+                        'chi_square_contrib': round(chi_square_contrib, 4)
+                    }
+                
+                conversion_data = {
+                    variant: {
+                        'conversions': data['count'],
+                        'unique_converters': data['unique_converters']
+                    }
+                    for variant, data in conversion_stats.items()
                 }
-            
-            # Calculate experiment runtime
-            created_at = experiment['created_at'] if db_config.db_type == 'mysql' else experiment[3]
-            if isinstance(created_at, str):
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            
-            runtime_days = (datetime.now() - created_at).days
-            
-            conn.close()
+                
+                # Calculate experiment runtime
+                created_at = experiment['created_at'] if db_config.db_type == 'mysql' else experiment[3]
+                if isinstance(created_at, str):
+                    created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+                
+                runtime_days = (datetime.now() - created_at).days
             
             return {
                 'experiment_name': experiment['name'] if db_config.db_type == 'mysql' else experiment[0],
@@ -368,47 +311,48 @@ class ABTestingService:
             Dictionary with comprehensive report data
         """
         try:
-            conn = db_config.get_connection()
-            cursor = conn.cursor()
-            
-            # Get experiment details
-            if db_config.db_type == 'mysql':
-                cursor.execute('''
-                    SELECT * FROM ab_experiments WHERE id = %s
-                ''', (experiment_id,))
-            else:
-                cursor.execute('''
-                    SELECT * FROM ab_experiments WHERE id = ?
-                ''', (experiment_id,))
-            
-            experiment = cursor.fetchone()
-            if not experiment:
-                return {'error': 'Experiment not found'}
-            
-            # Get detailed results
-            results = ABTestingService._get_detailed_results(cursor, experiment_id)
-            
-            # Get health metrics
-            health_metrics = ABTestingService.get_experiment_health_metrics(experiment_id)
-            
-            # Calculate statistical significance for each variant vs control
-            control_variant = 'control'  # Assume 'control' is the control variant
-            statistical_analysis = {}
-            
-            if control_variant in results and len(results) > 1:
-                control_data = results[control_variant]
+            with db_config.connection(readonly=True) as conn:
+                cursor = conn.cursor()
                 
-                for variant, data in results.items():
-                    if variant != control_variant:
-                        stats = ABTestingService.calculate_statistical_significance(
-                            control_data['conversions'],
-                            control_data['assignments'],
-                            data['conversions'],
-                            data['assignments']
-                        )
-                        statistical_analysis[variant] = stats
-            
-            conn.close()
+                # Get experiment details
+                if db_config.db_type == 'mysql':
+                    cursor.execute('''
+                        SELECT * FROM ab_experiments WHERE id = %s
+                    ''', (experiment_id,))
+                else:
+                    cursor.execute('''
+                        SELECT * FROM ab_experiments WHERE id = ?
+                    ''', (experiment_id,))
+                
+                experiment = cursor.fetchone()
+                if not experiment:
+                    return {'error': 'Experiment not found'}
+                
+                # One read of the per-variant counts, on this connection, feeds both
+                variant_stats = analytics_engine.variant_stats(experiment_id, conn)
+                
+                # Get detailed results
+                results = ABTestingService._get_detailed_results(variant_stats)
+                
+                # Get health metrics
+                health_metrics = ABTestingService.get_experiment_health_metrics(experiment_id, conn, variant_stats)
+                
+                # Calculate statistical significance for each variant vs control
+                control_variant = 'control'  # Assume 'control' is the control variant
+                statistical_analysis = {}
+                
+                if control_variant in results and len(results) > 1:
+                    control_data = results[control_variant]
+                    
+                    for variant, data in results.items():
+                        if variant != control_variant:
+                            stats = ABTestingService.calculate_statistical_significance(
+                                control_data['conversions'],
+                                control_data['assignments'],
+                                data['conversions'],
+                                data['assignments']
+                            )
+                            statistical_analysis[variant] = stats
             
             return {
                 'experiment_id': experiment_id,
@@ -425,65 +369,10 @@ class ABTestingService:
             return {'error': f'Failed to generate report: {str(e)}'}
     
     @staticmethod
-    def _get_detailed_results(cursor, experiment_id: str) -> Dict:
-        """Get detailed results for experiment"""
-        # Get assignment counts
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT variant, COUNT(*) as count 
-                FROM ab_assignments 
-                WHERE experiment_id = %s 
-                GROUP BY variant
-            ''', (experiment_id,))
-        else:
-            cursor.execute('''
-                SELECT variant, COUNT(*) as count 
-                FROM ab_assignments 
-                WHERE experiment_id = ? 
-                GROUP BY variant
-            ''', (experiment_id,))
-        
-        assignments = {}
-        for row in cursor.fetchall():
-            if db_config.db_type == 'mysql':
-                assignments[row['variant']] = row['count']
-            else:
-                assignments[row[0]] = row[1]
-        
-        # Get conversion data
-        if db_config.db_type == 'mysql':
-            cursor.execute('''
-                SELECT variant, COUNT(*) as conversions, 
-                       SUM(conversion_value) as total_value,
-                       AVG(conversion_value) as avg_value
-                FROM ab_conversions 
-                WHERE experiment_id = %s 
-                GROUP BY variant
-            ''', (experiment_id,))
-        else:
-            cursor.execute('''
-                SELECT variant, COUNT(*) as conversions, 
-                       SUM(conversion_value) as total_value,
-                       AVG(conversion_value) as avg_value
-                FROM ab_conversions 
-                WHERE experiment_id = ? 
-                GROUP BY variant
-            ''', (experiment_id,))
-        
-        conversions = {}
-        for row in cursor.fetchall():
-            if db_config.db_type == 'mysql':
-                conversions[row['variant']] = {
-                    'count': row['conversions'],
-                    'total_value': float(row['total_value'] or 0),
-                    'avg_value': float(row['avg_value'] or 0)
-                }
-            else:
-                conversions[row[0]] = {
-                    'count': row[1],
-                    'total_value': float(row[2] or 0),
-                    'avg_value': float(row[3] or 0)
-                }
+    def _get_detailed_results(variant_stats: Tuple[Dict, Dict]) -> Dict:
+        """Get detailed results for experiment from its analytics_engine.variant_stats()"""
+        assignment_stats, conversions = variant_stats
+        assignments = {variant: data['count'] for variant, data in assignment_stats.items()}
         
         # Combine results
         results = {}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Analytics Response Cache
+Caches assembled /api/analytics payloads until the data behind them
+changes. Writers bump a monotonically increasing write version; a cached
+payload is served only while its version is current and it is younger than
+the max-staleness TTL. Concurrent misses for the same key share one
+computation.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class AnalyticsCache:
+    """Version-invalidated payload cache with request coalescing.
+
+    The write version is per process, so writes made by other workers are
+    only picked up once max_staleness has passed.
+    """
+
+    def __init__(self, max_staleness: float = 30):
+        self.max_staleness = max_staleness
+
+        self._version = 0
+        self._entries: Dict[Hashable, Tuple[int, float, Any]] = {}  # key -> (version, computed_at, payload)
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'stale': 0,
+            'invalidations': 0,
+            'errors': 0
+        }
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> int:
+        """Record a write; cached payloads computed before it are no longer served"""
+        with self._lock:
+            self._version += 1
+            self._counters['invalidations'] += 1
+            return self._version
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Return the cached payload for key, computing it at most once at a time"""
+        with self._lock:
+            version = self._version
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version and time.monotonic() - entry[1] < self.max_staleness:
+                    self._counters['hits'] += 1
+                    return entry[2]
+                self._counters['stale'] += 1
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._counters['coalesced'] += 1
+                owner = False
+            else:
+                future = self._in_flight[key] = Future()
+                self._counters['misses'] += 1
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            payload = compute()
+        except Exception as e:
+            with self._lock:
+                self._counters['errors'] += 1
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            # Tag with the version read before computing, so a write that
+            # lands mid-computation still invalidates this payload
+            self._entries[key] = (version, time.monotonic(), payload)
+            del self._in_flight[key]
+        future.set_result(payload)
+        return payload
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+            stats['version'] = self._version
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = round((stats['hits'] + stats['coalesced']) / lookups, 4) if lookups else 0.0
+        stats['max_staleness'] = self.max_staleness
+        return stats
+
+
+# Global cache used by /api/analytics
+analytics_cache = AnalyticsCache(max_staleness=float(os.getenv('ANALYTICS_CACHE_TTL', 30)))
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Analytics Engine
+Runs the scan-heavy aggregations: ad-hoc visitor breakdowns for
+/api/analytics and per-variant A/B results. The engine is selected with
+ANALYTICS_ENGINE:
+    sql     queries the primary database (default)
+    duckdb  queries an embedded DuckDB (pip install duckdb)
+
+The row store stays the source of truth. DuckDB reads it in one of two
+ways, selected with ANALYTICS_DUCKDB_MODE:
+    snapshot  Parquet copies of the event tables, refreshed in the
+              background once older than ANALYTICS_SNAPSHOT_MAX_AGE
+              (default; works with SQLite and MySQL)
+    attach    the SQLite file attached read-only through DuckDB's sqlite
+              extension, so results are always current
+"""
+
+import calendar
+import itertools
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from database import db_config
+from services.data_export import EXPORT_TABLES, TableExport
+from services.visitor_partitions import visitor_partitions
+from services.visitor_strings import DICTIONARIES, visitor_select
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+SNAPSHOT_TABLES = ('visitors', 'ab_assignments', 'ab_conversions')
+
+BREAKDOWN_DIMENSIONS = ('country', 'city', 'page', 'referrer', 'github', 'day', 'hour')
+
+# Snapshot column types; anything not listed is VARCHAR
+_COLUMN_TYPES = {
+    'id': 'BIGINT',
+    'timestamp': 'TIMESTAMP',
+    'assigned_at': 'TIMESTAMP',
+    'converted_at': 'TIMESTAMP',
+    'conversion_value': 'DOUBLE'
+}
+
+_BUCKET_FORMATS = {'day': '%Y-%m-%d', 'hour': '%Y-%m-%d %H:00:00'}
+
+# Seconds per bucket; SQLite groups on timestamp_epoch / width and formats each group once
+_BUCKET_SECONDS = {'day': 86400, 'hour': 3600}
+
+# Breakdown dimensions stored as dictionary ids -> visitors text column
+_ENCODED_DIMENSIONS = {'page': 'page_visited', 'referrer': 'referrer'}
+
+
+def _sql_string(value: str) -> str:
+    """Quote a file path as a DuckDB string literal"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _dimension_sql(dimension: str, dialect: str) -> str:
+    """SQL expression for one breakdown dimension in sqlite, mysql or duckdb"""
+    if dimension in _BUCKET_FORMATS:
+        fmt = _BUCKET_FORMATS[dimension]
+        if dialect == 'mysql':
+            # Doubled for PyMySQL's %-style parameter substitution
+            return f"DATE_FORMAT(timestamp, '{fmt.replace('%', '%%')}')"
+        if dialect == 'duckdb':
+            return f"strftime(CAST(\"timestamp\" AS TIMESTAMP), '{fmt}')"
+        return f'timestamp_epoch / {_BUCKET_SECONDS[dimension]}'
+    return {
+        'country': "COALESCE(country, 'Unknown')",
+        'city': "COALESCE(city, 'Unknown')",
+        'page': "COALESCE(page_visited, '')",
+        'referrer': "COALESCE(referrer, '')",
+        'github': "CASE WHEN github_user IS NOT NULL THEN '1' ELSE '0' END"
+    }[dimension]
+
+
+def breakdown_query(dimensions: Sequence[str], start: Optional[datetime], end: Optional[datetime],
+                    limit: int, dialect: str, tables: Sequence[str] = ('visitors',)) -> Tuple[str, List]:
+    """GROUP BY query counting visits per combination of dimensions.
+
+    On the row store, pages and referrers are grouped on their dictionary
+    ids (an index-only scan for a single dimension) and decoded once per
+    group. Rows stored without ids are grouped on their inline text in a
+    separate UNION ALL branch that the id index narrows to just those rows.
+    SQLite filters and buckets on the integer timestamp_epoch column. DuckDB
+    reads decoded strings and groups on those. Each of tables (e.g. the
+    visitors partitions overlapping the range) gets its own branches, so
+    every one is scanned through its own indexes.
+    """
+    unknown = [dimension for dimension in dimensions if dimension not in BREAKDOWN_DIMENSIONS]
+    if unknown or not dimensions:
+        raise ValueError(f"group_by must be drawn from: {', '.join(BREAKDOWN_DIMENSIONS)}")
+
+    placeholder = '%s' if dialect == 'mysql' else '?'
+    timestamp = {'duckdb': 'CAST("timestamp" AS TIMESTAMP)', 'sqlite': 'timestamp_epoch'}.get(dialect, 'timestamp')
+    conditions, bounds = [], []
+    for bound, operator in ((start, '>='), (end, '<')):
+        if bound is not None:
+            conditions.append(f'{timestamp} {operator} {placeholder}')
+            # SQLite filters on the indexed integer copy of the UTC timestamp
+            bounds.append(calendar.timegm(bound.utctimetuple()) if dialect == 'sqlite' else bound)
+
+    encoded = [i for i, dimension in enumerate(dimensions)
+               if dimension in _ENCODED_DIMENSIONS and dialect != 'duckdb']
+    branches, params = [], []
+    for table, has_ids in itertools.product(tables, itertools.product((True, False), repeat=len(encoded))):
+        keys, group_by, where = [], [], list(conditions)
+        for i, dimension in enumerate(dimensions):
+            if i in encoded:
+                text_column = _ENCODED_DIMENSIONS[dimension]
+                id_column = DICTIONARIES[text_column][1]
+                if has_ids[encoded.index(i)]:
+                    keys += [f'{id_column} AS k{i}', f'NULL AS t{i}']
+                    group_by.append(id_column)
+                    where.append(f'{id_column} IS NOT NULL')
+                else:
+                    keys += [f'NULL AS k{i}', f'{text_column} AS t{i}']
+                    group_by.append(text_column)
+                    where.append(f'{id_column} IS NULL')
+            else:
+                expression = _dimension_sql(dimension, dialect)
+                keys.append(f'{expression} AS k{i}')
+                group_by.append(expression)
+        branches.append(f'''
+            SELECT {', '.join(keys)}, COUNT(*) AS visits
+            FROM {table}
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            GROUP BY {', '.join(group_by)}
+        ''')
+        params += bounds
+
+    outputs, joins = [], []
+    for i, dimension in enumerate(dimensions):
+        if i in encoded:
+            table, id_column = DICTIONARIES[_ENCODED_DIMENSIONS[dimension]]
+            outputs.append(f"COALESCE(d{i}.value, grouped.t{i}, '') AS {dimension}")
+            joins.append(f'LEFT JOIN {table} d{i} ON d{i}.{id_column} = grouped.k{i}')
+        elif dimension in _BUCKET_SECONDS and dialect == 'sqlite':
+            seconds = _BUCKET_SECONDS[dimension]
+            outputs.append(f"strftime('{_BUCKET_FORMATS[dimension]}', grouped.k{i} * {seconds}, 'unixepoch') AS {dimension}")
+        else:
+            outputs.append(f'grouped.k{i} AS {dimension}')
+
+    positions = ', '.join(str(i + 1) for i in range(len(dimensions)))
+    query = f'''
+        SELECT {', '.join(outputs)}, SUM(grouped.visits) AS visits
+        FROM ({' UNION ALL '.join(branches)}) grouped
+        {' '.join(joins)}
+        GROUP BY {positions}
+        ORDER BY visits DESC, {positions}
+        LIMIT {int(limit)}
+    '''
+    return query, params
+
+
+class AnalyticsEngine(ABC):
+    """Interface for analytics query engines"""
+
+    name = 'base'
+
+    @abstractmethod
+    def visitor_breakdown(self, dimensions: Sequence[str], start: Optional[datetime] = None,
+                          end: Optional[datetime] = None, limit: int = 100) -> List[Dict]:
+        """Visit counts per combination of dimensions, largest first"""
+
+    @abstractmethod
+    def variant_stats(self, experiment_id: str, conn=None) -> Tuple[Dict, Dict]:
+        """Per-variant (assignments, conversions) for an experiment.
+
+        assignments maps variant -> {count, active_days}; conversions maps
+        variant -> {count, unique_converters, total_value, avg_value}.
+        Engines reading the application database use conn when given.
+        """
+
+    def stats(self) -> Dict:
+        return {'engine': self.name}
+
+    def close(self) -> None:
+        pass
+
+    @staticmethod
+    def _variant_dicts(assignment_rows, conversion_rows) -> Tuple[Dict, Dict]:
+        assignments = {
+            variant: {'count': int(count), 'active_days': int(active_days)}
+            for variant, count, active_days in assignment_rows
+        }
+        conversions = {
+            variant: {
+                'count': int(count),
+                'unique_converters': int(unique_converters),
+                'total_value': float(total_value or 0),
+                'avg_value': float(avg_value or 0)
+            }
+            for variant, count, unique_converters, total_value, avg_value in conversion_rows
+        }
+        return assignments, conversions
+
+
+class SQLAnalyticsEngine(AnalyticsEngine):
+    """Runs the aggregations on the primary database's read-only pool"""
+
+    name = 'sql'
+
+    def __init__(self, database=None):
+        self.database = database or db_config
+
+    def visitor_breakdown(self, dimensions, start=None, end=None, limit=100):
+        # Only the partitions overlapping [start, end) are read
+        query, params = breakdown_query(dimensions, start, end, limit, self.database.db_type,
+                                        visitor_partitions.tables(start, end))
+        with self.database.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        columns = list(dimensions) + ['visits']
+        if self.database.db_type == 'mysql':
+            return [{column: row[column] for column in columns} for row in rows]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def variant_stats(self, experiment_id, conn=None):
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        # SQLite counts days from the covering (experiment_id, variant, assigned_at_epoch) index
+        day = 'DATE(assigned_at)' if self.database.db_type == 'mysql' else 'assigned_at_epoch / 86400'
+        with self.database.connection(readonly=True, existing=conn) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT variant, COUNT(*) AS count, COUNT(DISTINCT {day}) AS active_days
+                FROM ab_assignments
+                WHERE experiment_id = {placeholder}
+                GROUP BY variant
+            ''', (experiment_id,))
+            assignment_rows = cursor.fetchall()
+            cursor.execute(f'''
+                SELECT variant, COUNT(*) AS conversions, COUNT(DISTINCT user_id) AS unique_converters,
+                       SUM(conversion_value) AS total_value, AVG(conversion_value) AS avg_value
+                FROM ab_conversions
+                WHERE experiment_id = {placeholder}
+                GROUP BY variant
+            ''', (experiment_id,))
+            conversion_rows = cursor.fetchall()
+        if self.database.db_type == 'mysql':
+            assignment_rows = [tuple(row.values()) for row in assignment_rows]
+            conversion_rows = [tuple(row.values()) for row in conversion_rows]
+        return self._variant_dicts(assignment_rows, conversion_rows)
+
+
+class DuckDBAnalyticsEngine(AnalyticsEngine):
+    """Runs the aggregations in an embedded, columnar DuckDB.
+
+    Each query uses its own cursor on one in-memory DuckDB database whose
+    views point at the attached SQLite tables or the current Parquet
+    snapshot. A stale snapshot is rebuilt in a background thread while
+    queries keep reading the previous one; only the very first query waits
+    for a snapshot to exist.
+    """
+
+    name = 'duckdb'
+
+    def __init__(self, database=None, mode: str = 'snapshot', snapshot_dir: Optional[str] = None,
+                 snapshot_max_age: float = 300, threads: Optional[int] = None):
+        if duckdb is None:
+            raise RuntimeError('duckdb is not installed (pip install duckdb)')
+        if mode not in ('snapshot', 'attach'):
+            raise ValueError(f"Unknown DuckDB mode '{mode}'; expected snapshot or attach")
+        self.database = database or db_config
+        if mode == 'attach' and self.database.db_type != 'sqlite':
+            raise ValueError('attach mode needs SQLite; use snapshot mode with MySQL')
+        self.mode = mode
+        self.snapshot_dir = snapshot_dir or os.path.join(tempfile.gettempdir(), 'portfolio-analytics')
+        self.snapshot_max_age = snapshot_max_age
+
+        self._conn = duckdb.connect(':memory:', config={'threads': threads} if threads else {})
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._snapshot_at = None
+        self._files: List[str] = []
+        self._previous_files: List[str] = []
+        self._counters = {'queries': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+        self._visitors_source = None
+        if mode == 'attach':
+            self._conn.execute(f"ATTACH {_sql_string(self.database._sqlite_path())} AS src (TYPE sqlite, READ_ONLY)")
+            for table in SNAPSHOT_TABLES:
+                if table != 'visitors':
+                    self._conn.execute(f'CREATE VIEW {table} AS SELECT * FROM src.{table}')
+            self._attach_visitors()
+        else:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.database.on_shutdown(self.close)
+
+    def visitor_breakdown(self, dimensions, start=None, end=None, limit=100):
+        query, params = breakdown_query(dimensions, start, end, limit, 'duckdb')
+        columns = list(dimensions) + ['visits']
+        return [dict(zip(columns, row)) for row in self._query(query, params)]
+
+    def variant_stats(self, experiment_id, conn=None):
+        assignment_rows = self._query('''
+            SELECT variant, COUNT(*), COUNT(DISTINCT CAST(assigned_at AS DATE))
+            FROM ab_assignments
+            WHERE experiment_id = ?
+            GROUP BY variant
+        ''', [experiment_id])
+        conversion_rows = self._query('''
+            SELECT variant, COUNT(*), COUNT(DISTINCT user_id),
+                   SUM(conversion_value), AVG(conversion_value)
+            FROM ab_conversions
+            WHERE experiment_id = ?
+            GROUP BY variant
+        ''', [experiment_id])
+        return self._variant_dicts(assignment_rows, conversion_rows)
+
+    def refresh(self) -> None:
+        """Rebuild the Parquet snapshot from the primary database and swap it in"""
+        self._refresh()
+
+    def _refresh(self, only_if_missing: bool = False) -> None:
+        if self.mode != 'snapshot':
+            return
+        with self._refresh_lock:
+            if only_if_missing and self._snapshot_at is not None:
+                return
+            generation = time.strftime('%Y%m%d%H%M%S') + f'-{time.monotonic_ns()}'
+            cursor = self._conn.cursor()
+            files = []
+            try:
+                for table in SNAPSHOT_TABLES:
+                    files.append(self._snapshot_table(cursor, table, generation))
+            except Exception:
+                self._remove(files)
+                with self._lock:
+                    self._counters['refresh_errors'] += 1
+                raise
+            finally:
+                cursor.close()
+
+            with self._lock:
+                for table, path in zip(SNAPSHOT_TABLES, files):
+                    self._conn.execute(
+                        f'CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet({_sql_string(path)})'
+                    )
+                # Queries that started before the swap may still read the
+                # previous files, so only the generation before that goes
+                stale, self._previous_files, self._files = self._previous_files, self._files, files
+                self._snapshot_at = time.time()
+                self._counters['refreshes'] += 1
+            self._remove(stale)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters, engine=self.name, mode=self.mode)
+            if self.mode == 'snapshot':
+                stats['snapshot_age'] = round(time.time() - self._snapshot_at, 1) if self._snapshot_at else None
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._remove(self._files + self._previous_files)
+            self._files, self._previous_files = [], []
+
+    def _query(self, query: str, params: List) -> List[Tuple]:
+        self._ensure_snapshot()
+        with self._lock:
+            self._counters['queries'] += 1
+            cursor = self._conn.cursor()
+        try:
+            return cursor.execute(query, params).fetchall()
+        finally:
+            cursor.close()
+
+    def _attach_visitors(self) -> None:
+        """(Re)point the attached visitors view at the current visitors partitions"""
+        source = visitor_partitions.source(prefix='src.')
+        if source == self._visitors_source:
+            return
+        # DuckDB has no INET6_NTOA(), and no analytics query reads the address
+        columns = [column for column in EXPORT_TABLES['visitors'] if column != 'ip_address']
+        select, source_sql = visitor_select(columns, prefix='src.', source=source)
+        self._conn.execute(f'CREATE OR REPLACE VIEW visitors AS SELECT {select} FROM {source_sql}')
+        self._visitors_source = source
+
+    def _ensure_snapshot(self) -> None:
+        if self.mode != 'snapshot':
+            with self._lock:
+                self._attach_visitors()
+            return
+        if self._snapshot_at is None:
+            self._refresh(only_if_missing=True)
+        elif time.time() - self._snapshot_at > self.snapshot_max_age and not self._refresh_lock.locked():
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Analytics snapshot refresh failed: {str(e)}")
+
+    def _snapshot_table(self, cursor, table: str, generation: str) -> str:
+        """Stream table to NDJSON through the exporter, then convert it to Parquet"""
+        ndjson_path = os.path.join(self.snapshot_dir, f'{table}.{generation}.ndjson')
+        parquet_path = os.path.join(self.snapshot_dir, f'{table}.{generation}.parquet')
+        try:
+            with open(ndjson_path, 'wb') as f:
+                for chunk in TableExport(table, fmt='ndjson', batch_size=5000, database=self.database).chunks():
+                    f.write(chunk)
+            columns = ', '.join(f"'{column}': '{_COLUMN_TYPES.get(column, 'VARCHAR')}'"
+                                for column in EXPORT_TABLES[table])
+            cursor.execute(f'''
+                COPY (SELECT * FROM read_json({_sql_string(ndjson_path)}, format = 'newline_delimited',
+                                              columns = {{{columns}}}))
+                TO {_sql_string(parquet_path)} (FORMAT parquet, COMPRESSION zstd)
+            ''')
+        finally:
+            self._remove([ndjson_path])
+        return parquet_path
+
+    @staticmethod
+    def _remove(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def create_analytics_engine(engine: Optional[str] = None) -> AnalyticsEngine:
+    """Build the engine selected by ANALYTICS_ENGINE, falling back to sql"""
+    engine = (engine or os.getenv('ANALYTICS_ENGINE', 'sql')).lower()
+    if engine == 'duckdb':
+        threads = os.getenv('ANALYTICS_DUCKDB_THREADS')
+        try:
+            return DuckDBAnalyticsEngine(
+                mode=os.getenv('ANALYTICS_DUCKDB_MODE', 'snapshot').lower(),
+                snapshot_dir=os.getenv('ANALYTICS_SNAPSHOT_DIR'),
+                snapshot_max_age=float(os.getenv('ANALYTICS_SNAPSHOT_MAX_AGE', 300)),
+                threads=int(threads) if threads else None
+            )
+        except Exception as e:
+            print(f"WARNING: Analytics engine 'duckdb' unavailable, using sql: {str(e)}")
+    return SQLAnalyticsEngine()
+
+
+# Global engine used by /api/analytics breakdowns and the A/B reports
+analytics_engine = create_analytics_engine()
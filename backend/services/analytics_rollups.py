@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Analytics Rollups
+Hourly and daily visit counts by country, page, referrer and GitHub flag,
+maintained incrementally as visits are written. /api/analytics reads these
+tables instead of scanning the visitors table, both for all-time totals and
+for hourly, daily and weekly time series.
+
+Each rollup row is (dimension, bucket, value, visits). Buckets are the
+'YYYY-MM-DD HH:00:00' start of the hour or day (UTC). Dimensions:
+    total     every visit (value '')
+    country   visitor country
+    page      page_visited
+    referrer  referrer
+    github    '1' when github_user is set, otherwise '0'
+    messages  contact messages (value '')
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from database import db_config
+
+ROLLUP_TABLES = {
+    'hour': 'analytics_hourly_rollups',
+    'day': 'analytics_daily_rollups'
+}
+
+GRANULARITIES = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1)
+}
+
+# Positions of the rolled-up columns in a visit_buffer row
+_TIMESTAMP, _COUNTRY, _GITHUB_USER, _PAGE, _REFERRER = 2, 3, 5, 6, 7
+
+
+def bucket_start(timestamp, granularity: str) -> str:
+    """Start of the hour or day containing timestamp, as 'YYYY-MM-DD HH:00:00'"""
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    if granularity == 'hour':
+        return f'{timestamp[:13]}:00:00'
+    return f'{timestamp[:10]} 00:00:00'
+
+
+def visit_values(country: Optional[str], github_user: Optional[str], page_visited: Optional[str],
+                 referrer: Optional[str]) -> List[Tuple[str, str]]:
+    """(dimension, value) pairs a single visit is counted under"""
+    return [
+        ('total', ''),
+        ('country', country or 'Unknown'),
+        ('page', page_visited or ''),
+        ('referrer', referrer or ''),
+        ('github', '1' if github_user is not None else '0')
+    ]
+
+
+def visit_deltas(rows: Iterable[Tuple]) -> Counter:
+    """Rollup increments for rows in visit_buffer column order"""
+    deltas = Counter()
+    for row in rows:
+        values = visit_values(row[_COUNTRY], row[_GITHUB_USER], row[_PAGE], row[_REFERRER])
+        for granularity in ROLLUP_TABLES:
+            bucket = bucket_start(row[_TIMESTAMP], granularity)
+            for dimension, value in values:
+                deltas[(granularity, dimension, bucket, value)] += 1
+    return deltas
+
+
+def country_change_deltas(timestamps: Iterable, old_country: str, new_country: str) -> Counter:
+    """Rollup adjustments for visits whose country changes (e.g. pending -> resolved)"""
+    deltas = Counter()
+    for timestamp in timestamps:
+        for granularity in ROLLUP_TABLES:
+            bucket = bucket_start(timestamp, granularity)
+            deltas[(granularity, 'country', bucket, old_country)] -= 1
+            deltas[(granularity, 'country', bucket, new_country)] += 1
+    return deltas
+
+
+def message_deltas(timestamp: Optional[str] = None) -> Counter:
+    """Rollup increments for one contact message"""
+    timestamp = timestamp or datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return Counter({
+        (granularity, 'messages', bucket_start(timestamp, granularity), ''): 1
+        for granularity in ROLLUP_TABLES
+    })
+
+
+def apply_deltas(cursor, deltas: Counter, database=None) -> None:
+    """Upsert rollup deltas; call inside the write transaction that stored the events"""
+    database = database or db_config
+    by_table: Dict[str, List[Tuple]] = {}
+    for (granularity, dimension, bucket, value), visits in deltas.items():
+        if visits:
+            by_table.setdefault(ROLLUP_TABLES[granularity], []).append((dimension, bucket, value, visits))
+
+    for table, params in by_table.items():
+        if database.db_type == 'mysql':
+            query = f'''
+                INSERT INTO {table} (dimension, bucket, value, visits)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE visits = visits + VALUES(visits)
+            '''
+        else:
+            query = f'''
+                INSERT INTO {table} (dimension, bucket, value, visits)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (dimension, bucket, value) DO UPDATE SET visits = visits + excluded.visits
+            '''
+        cursor.executemany(query, params)
+
+
+def read_total(cursor, dimension: str, value: str = '', database=None) -> int:
+    """All-time count for one dimension value"""
+    database = database or db_config
+    placeholder = '%s' if database.db_type == 'mysql' else '?'
+    cursor.execute(
+        f'SELECT COALESCE(SUM(visits), 0) AS total FROM {ROLLUP_TABLES["day"]} '
+        f'WHERE dimension = {placeholder} AND value = {placeholder}',
+        (dimension, value)
+    )
+    row = cursor.fetchone()
+    return int(row['total'] if database.db_type == 'mysql' else row[0])
+
+
+def read_top(cursor, dimension: str, limit: int, database=None) -> List[List]:
+    """All-time [value, count] pairs for a dimension, largest first"""
+    database = database or db_config
+    placeholder = '%s' if database.db_type == 'mysql' else '?'
+    cursor.execute(f'''
+        SELECT value, SUM(visits) AS count FROM {ROLLUP_TABLES["day"]}
+        WHERE dimension = {placeholder}
+        GROUP BY value
+        HAVING SUM(visits) > 0
+        ORDER BY count DESC
+        LIMIT {int(limit)}
+    ''', (dimension,))
+    if database.db_type == 'mysql':
+        return [[row['value'], int(row['count'])] for row in cursor.fetchall()]
+    return [[row[0], row[1]] for row in cursor.fetchall()]
+
+
+def floor_bucket(moment: datetime, granularity: str) -> datetime:
+    """Start of the hour, day or ISO week (Monday) containing moment"""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def bucket_count(start: datetime, end: datetime, granularity: str) -> int:
+    """Number of buckets covering [start, end)"""
+    first = floor_bucket(start, granularity)
+    if end <= first:
+        return 0
+    step = GRANULARITIES[granularity]
+    return -(-(end - first) // step)
+
+
+def iter_time_series(start: datetime, end: datetime, granularity: str,
+                     database=None, fetch_size: int = 500) -> Iterator[Tuple[str, int]]:
+    """Yield (bucket, visits) for every bucket in [start, end), zero-filled.
+
+    Hourly series read the hourly rollups and daily/weekly series read the
+    daily rollups, each as one primary key range scan. Weeks start on Monday.
+    """
+    database = database or db_config
+    placeholder = '%s' if database.db_type == 'mysql' else '?'
+    table = ROLLUP_TABLES['hour' if granularity == 'hour' else 'day']
+    step = GRANULARITIES[granularity]
+    fmt = '%Y-%m-%d %H:%M:%S'
+    bucket = floor_bucket(start, granularity)
+
+    with database.connection(readonly=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT bucket, visits FROM {table}
+            WHERE dimension = 'total' AND value = '' AND bucket >= {placeholder} AND bucket < {placeholder}
+            ORDER BY bucket
+        ''', (bucket.strftime(fmt), end.strftime(fmt)))
+
+        pending = 0
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                row_bucket, visits = (row['bucket'], row['visits']) if database.db_type == 'mysql' else tuple(row)
+                row_start = floor_bucket(datetime.strptime(row_bucket, fmt), granularity)
+                while bucket < row_start:
+                    yield bucket.strftime(fmt), pending
+                    bucket, pending = bucket + step, 0
+                pending += int(visits)
+
+    while bucket < end:
+        yield bucket.strftime(fmt), pending
+        bucket, pending = bucket + step, 0
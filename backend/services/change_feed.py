@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Change Feed Service
+Incremental tail over append-only event tables, keyed by the autoincrement
+id. A consumer asks for rows after its watermark and gets at most one batch,
+read with a single primary key range query. Empty polls can wait (long-poll)
+until a writer in this process signals new rows, re-checking the database
+periodically so writes from other workers are picked up too. Consumer
+offsets are stored in the change_feed_offsets table.
+
+On MySQL, autoincrement ids are handed out at insert time but become
+visible at commit, so a row can appear after a higher id has already been
+served and the watermark has moved past it. The feed therefore only serves
+ids up to the MAX(id) it saw at least `settle` seconds earlier; any
+transaction shorter than that has committed by then. SQLite commits through
+one writer, in id order, and needs no settle time.
+
+Visits are written with country and city 'pending' and resolved later by
+geo enrichment. A visitors batch stops before the first pending row that is
+younger than `max_pending_age` seconds, so consumers see resolved locations
+without one failing lookup stalling the feed; older pending rows are served
+as they are.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+from database import db_config
+from services.data_export import EXPORT_TABLES, table_source
+from services.geo_enrichment import PENDING
+
+CHANGE_FEED_TABLES = ('visitors', 'ab_assignments', 'ab_conversions')
+
+
+class ChangeFeed:
+    """Id-watermark tail reader with long-poll support"""
+
+    def __init__(self, database=None, max_batch: int = 1000, max_wait: float = 10,
+                 recheck_interval: float = 1.0, settle: float = 0, hold_pending: bool = True,
+                 max_pending_age: float = 60):
+        self.database = database or db_config
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.recheck_interval = recheck_interval
+        self.settle = settle
+        self.hold_pending = hold_pending
+        self.max_pending_age = max_pending_age
+
+        self._versions: Dict[str, int] = {table: 0 for table in CHANGE_FEED_TABLES}
+        # (monotonic time, MAX(id)) samples per table, oldest first
+        self._max_ids: Dict[str, Deque[Tuple[float, int]]] = {table: deque() for table in CHANGE_FEED_TABLES}
+        self._cond = threading.Condition()
+        self._counters = {'polls': 0, 'empty_polls': 0, 'rows_served': 0, 'waits': 0,
+                          'settling_holds': 0, 'pending_holds': 0, 'pending_served': 0}
+
+    def notify(self, table: str) -> None:
+        """Wake long-polls on table; call after new rows are committed"""
+        with self._cond:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            self._cond.notify_all()
+
+    def poll(self, table: str, after_id: int, limit: Optional[int] = None,
+             wait: float = 0) -> Tuple[List[Dict], int]:
+        """Return (rows, next_after_id) for rows with id > after_id.
+
+        With wait > 0 an empty result blocks for up to wait seconds until a
+        matching row arrives.
+        """
+        if table not in CHANGE_FEED_TABLES:
+            raise ValueError(f"Unknown table '{table}'")
+        limit = min(max(int(limit or self.max_batch), 1), self.max_batch)
+        deadline = time.monotonic() + min(max(wait, 0), self.max_wait)
+
+        while True:
+            with self._cond:
+                version = self._versions[table]
+            rows = self._read(table, after_id, limit)
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                break
+
+            with self._cond:
+                self._counters['waits'] += 1
+                if self._versions[table] == version:
+                    self._cond.wait(min(remaining, self.recheck_interval))
+
+        with self._cond:
+            self._counters['polls'] += 1
+            self._counters['rows_served'] += len(rows)
+            if not rows:
+                self._counters['empty_polls'] += 1
+        return rows, rows[-1]['id'] if rows else after_id
+
+    def get_offset(self, consumer: str, table: str) -> int:
+        """Last id acknowledged by consumer, or 0 if it has never committed"""
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        with self.database.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'SELECT last_id FROM change_feed_offsets '
+                f'WHERE consumer = {placeholder} AND table_name = {placeholder}',
+                (consumer, table)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return 0
+        return int(row['last_id'] if self.database.db_type == 'mysql' else row[0])
+
+    def commit_offset(self, consumer: str, table: str, last_id: int) -> None:
+        """Store the consumer's watermark; offsets never move backwards"""
+        if self.database.db_type == 'mysql':
+            query = '''
+                INSERT INTO change_feed_offsets (consumer, table_name, last_id)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE last_id = GREATEST(last_id, VALUES(last_id)),
+                                        updated_at = CURRENT_TIMESTAMP
+            '''
+        else:
+            query = '''
+                INSERT INTO change_feed_offsets (consumer, table_name, last_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT (consumer, table_name) DO UPDATE
+                SET last_id = MAX(last_id, excluded.last_id), updated_at = CURRENT_TIMESTAMP
+            '''
+        params = (consumer, table, int(last_id))
+        self.database.execute_write(lambda cursor: cursor.execute(query, params))
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self._counters)
+
+    def _settled_id(self, table: str, cursor) -> Optional[int]:
+        """Highest id committed at least settle seconds ago, or None if none is known yet"""
+        cursor.execute(f'SELECT MAX(id) AS max_id FROM {table}')
+        row = cursor.fetchone()
+        max_id = (row['max_id'] if self.database.db_type == 'mysql' else row[0]) or 0
+        now = time.monotonic()
+        with self._cond:
+            samples = self._max_ids[table]
+            samples.append((now, max_id))
+            # Keep only the newest sample that has settled, plus younger ones
+            while len(samples) > 1 and samples[1][0] <= now - self.settle:
+                samples.popleft()
+            sampled_at, settled_id = samples[0]
+        return settled_id if sampled_at <= now - self.settle else None
+
+    def _read(self, table: str, after_id: int, limit: int) -> List[Dict]:
+        columns = EXPORT_TABLES[table]
+        select, source = table_source(table, columns)
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        with self.database.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            where, params = f'id > {placeholder}', [after_id]
+            if self.settle > 0:
+                settled_id = self._settled_id(table, cursor)
+                if settled_id is None or settled_id <= after_id:
+                    with self._cond:
+                        self._counters['settling_holds'] += 1
+                    return []
+                where += f' AND id <= {placeholder}'
+                params.append(settled_id)
+            cursor.execute(
+                f"SELECT {select} FROM {source} WHERE {where} ORDER BY id LIMIT {limit}",
+                params
+            )
+            rows = cursor.fetchall()
+        if self.database.db_type == 'mysql':
+            records = [dict(row) for row in rows]
+        else:
+            records = [dict(zip(columns, row)) for row in rows]
+        if table == 'visitors' and self.hold_pending:
+            # Visit timestamps are UTC; MySQL hands back datetimes, SQLite text
+            oldest_held = (datetime.now(timezone.utc) - timedelta(seconds=self.max_pending_age)).replace(tzinfo=None)
+            for index, record in enumerate(records):
+                if PENDING not in (record['country'], record['city']):
+                    continue
+                stamp = record['timestamp']
+                if stamp is not None and not isinstance(stamp, datetime):
+                    stamp = datetime.strptime(str(stamp)[:19], '%Y-%m-%d %H:%M:%S')
+                if stamp is None or stamp < oldest_held:
+                    # Geo enrichment is still failing; don't stall everything after it
+                    with self._cond:
+                        self._counters['pending_served'] += 1
+                    continue
+                # Served once geo enrichment has resolved it
+                records = records[:index]
+                with self._cond:
+                    self._counters['pending_holds'] += 1
+                break
+        for record in records:
+            for key, value in record.items():
+                if value is not None and not isinstance(value, (int, float, str)):
+                    record[key] = str(value)
+        return records
+
+
+# Global feed used by /api/changes and notified by the writers
+change_feed = ChangeFeed(
+    max_batch=int(os.getenv('CHANGE_FEED_MAX_BATCH', 1000)),
+    max_wait=float(os.getenv('CHANGE_FEED_MAX_WAIT', 10)),
+    settle=float(os.getenv('CHANGE_FEED_SETTLE_SECONDS', 5)) if db_config.db_type == 'mysql' else 0,
+    hold_pending=os.getenv('CHANGE_FEED_HOLD_PENDING', 'true').lower() == 'true',
+    max_pending_age=float(os.getenv('CHANGE_FEED_MAX_PENDING_AGE', 60))
+)
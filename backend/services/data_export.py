@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Data Export Service
+Streams whole tables out as CSV or NDJSON in constant memory. Rows are read
+in id order through a server-side cursor (MySQL) or fetchmany (SQLite) on a
+dedicated connection, encoded one batch at a time and optionally gzipped on
+the fly (one gzip member per batch). Exports resume from a since_id
+checkpoint.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+import pymysql
+from database import db_config
+from services.ip_storage import decode_columns
+from services.visitor_partitions import visitor_partitions
+from services.visitor_strings import visitor_select
+
+EXPORT_TABLES: Dict[str, List[str]] = {
+    'visitors': ['id', 'ip_address', 'user_agent', 'timestamp', 'country', 'city',
+                 'github_user', 'page_visited', 'referrer'],
+    'contact_messages': ['id', 'name', 'email', 'subject', 'message', 'timestamp', 'ip_address'],
+    'ab_assignments': ['id', 'experiment_id', 'user_id', 'variant', 'assigned_at', 'ip_address'],
+    'ab_conversions': ['id', 'experiment_id', 'user_id', 'variant', 'conversion_type',
+                       'conversion_value', 'converted_at', 'ip_address']
+}
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+
+def table_source(table: str, columns: List[str]) -> Tuple[str, str]:
+    """SELECT list and FROM clause for columns of table (strings and addresses decoded)"""
+    if table == 'visitors':
+        # Archived monthly partitions and the live table, merged in id order
+        return visitor_select(columns, source=visitor_partitions.source())
+    return ', '.join(decode_columns(columns)), table
+
+
+class TableExport:
+    """One streaming export of a table, starting after since_id.
+
+    Iterate chunks() for encoded bytes; last_id and rows track how far the
+    export has got, so a caller can checkpoint after each chunk is written.
+    """
+
+    def __init__(self, table: str, fmt: str = 'ndjson', since_id: int = 0, limit: Optional[int] = None,
+                 compress: bool = False, include_header: bool = True, batch_size: int = 1000,
+                 database=None):
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown table '{table}'; expected one of: {', '.join(EXPORT_TABLES)}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'; expected one of: {', '.join(EXPORT_FORMATS)}")
+        self.table = table
+        self.columns = EXPORT_TABLES[table]
+        self.fmt = fmt
+        self.since_id = since_id
+        self.limit = limit
+        self.compress = compress
+        self.include_header = include_header
+        self.batch_size = batch_size
+        self.database = database or db_config
+
+        self.last_id = since_id
+        self.rows = 0
+
+    def chunks(self) -> Iterator[bytes]:
+        """Encoded (and optionally gzipped) output, one chunk per batch of rows"""
+        def emit(text: str) -> bytes:
+            data = text.encode('utf-8')
+            if not self.compress:
+                return data
+            # Each chunk is a complete gzip member (wbits=31), so output cut
+            # off after any chunk is valid and resumed exports can append
+            compressor = zlib.compressobj(wbits=31)
+            return compressor.compress(data) + compressor.flush()
+
+        if self.fmt == 'csv' and self.include_header:
+            yield emit(self._encode_csv([self.columns]))
+
+        for batch in self._batches():
+            if self.fmt == 'csv':
+                text = self._encode_csv([[row[column] for column in self.columns] for row in batch])
+            else:
+                text = ''.join(json.dumps(row, default=str) + '\n' for row in batch)
+            chunk = emit(text)
+            self.rows += len(batch)
+            self.last_id = batch[-1]['id']
+            yield chunk
+
+    def _batches(self) -> Iterator[List[Dict]]:
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        select, source = table_source(self.table, self.columns)
+        query = f"SELECT {select} FROM {source} WHERE id > {placeholder} ORDER BY id"
+        if self.limit:
+            query += f' LIMIT {int(self.limit)}'
+
+        # A dedicated connection: a streaming MySQL cursor holds its
+        # connection until the result is drained, so it must not come from
+        # (or go back to) the pool
+        conn = self.database.get_connection(readonly=True)
+        try:
+            if self.database.db_type == 'mysql':
+                cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+            else:
+                cursor = conn.cursor()
+            cursor.execute(query, (self.since_id,))
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                if self.database.db_type == 'mysql':
+                    yield rows
+                else:
+                    yield [dict(zip(self.columns, row)) for row in rows]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _encode_csv(rows: List[List]) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
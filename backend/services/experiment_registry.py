@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Experiment Registry
+In-process copy of the active A/B experiments for the assignment hot path.
+Each entry holds the parsed variants and traffic split and the cumulative
+split table, so assigning a user never reads or parses ab_experiments rows.
+
+Writes to ab_experiments bump the version stamp in ab_config_version: the
+API in the same transaction (bump_version()), triggers for anything else,
+e.g. a manual UPDATE. Each process checks the stamp at most every
+AB_REGISTRY_CHECK_INTERVAL seconds and reloads the active experiments when
+it has changed, so a change made through one gunicorn worker reaches every
+worker within that interval. The stamp is also checked right away after
+the process's own writes and when an experiment id is not in the registry,
+so new experiments work at once. Checks for unknown ids are limited to one
+per miss_check_interval, so requests for ids that do not exist cannot turn
+into a version query each.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from database import db_config
+from services.bucketing import Bucketer
+
+
+class ExperimentConfig:
+    """One active experiment, parsed once per reload"""
+
+    __slots__ = ('id', 'variants', 'traffic_split', 'bucketer')
+
+    def __init__(self, experiment_id: str, variants: List[str], traffic_split: Dict[str, float],
+                 bucketing: str = 'md5'):
+        self.id = experiment_id
+        self.variants = variants
+        self.traffic_split = traffic_split
+        # Salt and cumulative split table (see services/bucketing.py)
+        self.bucketer = Bucketer(experiment_id, traffic_split, bucketing)
+
+    def assign(self, user_id: str) -> str:
+        """The user's variant, found by bisecting the cumulative table"""
+        return self.bucketer.assign(user_id)
+
+
+def bump_version(cursor) -> None:
+    """Advance the version stamp; call inside the write that changes ab_experiments"""
+    cursor.execute('UPDATE ab_config_version SET version = version + 1 WHERE id = 1')
+
+
+class ExperimentRegistry:
+    """Active experiments by id, reloaded when the database version stamp changes"""
+
+    def __init__(self, database=None, check_interval: float = 5, miss_check_interval: float = 1):
+        self.database = database or db_config
+        self.check_interval = check_interval
+        self.miss_check_interval = miss_check_interval
+
+        self._experiments: Dict[str, ExperimentConfig] = {}
+        self._version: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        self._miss_checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'version_checks': 0, 'reloads': 0,
+                          'skipped_miss_checks': 0}
+
+    def get(self, experiment_id: str) -> Optional[ExperimentConfig]:
+        """The active experiment with this id, or None"""
+        self._refresh()
+        experiment = self._experiments.get(experiment_id)
+        if experiment is None and self._refresh_on_miss():
+            # Possibly created or activated since the last check
+            experiment = self._experiments.get(experiment_id)
+        with self._lock:
+            self._counters['hits' if experiment else 'misses'] += 1
+        return experiment
+
+    def get_many(self, experiment_ids: Iterable[str]) -> Dict[str, ExperimentConfig]:
+        """The active experiments among experiment_ids, by id; unknown ids are left out.
+
+        One refresh covers the whole list, plus at most one forced check if
+        any id is missing.
+        """
+        experiment_ids = list(experiment_ids)
+        self._refresh()
+        experiments = self._experiments
+        if any(experiment_id not in experiments for experiment_id in experiment_ids) and self._refresh_on_miss():
+            experiments = self._experiments
+        found = {experiment_id: experiments[experiment_id]
+                 for experiment_id in experiment_ids if experiment_id in experiments}
+        with self._lock:
+            self._counters['hits'] += len(found)
+            self._counters['misses'] += len(experiment_ids) - len(found)
+        return found
+
+    def active(self) -> List[ExperimentConfig]:
+        """Every active experiment"""
+        self._refresh()
+        return list(self._experiments.values())
+
+    def load(self) -> None:
+        """Load the active experiments now (e.g. at startup)"""
+        self._refresh(force=True)
+
+    def invalidate(self) -> None:
+        """Check the version stamp on the next lookup; call after writing ab_experiments"""
+        self._checked_at = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats['experiments'] = len(self._experiments)
+        stats['version'] = self._version
+        return stats
+
+    def _refresh_on_miss(self) -> bool:
+        """Force a version check for an unknown id, at most once per miss_check_interval"""
+        now = time.monotonic()
+        with self._lock:
+            checked_at = self._miss_checked_at
+            if checked_at is not None and now - checked_at < self.miss_check_interval:
+                self._counters['skipped_miss_checks'] += 1
+                return False
+            self._miss_checked_at = now
+        self._refresh(force=True)
+        return True
+
+    def _refresh(self, force: bool = False) -> None:
+        checked_at = self._checked_at
+        if not force and checked_at is not None and time.monotonic() - checked_at < self.check_interval:
+            return
+        with self._lock:
+            if not force and self._checked_at is not None and self._checked_at != checked_at:
+                return  # another thread checked while this one waited
+            mysql = self.database.db_type == 'mysql'
+            with self.database.connection(readonly=True) as conn:
+                cursor = conn.cursor()
+                # Read the stamp first: a change committed between the two
+                # reads only causes one extra reload
+                cursor.execute('SELECT version FROM ab_config_version WHERE id = 1')
+                row = cursor.fetchone()
+                version = (row['version'] if mysql else row[0]) if row else 0
+                self._counters['version_checks'] += 1
+                if version != self._version:
+                    cursor.execute(
+                        "SELECT id, variants, traffic_split, bucketing FROM ab_experiments WHERE status = 'active'"
+                    )
+                    rows = cursor.fetchall()
+                    if mysql:
+                        rows = [(row['id'], row['variants'], row['traffic_split'], row['bucketing']) for row in rows]
+                    self._experiments = {
+                        experiment_id: ExperimentConfig(
+                            experiment_id, json.loads(variants), json.loads(traffic_split), bucketing
+                        )
+                        for experiment_id, variants, traffic_split, bucketing in rows
+                    }
+                    self._version = version
+                    self._counters['reloads'] += 1
+            self._checked_at = time.monotonic()
+
+
+# Global registry used by the assignment endpoints
+experiment_registry = ExperimentRegistry(
+    check_interval=float(os.getenv('AB_REGISTRY_CHECK_INTERVAL', 5)),
+    miss_check_interval=float(os.getenv('AB_REGISTRY_MISS_CHECK_INTERVAL', 1))
+)
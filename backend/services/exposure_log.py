@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Experiment Exposure Log
+In stateless assignment mode (AB_ASSIGNMENT_MODE=stateless) the variant is
+a pure function of the experiment, the user and the traffic split, so
+/api/ab/assign computes it in memory and answers without touching the
+database. The ab_assignments row becomes a record that the user saw the
+experiment: it is queued here and written in batches by a background
+thread.
+
+Writes are idempotent. Each batch inserts with ON CONFLICT DO NOTHING
+(INSERT IGNORE on MySQL), so a user logged by several workers, or again
+after a restart, keeps the first row. Recently logged users are also
+remembered in memory and not queued again.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from database import db_config
+from services.change_feed import change_feed
+from services.ip_storage import ip_storage
+
+ASSIGNMENT_MODES = ('stored', 'stateless')
+
+
+class ExposureLog:
+    """Write-behind log of (experiment, user, variant) exposures.
+
+    Pending rows are flushed when flush_size are queued or the oldest is
+    flush_interval seconds old. When max_rows are pending, new exposures
+    are dropped and counted rather than slowing down assignment.
+    """
+
+    def __init__(self, mode: str = 'stored', flush_size: int = 500, flush_interval: float = 1.0,
+                 max_rows: int = 10000, seen_size: int = 100000):
+        self.mode = mode
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.seen_size = seen_size
+
+        self._rows: List[Tuple] = []
+        self._oldest: Optional[float] = None
+        self._seen: 'OrderedDict[Tuple[str, str], None]' = OrderedDict()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._counters = {
+            'logged': 0,
+            'deduplicated': 0,
+            'dropped': 0,
+            'flushed': 0,
+            'flushes': 0,
+            'failed_rows': 0
+        }
+
+    @property
+    def stateless(self) -> bool:
+        return self.mode == 'stateless'
+
+    def add(self, experiment_id: str, user_id: str, variant: str, ip_address: Optional[str]) -> bool:
+        """Queue an exposure; returns False if the user was logged recently or the log is full"""
+        self._ensure_started()
+        key = (experiment_id, user_id)
+        with self._cond:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                self._counters['deduplicated'] += 1
+                return False
+            if len(self._rows) >= self.max_rows or self._closed:
+                self._counters['dropped'] += 1
+                return False
+            self._seen[key] = None
+            if len(self._seen) > self.seen_size:
+                self._seen.popitem(last=False)
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append((experiment_id, user_id, variant, ip_address))
+            self._counters['logged'] += 1
+            if len(self._rows) >= self.flush_size:
+                self._cond.notify_all()
+        return True
+
+    def pending_variant(self, experiment_id: str, user_id: str) -> Optional[str]:
+        """Variant of an exposure that is queued but not written yet, or None.
+
+        If the exposure is being flushed, waits for that write so the caller
+        finds it in ab_assignments instead.
+        """
+        key = (experiment_id, user_id)
+        with self._cond:
+            if key not in self._seen:
+                return None
+            for row in reversed(self._rows):
+                if row[:2] == key:
+                    return row[2]
+        with self._flush_lock:
+            return None
+
+    def flush(self) -> int:
+        """Write every pending exposure now; returns the number of rows submitted"""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._rows = self._rows, []
+                self._oldest = None
+            if not rows:
+                return 0
+
+            params = [row[:3] + ip_storage.values(row[3]) for row in rows]
+            try:
+                db_config.execute_write(lambda cursor: cursor.executemany(_insert_query(), params))
+            except Exception as e:
+                print(f"Failed to flush {len(rows)} experiment exposures: {str(e)}")
+                with self._cond:
+                    self._counters['failed_rows'] += len(rows)
+                    # Let the users be logged again on their next request
+                    for row in rows:
+                        self._seen.pop(row[:2], None)
+                return 0
+
+            change_feed.notify('ab_assignments')
+            with self._cond:
+                self._counters['flushes'] += 1
+                self._counters['flushed'] += len(rows)
+            return len(rows)
+
+    def close(self) -> None:
+        """Stop the flush thread and write what is pending"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(5)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._rows)
+        stats['mode'] = self.mode
+        return stats
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='exposure-log', daemon=True)
+                    self._thread.start()
+                    db_config.on_shutdown(self.close)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._rows) >= self.flush_size:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+
+def _insert_query() -> str:
+    columns = 'experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix'
+    if db_config.db_type == 'mysql':
+        return f'INSERT IGNORE INTO ab_assignments ({columns}) VALUES (%s, %s, %s, %s, %s, %s)'
+    return (
+        f'INSERT INTO ab_assignments ({columns}) VALUES (?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT (experiment_id, user_id) DO NOTHING'
+    )
+
+
+def create_exposure_log() -> ExposureLog:
+    """Build the exposure log from AB_ASSIGNMENT_MODE and related settings"""
+    mode = os.getenv('AB_ASSIGNMENT_MODE', 'stored').lower()
+    if mode not in ASSIGNMENT_MODES:
+        print(f"WARNING: Unknown AB_ASSIGNMENT_MODE '{mode}', using stored")
+        mode = 'stored'
+    return ExposureLog(
+        mode=mode,
+        flush_size=int(os.getenv('AB_EXPOSURE_FLUSH_SIZE', 500)),
+        flush_interval=float(os.getenv('AB_EXPOSURE_FLUSH_MS', 1000)) / 1000,
+        max_rows=int(os.getenv('AB_EXPOSURE_MAX_ROWS', 10000))
+    )
+
+
+# Global log used by the assignment and conversion endpoints
+exposure_log = create_exposure_log()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Geo Lookup Cache
+Bounded LRU + TTL cache for IP to location results, sitting in front of the
+remote geo API. Entries are persisted to the geo_cache table so the hit rate
+survives restarts; expired rows are pruned from the table every
+prune_interval seconds as part of a flush.
+"""
+
+import ipaddress
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from database import db_config
+
+UNKNOWN = 'Unknown'
+
+
+class GeoCache:
+    """LRU cache of geo lookups with per-entry expiry.
+
+    Results are cached per exact IP and, when prefix_aggregation is enabled,
+    per /24 (IPv4) or /48 (IPv6) network so neighbouring addresses (NAT'd
+    offices, mobile carriers) share one lookup. Negative results (Unknown)
+    get a short TTL and are never stored at the prefix level.
+    """
+
+    def __init__(self, database=None, max_entries: int = 50000, ttl: float = 7 * 86400,
+                 negative_ttl: float = 600, prefix_aggregation: bool = True,
+                 persist_batch: int = 100, prune_interval: float = 3600,
+                 load_retry_interval: float = 60):
+        self.database = database or db_config
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix_aggregation = prefix_aggregation
+        self.persist_batch = persist_batch
+        self.prune_interval = prune_interval
+        self.load_retry_interval = load_retry_interval
+
+        self._entries: 'OrderedDict[str, Tuple[Dict, float]]' = OrderedDict()
+        self._dirty: Dict[str, Tuple[Dict, float]] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._load_retry_at = 0.0
+        self._shutdown_hooked = False
+        self._pruned_at = time.monotonic()
+        self._counters = {
+            'hits': 0,
+            'prefix_hits': 0,
+            'negative_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'persisted': 0,
+            'prunes': 0
+        }
+
+    def get(self, ip_address: str) -> Optional[Dict]:
+        """Return the cached location for an IP, or None on a miss"""
+        self._ensure_loaded()
+        now = time.time()
+        with self._lock:
+            location = self._get_locked(ip_address, now)
+            if location is not None:
+                self._counters['hits'] += 1
+                if location['country'] == UNKNOWN:
+                    self._counters['negative_hits'] += 1
+                return dict(location)
+
+            prefix = _prefix_key(ip_address) if self.prefix_aggregation else None
+            location = self._get_locked(prefix, now) if prefix else None
+            if location is not None:
+                self._counters['prefix_hits'] += 1
+                return dict(location)
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, ip_address: str, location: Dict) -> None:
+        """Cache a lookup result; Unknown results are cached as short-lived negatives"""
+        negative = location.get('country', UNKNOWN) == UNKNOWN
+        expires_at = time.time() + (self.negative_ttl if negative else self.ttl)
+        location = {'country': location.get('country', UNKNOWN), 'city': location.get('city', UNKNOWN)}
+
+        keys = [ip_address]
+        if self.prefix_aggregation and not negative:
+            prefix = _prefix_key(ip_address)
+            if prefix:
+                keys.append(prefix)
+
+        with self._lock:
+            for key in keys:
+                self._set_locked(key, location, expires_at)
+                self._dirty[key] = (location, expires_at)
+            flush_now = len(self._dirty) >= self.persist_batch
+
+        if flush_now:
+            self.flush(wait=False)
+
+    def flush(self, wait: bool = True) -> int:
+        """Persist entries added since the last flush to the geo_cache table.
+
+        Every prune_interval seconds the flush also deletes expired rows.
+        """
+        now = time.monotonic()
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            prune = now - self._pruned_at >= self.prune_interval
+            if prune:
+                self._pruned_at = now
+        if prune:
+            self.prune_persisted(wait)
+        if not dirty:
+            return 0
+
+        if self.database.db_type == 'mysql':
+            query = '''
+                REPLACE INTO geo_cache (cache_key, country, city, expires_at)
+                VALUES (%s, %s, %s, %s)
+            '''
+        else:
+            query = '''
+                INSERT OR REPLACE INTO geo_cache (cache_key, country, city, expires_at)
+                VALUES (?, ?, ?, ?)
+            '''
+        params = [(key, loc['country'], loc['city'], int(expires_at))
+                  for key, (loc, expires_at) in dirty.items()]
+        future = self.database.submit_write(lambda cursor: cursor.executemany(query, params))
+        with self._lock:
+            self._counters['persisted'] += len(params)
+        if wait:
+            future.result(30)
+        return len(params)
+
+    def prune_persisted(self, wait: bool = True) -> Optional[int]:
+        """Delete expired rows from the geo_cache table; returns the count when waiting"""
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        now = int(time.time())
+
+        def prune(cursor):
+            cursor.execute(f'DELETE FROM geo_cache WHERE expires_at < {placeholder}', (now,))
+            return cursor.rowcount
+
+        future = self.database.submit_write(prune)
+        with self._lock:
+            self._counters['prunes'] += 1
+        return future.result(30) if wait else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['prefix_hits'] + stats['misses']
+        stats['max_entries'] = self.max_entries
+        stats['hit_rate'] = round((stats['hits'] + stats['prefix_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _get_locked(self, key: str, now: float) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        location, expires_at = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self._counters['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return location
+
+    def _set_locked(self, key: str, location: Dict, expires_at: float) -> None:
+        self._entries[key] = (location, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded or time.monotonic() < self._load_retry_at:
+            return
+        # Lookups carry on without the persisted entries while one thread loads
+        if not self._load_lock.acquire(blocking=False):
+            return
+        try:
+            if self._loaded:
+                return
+            if not self._shutdown_hooked:
+                self.database.on_shutdown(self.flush)
+                self._shutdown_hooked = True
+            try:
+                rows = self._load_rows()
+            except Exception as e:
+                # Table may not exist yet on a fresh database; try again later
+                print(f"Geo cache not loaded from database: {str(e)}")
+                self._load_retry_at = time.monotonic() + self.load_retry_interval
+                return
+            with self._lock:
+                for key, country, city, expires_at in rows:
+                    if key not in self._entries:
+                        self._set_locked(key, {'country': country, 'city': city}, expires_at)
+            self._loaded = True
+        finally:
+            self._load_lock.release()
+
+    def _load_rows(self) -> List[Tuple]:
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        with self.database.connection() as conn:
+            cursor = conn.cursor()
+            # Oldest-expiring first, so the freshest entries end up most recently used
+            cursor.execute(f'''
+                SELECT cache_key, country, city, expires_at FROM geo_cache
+                WHERE expires_at > {placeholder}
+                ORDER BY expires_at
+                LIMIT {int(self.max_entries)}
+            ''', (int(time.time()),))
+            rows = cursor.fetchall()
+        if self.database.db_type == 'mysql':
+            return [(row['cache_key'], row['country'], row['city'], row['expires_at']) for row in rows]
+        return [tuple(row) for row in rows]
+
+
+def _prefix_key(ip_address: str) -> Optional[str]:
+    """Network key used for prefix-level caching: /24 for IPv4, /48 for IPv6"""
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except (TypeError, ValueError):
+        return None
+    prefix_len = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f'{address}/{prefix_len}', strict=False))
+
+
+# Global cache instance in front of the remote geo API
+geo_cache = GeoCache(
+    max_entries=int(os.getenv('GEO_CACHE_MAX_ENTRIES', 50000)),
+    ttl=float(os.getenv('GEO_CACHE_TTL', 7 * 86400)),
+    negative_ttl=float(os.getenv('GEO_CACHE_NEGATIVE_TTL', 600)),
+    prefix_aggregation=os.getenv('GEO_CACHE_PREFIX', 'true').lower() == 'true',
+    prune_interval=float(os.getenv('GEO_CACHE_PRUNE_INTERVAL', 3600))
+)
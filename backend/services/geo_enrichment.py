@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Geo Enrichment Service
+Resolves visitor IP addresses to country/city outside the request path.
+Visits are stored with country and city set to 'pending'; a background
+worker resolves the pending IPs in batches and backfills the visitors rows
+and the country rollups.
+The local GeoIP database and the geo cache are consulted first; the remote
+API is the fallback.
+"""
+
+import ipaddress
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import requests
+from database import db_config
+from services.analytics_cache import analytics_cache
+from services.analytics_rollups import apply_deltas, country_change_deltas
+from services.geo_cache import geo_cache
+from services.geoip import local_geoip
+from services.ip_storage import ip_text_sql
+
+PENDING = 'pending'
+UNKNOWN = 'Unknown'
+UNKNOWN_LOCATION = {'country': UNKNOWN, 'city': UNKNOWN}
+
+
+class GeoLookupError(Exception):
+    """Raised when the remote geo API cannot be reached or rejects a request"""
+
+
+class GeoApiClient:
+    """Client for the ip-api.com JSON API (or a compatible local stub)"""
+
+    BATCH_LIMIT = 100  # ip-api accepts at most 100 queries per batch request
+
+    def __init__(self, base_url: str = 'http://ip-api.com', timeout: float = 5):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def lookup(self, ip_address: str) -> Dict:
+        """Resolve a single IP address, returning UNKNOWN_LOCATION on failure"""
+        if not is_public_ip(ip_address):
+            return dict(UNKNOWN_LOCATION)
+        try:
+            response = requests.get(f'{self.base_url}/json/{ip_address}', timeout=self.timeout)
+            return _location_from(response.json())
+        except Exception:
+            return dict(UNKNOWN_LOCATION)
+
+    def lookup_batch(self, ip_addresses: List[str]) -> Dict[str, Dict]:
+        """Resolve up to BATCH_LIMIT addresses in one request.
+
+        Raises GeoLookupError on transport errors or rate limiting so the
+        caller can retry; addresses the API rejects resolve to Unknown.
+        """
+        try:
+            response = requests.post(
+                f'{self.base_url}/batch',
+                params={'fields': 'status,message,country,city,query'},
+                json=list(ip_addresses),
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise GeoLookupError(str(e))
+        if response.status_code != 200:
+            raise GeoLookupError(f'Geo API returned HTTP {response.status_code}')
+
+        results = {}
+        for item in response.json():
+            if item.get('query'):
+                results[item['query']] = _location_from(item)
+        return results
+
+
+class GeoEnrichmentWorker:
+    """Background worker that backfills country/city for pending visitors.
+
+    Each pass reads up to batch_size distinct pending IPs that are not
+    backing off, resolves them with at most max_concurrency batch requests
+    in flight, and writes the results back with one executemany. IPs whose lookup fails are
+    retried with exponential backoff and given up on (marked Unknown) after
+    max_attempts.
+    """
+
+    def __init__(self, client: GeoApiClient, database=None, local=None, cache=None,
+                 batch_size: int = 500, max_concurrency: int = 2, interval: float = 5,
+                 max_attempts: int = 5, retry_backoff: float = 2):
+        self.client = client
+        self.local = local
+        self.cache = cache
+        self.database = database or db_config
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        self._attempts: Dict[str, Tuple[int, float]] = {}  # ip -> (failures, retry_at)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._counters = {
+            'passes': 0,
+            'resolved_ips': 0,
+            'updated_rows': 0,
+            'failed_lookups': 0,
+            'given_up': 0
+        }
+
+    def wake(self) -> None:
+        """Signal that new pending visits exist, starting the worker on first use"""
+        self._ensure_started()
+        self._wake.set()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats['retrying_ips'] = len(self._attempts)
+        return stats
+
+    def run_once(self) -> int:
+        """Resolve one batch of pending visitors; returns the number of rows updated"""
+        ips = self._fetch_pending()
+        if not ips:
+            return 0
+
+        resolved = self._resolve(ips)
+        if not resolved:
+            return 0
+
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        query = (
+            f'UPDATE visitors SET country = {placeholder}, city = {placeholder} '
+            f'WHERE {ip_text_sql()} = {placeholder} AND country = {placeholder}'
+        )
+        params = [(loc['country'], loc['city'], ip, PENDING) for ip, loc in resolved.items()]
+        select_query = (
+            f'SELECT timestamp FROM visitors '
+            f'WHERE {ip_text_sql()} = {placeholder} AND country = {placeholder}'
+        )
+        mysql = self.database.db_type == 'mysql'
+
+        def backfill(cursor):
+            # Move the affected visits from the pending country bucket to the
+            # resolved one in the same transaction as the update
+            deltas = Counter()
+            for ip, loc in resolved.items():
+                cursor.execute(select_query, (ip, PENDING))
+                timestamps = [row['timestamp'] if mysql else row[0] for row in cursor.fetchall()]
+                deltas.update(country_change_deltas(timestamps, PENDING, loc['country']))
+            cursor.executemany(query, params)
+            updated = cursor.rowcount
+            apply_deltas(cursor, deltas, self.database)
+            return updated
+
+        updated = self.database.execute_write(backfill)
+        if updated:
+            analytics_cache.bump()
+        if self.cache:
+            self.cache.flush(wait=False)
+        with self._lock:
+            self._counters['passes'] += 1
+            self._counters['resolved_ips'] += len(resolved)
+            self._counters['updated_rows'] += max(updated, 0)
+        return updated
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='geo-enrichment', daemon=True)
+                    self._thread.start()
+                    self.database.on_shutdown(self.stop)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                # Keep draining while passes make progress
+                while not self._stop.is_set() and self.run_once() > 0:
+                    pass
+            except Exception as e:
+                print(f"Geo enrichment pass failed: {str(e)}")
+
+    def _fetch_pending(self) -> List[str]:
+        """Up to batch_size pending IPs that are not waiting out a retry backoff.
+
+        Pages through the pending IPs in address order, so backed-off IPs
+        never fill the batch and keep newer ones from being looked up.
+        """
+        placeholder = '%s' if self.database.db_type == 'mysql' else '?'
+        query = (
+            f'SELECT DISTINCT {ip_text_sql()} AS ip_address FROM visitors '
+            f'WHERE country = {placeholder} AND {ip_text_sql()} > {placeholder} '
+            f'ORDER BY ip_address LIMIT {int(self.batch_size)}'
+        )
+        ips, after = [], ''
+        with self.database.connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            while len(ips) < self.batch_size:
+                cursor.execute(query, (PENDING, after))
+                rows = cursor.fetchall()
+                page = [row['ip_address'] if self.database.db_type == 'mysql' else row[0] for row in rows]
+                now = time.monotonic()
+                with self._lock:
+                    ips.extend(ip for ip in page if self._attempts.get(ip, (0, 0))[1] <= now)
+                if len(page) < self.batch_size:
+                    break
+                after = page[-1]
+        return ips[:self.batch_size]
+
+    def _resolve(self, ips: Iterable[str]) -> Dict[str, Dict]:
+        resolved = {}
+        remote = []
+        for ip in ips:
+            location = self.local.lookup(ip) if self.local else None
+            if location is None and self.cache:
+                location = self.cache.get(ip)
+            if location:
+                resolved[ip] = location
+            elif is_public_ip(ip):
+                remote.append(ip)
+            else:
+                resolved[ip] = dict(UNKNOWN_LOCATION)
+
+        chunks = [remote[i:i + GeoApiClient.BATCH_LIMIT]
+                  for i in range(0, len(remote), GeoApiClient.BATCH_LIMIT)]
+        if chunks:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                for chunk, outcome in zip(chunks, pool.map(self._lookup_chunk, chunks)):
+                    if outcome is None:
+                        self._record_failures(chunk, resolved)
+                        continue
+                    for ip in chunk:
+                        # Addresses missing from the response are treated as unresolvable
+                        resolved[ip] = outcome.get(ip, dict(UNKNOWN_LOCATION))
+                        if self.cache:
+                            self.cache.put(ip, resolved[ip])
+
+        with self._lock:
+            for ip in resolved:
+                self._attempts.pop(ip, None)
+        return resolved
+
+    def _lookup_chunk(self, chunk: List[str]) -> Optional[Dict[str, Dict]]:
+        try:
+            return self.client.lookup_batch(chunk)
+        except GeoLookupError as e:
+            print(f"Geo lookup for {len(chunk)} IPs failed: {str(e)}")
+            return None
+
+    def _record_failures(self, chunk: List[str], resolved: Dict[str, Dict]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._counters['failed_lookups'] += len(chunk)
+            for ip in chunk:
+                failures = self._attempts.get(ip, (0, 0))[0] + 1
+                if failures >= self.max_attempts:
+                    # Stop retrying and let the row leave the pending state
+                    resolved[ip] = dict(UNKNOWN_LOCATION)
+                    self._counters['given_up'] += 1
+                else:
+                    self._attempts[ip] = (failures, now + self.retry_backoff ** failures)
+
+
+def is_public_ip(ip_address: str) -> bool:
+    """True for globally routable addresses worth sending to the geo API"""
+    try:
+        return ipaddress.ip_address(ip_address).is_global
+    except (TypeError, ValueError):
+        return False
+
+
+def _location_from(data: Dict) -> Dict:
+    if data.get('status', 'success') != 'success':
+        return dict(UNKNOWN_LOCATION)
+    return {
+        'country': data.get('country') or UNKNOWN,
+        'city': data.get('city') or UNKNOWN
+    }
+
+
+# Global instances used by the app
+geo_client = GeoApiClient(
+    base_url=os.getenv('GEOIP_API_URL', 'http://ip-api.com'),
+    timeout=float(os.getenv('GEOIP_API_TIMEOUT', 5))
+)
+geo_enrichment = GeoEnrichmentWorker(
+    geo_client,
+    local=local_geoip,
+    cache=geo_cache,
+    batch_size=int(os.getenv('GEO_ENRICH_BATCH_SIZE', 500)),
+    max_concurrency=int(os.getenv('GEO_ENRICH_CONCURRENCY', 2)),
+    interval=float(os.getenv('GEO_ENRICH_INTERVAL', 5)),
+    max_attempts=int(os.getenv('GEO_ENRICH_MAX_ATTEMPTS', 5))
+)
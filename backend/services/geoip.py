@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Offline GeoIP Database
+Compact, memory-mapped IP range table for resolving visitor locations
+without calling a remote API.
+
+File layout (all integers little-endian):
+    header      magic b'GEOIPDB1', then 5 x uint32:
+                ipv4 range count, ipv6 range count, location count,
+                string count, string blob size
+    ipv4        starts[n] uint32, ends[n] uint32, location ids[n] uint32
+    ipv6        starts[n] 16-byte big-endian, ends[n] 16-byte big-endian,
+                location ids[n] uint32
+    locations   (country string id, city string id) uint32 pairs
+    strings     offsets[count + 1] uint32, then the UTF-8 blob
+
+Ranges are sorted by start address and must not overlap, so a lookup is a
+binary search over the starts array followed by one bounds check. The file
+is opened with mmap, so every worker process on a host shares the same
+page-cache copy.
+"""
+
+import bisect
+import ipaddress
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAGIC = b'GEOIPDB1'
+HEADER = struct.Struct('<8s5I')
+
+
+class GeoIPFormatError(Exception):
+    """Raised when a GeoIP database file is missing sections or corrupt"""
+
+
+class _FixedWidthKeys:
+    """Sequence view over fixed-width big-endian keys, usable with bisect"""
+
+    def __init__(self, buffer, offset: int, width: int, count: int):
+        self._buffer = buffer
+        self._offset = offset
+        self._width = width
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        start = self._offset + index * self._width
+        return self._buffer[start:start + self._width]
+
+
+class GeoIPDatabase:
+    """Read-only, memory-mapped IPv4/IPv6 range to location table"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    @classmethod
+    def open_optional(cls, path: Optional[str]) -> Optional['GeoIPDatabase']:
+        """Open the database if the path is set and readable, otherwise return None"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except Exception as e:
+            print(f"WARNING: Failed to load GeoIP database {path}: {str(e)}")
+            return None
+
+    def lookup(self, ip_address: str) -> Optional[Dict]:
+        """Return {'country', 'city'} for the address, or None when no range matches"""
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except (TypeError, ValueError):
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+
+        if address.version == 4:
+            key = int(address)
+            index = bisect.bisect_right(self._v4_starts, key) - 1
+            if index < 0 or key > self._v4_ends[index]:
+                return None
+            location = self._v4_locations[index]
+        else:
+            key = address.packed
+            index = bisect.bisect_right(self._v6_starts, key) - 1
+            if index < 0 or key > self._v6_ends[index]:
+                return None
+            location = self._v6_locations[index]
+
+        country_id, city_id = self._locations[2 * location], self._locations[2 * location + 1]
+        return {'country': self._string(country_id), 'city': self._string(city_id)}
+
+    def stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'ipv4_ranges': len(self._v4_starts),
+            'ipv6_ranges': len(self._v6_starts),
+            'locations': len(self._locations) // 2,
+            'size_bytes': len(self._mmap)
+        }
+
+    def close(self) -> None:
+        for view in (self._v4_starts, self._v4_ends, self._v4_locations,
+                     self._v6_locations, self._locations, self._string_offsets):
+            view.release()
+        self._mmap.close()
+
+    def _parse(self) -> None:
+        if len(self._mmap) < HEADER.size:
+            raise GeoIPFormatError('File too small for a GeoIP header')
+        magic, n_v4, n_v6, n_locations, n_strings, blob_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise GeoIPFormatError('Not a GeoIP database file')
+
+        expected = (HEADER.size + 12 * n_v4 + 36 * n_v6 + 8 * n_locations
+                    + 4 * (n_strings + 1) + blob_size)
+        if len(self._mmap) != expected:
+            raise GeoIPFormatError(f'Expected {expected} bytes, found {len(self._mmap)}')
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+        self._v4_starts, offset = _uint32_view(view, offset, n_v4)
+        self._v4_ends, offset = _uint32_view(view, offset, n_v4)
+        self._v4_locations, offset = _uint32_view(view, offset, n_v4)
+
+        self._v6_starts = _FixedWidthKeys(self._mmap, offset, 16, n_v6)
+        offset += 16 * n_v6
+        self._v6_ends = _FixedWidthKeys(self._mmap, offset, 16, n_v6)
+        offset += 16 * n_v6
+        self._v6_locations, offset = _uint32_view(view, offset, n_v6)
+
+        self._locations, offset = _uint32_view(view, offset, 2 * n_locations)
+        self._string_offsets, offset = _uint32_view(view, offset, n_strings + 1)
+        self._blob_offset = offset
+        view.release()
+
+    def _string(self, string_id: int) -> str:
+        start = self._blob_offset + self._string_offsets[string_id]
+        end = self._blob_offset + self._string_offsets[string_id + 1]
+        return self._mmap[start:end].decode('utf-8')
+
+
+def _uint32_view(view: memoryview, offset: int, count: int) -> Tuple[memoryview, int]:
+    end = offset + 4 * count
+    return view[offset:end].cast('I'), end
+
+
+def build_database(ranges: Iterable[Tuple[str, str, str, str]], output_path: str) -> Dict:
+    """Write a GeoIP database from (start_ip, end_ip, country, city) tuples.
+
+    Returns counts of what was written. Raises ValueError for malformed or
+    overlapping ranges.
+    """
+    if sys.byteorder != 'little':
+        raise GeoIPFormatError('GeoIP databases are built and read on little-endian hosts only')
+
+    strings: Dict[str, int] = {}
+    locations: Dict[Tuple[int, int], int] = {}
+    v4: List[Tuple[int, int, int]] = []
+    v6: List[Tuple[int, int, int]] = []
+
+    def intern(value: str) -> int:
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    for start_ip, end_ip, country, city in ranges:
+        start = ipaddress.ip_address(start_ip.strip())
+        end = ipaddress.ip_address(end_ip.strip())
+        if start.version != end.version or int(start) > int(end):
+            raise ValueError(f'Invalid range {start_ip} - {end_ip}')
+        key = (intern(country.strip() or 'Unknown'), intern(city.strip() or 'Unknown'))
+        location = locations.setdefault(key, len(locations))
+        (v4 if start.version == 4 else v6).append((int(start), int(end), location))
+
+    for table in (v4, v6):
+        table.sort()
+        for previous, current in zip(table, table[1:]):
+            if current[0] <= previous[1]:
+                raise ValueError(f'Overlapping ranges starting at {previous[0]} and {current[0]}')
+
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = [0]
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+    blob = b''.join(encoded)
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(v4), len(v6), len(locations), len(strings), len(blob)))
+        f.write(struct.pack(f'<{len(v4)}I', *(row[0] for row in v4)))
+        f.write(struct.pack(f'<{len(v4)}I', *(row[1] for row in v4)))
+        f.write(struct.pack(f'<{len(v4)}I', *(row[2] for row in v4)))
+        f.write(b''.join(row[0].to_bytes(16, 'big') for row in v6))
+        f.write(b''.join(row[1].to_bytes(16, 'big') for row in v6))
+        f.write(struct.pack(f'<{len(v6)}I', *(row[2] for row in v6)))
+        f.write(struct.pack(f'<{2 * len(locations)}I', *(i for pair in locations for i in pair)))
+        f.write(struct.pack(f'<{len(string_offsets)}I', *string_offsets))
+        f.write(blob)
+    # Atomic replace so running workers never map a half-written file
+    os.replace(tmp_path, output_path)
+
+    return {
+        'ipv4_ranges': len(v4),
+        'ipv6_ranges': len(v6),
+        'locations': len(locations),
+        'strings': len(strings),
+        'size_bytes': os.path.getsize(output_path)
+    }
+
+
+# Global instance; None when GEOIP_DB_PATH is unset or the file is missing
+local_geoip = GeoIPDatabase.open_optional(os.getenv('GEOIP_DB_PATH'))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Compact IP Address Storage
+Client addresses are stored as packed binary next to (or instead of) the
+ip_address text column of visitors, contact_messages, ab_assignments and
+ab_conversions:
+
+    ip_packed   4 bytes for IPv4, 16 for IPv6 (IPv4-mapped IPv6 is stored as IPv4)
+    ip_prefix   the address truncated to its /24 (IPv4) or /48 (IPv6) network,
+                same width as ip_packed, indexed for "everything from this
+                network" queries
+
+The byte layout matches MySQL's INET6_ATON(), and SQLite connections get
+INET6_ATON()/INET6_NTOA() functions registered, so the same SQL decodes
+on both databases.
+
+IP_STORAGE selects what new rows keep:
+    inline      ip_address text plus both binary columns (default)
+    packed      the binary columns only; ip_address is left NULL
+    anonymized  ip_prefix only; the full address is never written
+
+Readers go through ip_text_sql(), which falls back from the text to the
+packed and then the anonymized address, so all three layouts (and a table
+part-way through migrate_ip_storage.py) read the same.
+"""
+
+import ipaddress
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+from database import DatabaseConfig
+
+IP_STORAGE_MODES = ('inline', 'packed', 'anonymized')
+
+# Tables carrying a client address, all written through IPStorage.values()
+IP_TABLES = ('visitors', 'contact_messages', 'ab_assignments', 'ab_conversions')
+
+# Insert column order for IPStorage.values()
+IP_COLUMNS = ('ip_address', 'ip_packed', 'ip_prefix')
+
+# Network kept by the anonymized prefix (matches the geo cache's aggregation)
+ANONYMIZED_PREFIX = {4: 24, 6: 48}
+
+
+def _parse(ip: Optional[str]):
+    if not ip:
+        return None
+    try:
+        address = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped:
+        return address.ipv4_mapped
+    return address
+
+
+def inet6_aton(ip: Optional[str]) -> Optional[bytes]:
+    """Packed 4 or 16 byte form of an address; None when it does not parse"""
+    address = _parse(ip)
+    return address.packed if address else None
+
+
+def inet6_ntoa(packed: Optional[bytes]) -> Optional[str]:
+    """Text form of a packed 4 or 16 byte address"""
+    if packed is None or len(packed) not in (4, 16):
+        return None
+    return str(ipaddress.ip_address(bytes(packed)))
+
+
+def anonymize(ip: Optional[str]) -> Optional[bytes]:
+    """Packed network address of the /24 (IPv4) or /48 (IPv6) holding ip"""
+    address = _parse(ip)
+    if address is None:
+        return None
+    network = ipaddress.ip_network(f'{address}/{ANONYMIZED_PREFIX[address.version]}', strict=False)
+    return network.network_address.packed
+
+
+def ip_text_sql(table: str = '') -> str:
+    """SQL expression reading a row's address in whichever layout it was stored"""
+    qualifier = f'{table}.' if table else ''
+    return (f'COALESCE({qualifier}ip_address, INET6_NTOA({qualifier}ip_packed), '
+            f'INET6_NTOA({qualifier}ip_prefix))')
+
+
+def decode_columns(columns: Sequence[str], table: str = '') -> List[str]:
+    """SELECT expressions for columns with ip_address decoded"""
+    return [f'{ip_text_sql(table)} AS ip_address' if column == 'ip_address' else column
+            for column in columns]
+
+
+def network_filter(cidr: str, placeholder: str = '?') -> Tuple[str, List[bytes]]:
+    """WHERE condition and params matching rows whose address is inside cidr.
+
+    Networks at or wider than the anonymized prefix are answered from the
+    ip_prefix index (so they also work for anonymized rows); narrower ones
+    need ip_packed. Raises ValueError for an invalid network.
+    """
+    network = ipaddress.ip_network(cidr.strip(), strict=False)
+    width = 4 if network.version == 4 else 16
+    anonymized = ANONYMIZED_PREFIX[network.version]
+    if network.prefixlen == anonymized:
+        return f'ip_prefix = {placeholder}', [network.network_address.packed]
+    if network.prefixlen < anonymized:
+        column = 'ip_prefix'
+        high = anonymize(str(network.broadcast_address))
+    else:
+        column = 'ip_packed'
+        high = network.broadcast_address.packed
+    # Binary comparison alone would also match longer values sharing the leading bytes
+    return (f'{column} BETWEEN {placeholder} AND {placeholder} AND LENGTH({column}) = {width}',
+            [network.network_address.packed, high])
+
+
+def register_sqlite_functions(conn) -> None:
+    """Make INET6_ATON()/INET6_NTOA() available on a SQLite connection"""
+    conn.create_function('INET6_ATON', 1, inet6_aton, deterministic=True)
+    conn.create_function('INET6_NTOA', 1, inet6_ntoa, deterministic=True)
+
+
+DatabaseConfig.on_sqlite_connect(register_sqlite_functions)
+
+
+class IPStorage:
+    """Turns a client address into the values stored for it"""
+
+    def __init__(self, mode: str = 'inline'):
+        if mode not in IP_STORAGE_MODES:
+            raise ValueError(f"Unknown IP_STORAGE '{mode}'; expected one of: {', '.join(IP_STORAGE_MODES)}")
+        self.mode = mode
+
+    def values(self, ip: Optional[str]) -> Tuple[Optional[str], Optional[bytes], Optional[bytes]]:
+        """(ip_address, ip_packed, ip_prefix) to insert for ip"""
+        prefix = anonymize(ip)
+        if self.mode == 'anonymized':
+            return None, None, prefix
+        packed = inet6_aton(ip)
+        if self.mode == 'packed' and packed is not None:
+            return None, packed, prefix
+        # Unparseable values are kept as text so nothing is silently lost
+        return ip, packed, prefix
+
+    def stats(self) -> Dict:
+        return {'storage': self.mode}
+
+
+def create_ip_storage() -> IPStorage:
+    """Build the encoder selected by IP_STORAGE"""
+    mode = os.getenv('IP_STORAGE', 'inline').lower()
+    if mode not in IP_STORAGE_MODES:
+        print(f"WARNING: Unknown IP_STORAGE '{mode}', using inline")
+        mode = 'inline'
+    return IPStorage(mode)
+
+
+# Global encoder used by every insert site
+ip_storage = create_ip_storage()
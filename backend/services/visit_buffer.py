@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Visit Write-Behind Buffer
+Accumulates visitor rows in memory and flushes them to the database in
+batches, so /api/track-visit no longer pays one commit per page view. Each
+flush also updates the analytics rollups in the same transaction. Repeated
+strings are stored as dictionary ids (see services/visitor_strings.py) and
+client addresses in packed form (see services/ip_storage.py).
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from database import db_config
+from services.analytics_cache import analytics_cache
+from services.analytics_rollups import apply_deltas, visit_deltas
+from services.change_feed import change_feed
+from services.ip_storage import ip_storage
+from services.visitor_strings import visitor_strings
+
+VISIT_COLUMNS = ('ip_address', 'user_agent', 'timestamp', 'country', 'city',
+                 'github_user', 'page_visited', 'referrer')
+
+# Stored rows also carry the dictionary ids of user_agent, page_visited and
+# referrer, then the packed and anonymized client address
+STORED_COLUMNS = VISIT_COLUMNS + visitor_strings.id_columns + ('ip_packed', 'ip_prefix')
+
+
+class VisitBufferFullError(Exception):
+    """Raised when the buffer stays full longer than the enqueue timeout"""
+
+
+class VisitBuffer:
+    """Bounded write-behind buffer for rows of the visitors table.
+
+    Rows are flushed with a single executemany() in one transaction when
+    either flush_size rows are pending or the oldest pending row is older
+    than flush_interval seconds. When max_rows are pending (including a
+    batch being written), add() blocks for up to enqueue_timeout seconds and
+    then raises VisitBufferFullError.
+
+    A batch that fails to write goes back to the front of the buffer and is
+    retried after an exponential backoff (retry_backoff doubling up to
+    max_backoff). At shutdown it is retried shutdown_retries times before
+    the rows are dropped.
+    """
+
+    def __init__(self, flush_size: int = 500, flush_interval: float = 0.25,
+                 max_rows: int = 10000, enqueue_timeout: float = 1.0,
+                 retry_backoff: float = 0.5, max_backoff: float = 30.0, shutdown_retries: int = 5):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.enqueue_timeout = enqueue_timeout
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.shutdown_retries = shutdown_retries
+
+        self._rows: List[Tuple] = []
+        self._oldest: Optional[float] = None
+        self._in_flight = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._counters = {
+            'enqueued': 0,
+            'flushed': 0,
+            'flushes': 0,
+            'failed_rows': 0,
+            'retries': 0,
+            'dropped_rows': 0,
+            'rejected': 0,
+            'last_flush_size': 0,
+            'max_flush_size': 0,
+            'total_flush_ms': 0.0
+        }
+
+    @staticmethod
+    def make_row(ip_address: str, user_agent: str, country: str, city: str,
+                 github_user: Optional[str], page_visited: str, referrer: str) -> Tuple:
+        """Build a visitors row, stamping it with the time of the visit (UTC)"""
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return (ip_address, user_agent, timestamp, country, city, github_user, page_visited, referrer)
+
+    def add(self, row: Tuple) -> None:
+        """Queue a visitors row for the next flush, applying backpressure when full"""
+        self._ensure_started()
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._cond:
+            while len(self._rows) + self._in_flight >= self.max_rows and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['rejected'] += 1
+                    raise VisitBufferFullError(f'Visit buffer full ({self.max_rows} rows pending)')
+                self._cond.wait(remaining)
+            if self._closed:
+                raise VisitBufferFullError('Visit buffer is shut down')
+
+            first = not self._rows
+            if first:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+            self._counters['enqueued'] += 1
+            # The first row starts the flush_interval timer the thread waits on
+            if first or len(self._rows) >= self.flush_size:
+                self._cond.notify_all()
+
+    def flush(self) -> int:
+        """Write every pending row now; returns the number of rows written"""
+        with self._flush_lock:
+            with self._cond:
+                rows, self._rows = self._rows, []
+                oldest, self._oldest = self._oldest, None
+                self._in_flight = len(rows)
+                self._cond.notify_all()
+            if not rows:
+                return 0
+
+            started = time.monotonic()
+            deltas = visit_deltas(rows)
+
+            try:
+                encoded = [_with_ip_columns(row) for row in visitor_strings.encode_rows(rows)]
+                if db_config.db_type != 'mysql':
+                    # Supplying timestamp_epoch skips the per-row fill trigger
+                    encoded = [row + (_epoch(row[2]),) for row in encoded]
+
+                def write(cursor):
+                    cursor.executemany(_insert_query(), encoded)
+                    apply_deltas(cursor, deltas)
+
+                db_config.execute_write(write)
+            except Exception as e:
+                with self._cond:
+                    # Back at the front, in order; add() kept room for them
+                    self._rows = rows + self._rows
+                    self._oldest = oldest
+                    self._in_flight = 0
+                    self._failures += 1
+                    delay = min(self.retry_backoff * 2 ** (self._failures - 1), self.max_backoff)
+                    self._retry_at = time.monotonic() + delay
+                    self._counters['failed_rows'] += len(rows)
+                    self._counters['retries'] += 1
+                print(f"Failed to flush {len(rows)} buffered visits, retrying in {delay:.2f}s: {str(e)}")
+                return 0
+
+            # The rows are visible now, so cached analytics are out of date
+            analytics_cache.bump()
+            change_feed.notify('visitors')
+            with self._cond:
+                self._in_flight = 0
+                self._failures = 0
+                self._retry_at = 0.0
+                self._counters['flushes'] += 1
+                self._counters['flushed'] += len(rows)
+                self._counters['last_flush_size'] = len(rows)
+                self._counters['max_flush_size'] = max(self._counters['max_flush_size'], len(rows))
+                self._counters['total_flush_ms'] += (time.monotonic() - started) * 1000
+            return len(rows)
+
+    def close(self) -> None:
+        """Stop accepting rows, flush what is pending and stop the flush thread.
+
+        A failing flush is retried shutdown_retries times with backoff; only
+        then are the pending rows dropped.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(5)
+        for attempt in range(self.shutdown_retries + 1):
+            self.flush()
+            with self._cond:
+                if not self._rows:
+                    return
+                wait = max(0.0, self._retry_at - time.monotonic())
+            if attempt < self.shutdown_retries:
+                time.sleep(wait)
+        with self._cond:
+            rows, self._rows = self._rows, []
+            self._oldest = None
+            self._counters['dropped_rows'] += len(rows)
+        print(f"ERROR: Dropped {len(rows)} buffered visits after {self.shutdown_retries + 1} "
+              f"failed flush attempts at shutdown")
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._rows) + self._in_flight
+        stats['max_rows'] = self.max_rows
+        stats['total_flush_ms'] = round(stats['total_flush_ms'], 3)
+        return stats
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='visit-buffer', daemon=True)
+                    self._thread.start()
+                    db_config.on_shutdown(self.close)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed:
+                    backoff = self._retry_at - time.monotonic()
+                    if self._rows and backoff > 0:
+                        # The last flush failed; wait before retrying
+                        self._cond.wait(backoff)
+                        continue
+                    if len(self._rows) >= self.flush_size:
+                        break
+                    if self._oldest is not None:
+                        remaining = self._oldest + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+
+def _with_ip_columns(row: Tuple) -> Tuple:
+    """Replace the row's ip_address with its stored form and append ip_packed, ip_prefix"""
+    ip_address, ip_packed, ip_prefix = ip_storage.values(row[0])
+    return (ip_address,) + tuple(row[1:]) + (ip_packed, ip_prefix)
+
+
+def _epoch(timestamp: str) -> int:
+    return int(datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _insert_query() -> str:
+    placeholder = '%s' if db_config.db_type == 'mysql' else '?'
+    # SQLite also stores the visit time as epoch seconds (see DatabaseConfig.add_epoch_column)
+    columns = STORED_COLUMNS if db_config.db_type == 'mysql' else STORED_COLUMNS + ('timestamp_epoch',)
+    return (
+        f"INSERT INTO visitors ({', '.join(columns)}) "
+        f"VALUES ({', '.join([placeholder] * len(columns))})"
+    )
+
+
+# Global buffer instance used by /api/track-visit
+visit_buffer = VisitBuffer(
+    flush_size=int(os.getenv('VISIT_BUFFER_FLUSH_SIZE', 500)),
+    flush_interval=float(os.getenv('VISIT_BUFFER_FLUSH_MS', 250)) / 1000,
+    max_rows=int(os.getenv('VISIT_BUFFER_MAX_ROWS', 10000)),
+    shutdown_retries=int(os.getenv('VISIT_BUFFER_SHUTDOWN_RETRIES', 5))
+)
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Visitor Partitions
+Keeps the SQLite visitors table, and the time ranges queries scan, bounded
+by a retention window instead of growing with the site's whole history.
+
+Once a month has closed (plus VISITOR_PARTITION_GRACE), its visits are
+moved out of visitors into a monthly partition table, visitors_pYYYYMM,
+with the same columns and the indexes readers need. The visitor_partitions
+catalog records each partition's id and timestamp_epoch range. Readers stay
+partition-aware through:
+    source()  FROM clause over every partition plus visitors; SQLite merges
+              the UNION ALL on the id key, so keyset readers (recent
+              visitors, exports, the change feed) seek in each table
+    tables()  partitions whose time range overlaps a query's, plus
+              visitors; breakdowns skip every other partition
+
+With VISITOR_RETENTION_MONTHS set, partitions older than the window are
+dropped, but only after the daily rollups are checked to hold every visit
+in them. The freed pages go back to the filesystem through incremental
+VACUUM. New databases are created with auto_vacuum=INCREMENTAL; convert an
+existing one once with `python partition_visitors.py --enable-incremental-vacuum`.
+
+The live visitors table keeps the current month plus anything not yet
+rotated. Geo enrichment and the startup rollup backfill only read that table,
+so rotation stops before the first visit whose location is still pending.
+MySQL is left alone; use native PARTITION BY RANGE there.
+"""
+
+import calendar
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from database import db_config
+from services.geo_enrichment import PENDING
+
+PARTITION_MODES = ('monthly', 'off')
+
+PARTITION_PREFIX = 'visitors_p'
+
+# Indexes each partition gets: time ranges, pages/referrers, network lookups
+PARTITION_INDEXES = ('timestamp_epoch', 'page_id', 'referrer_id', 'ip_prefix', 'ip_packed')
+
+# Pages returned per incremental_vacuum write, so live writes can interleave
+VACUUM_CHUNK_PAGES = 2000
+
+
+def _epoch(moment: datetime) -> int:
+    return calendar.timegm(moment.utctimetuple())
+
+
+def _month_start(epoch: int) -> datetime:
+    moment = datetime.fromtimestamp(epoch, timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+class VisitorPartitions:
+    """Monthly partitions of the SQLite visitors table, with retention"""
+
+    def __init__(self, database=None, mode: str = 'off', retention_months: int = 0,
+                 grace: float = 86400, batch_size: int = 10000, interval: float = 3600):
+        self.database = database or db_config
+        self.mode = mode
+        self.retention_months = retention_months
+        self.grace = grace
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self._catalog = (None, [], [])  # (version, partitions, visitors columns)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {
+            'passes': 0,
+            'rotated_partitions': 0,
+            'moved_rows': 0,
+            'dropped_partitions': 0,
+            'dropped_rows': 0,
+            'skipped_unfolded': 0,
+            'pending_holds': 0,
+            'vacuumed_pages': 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode == 'monthly' and self.database.db_type == 'sqlite'
+
+    def partitions(self) -> List[Dict]:
+        """Catalog rows, oldest first, each with the partition's column names"""
+        return self._load()[1]
+
+    def tables(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[str]:
+        """Tables holding visits in [start, end): overlapping partitions, then visitors"""
+        low = _epoch(start) if start is not None else None
+        high = _epoch(end) if end is not None else None
+        tables = []
+        for partition in self.partitions():
+            if low is None and high is None:
+                tables.append(partition['table_name'])
+            elif partition['start_epoch'] is None:
+                continue  # no row with a timestamp can match a time filter
+            elif (high is None or partition['start_epoch'] < high) and (low is None or partition['end_epoch'] >= low):
+                tables.append(partition['table_name'])
+        return tables + ['visitors']
+
+    def source(self, prefix: str = '') -> str:
+        """FROM clause reading every partition and visitors as one table named visitors"""
+        _, partitions, columns = self._load()
+        if not partitions:
+            return f'{prefix}visitors'
+        selects = []
+        for partition in partitions:
+            # Columns added to visitors after a partition was created read as NULL
+            have = set(partition['columns'])
+            select = ', '.join(column if column in have else f'NULL AS {column}' for column in columns)
+            selects.append(f"SELECT {select} FROM {prefix}{partition['table_name']}")
+        selects.append(f"SELECT {', '.join(columns)} FROM {prefix}visitors")
+        return f"({' UNION ALL '.join(selects)}) AS visitors"
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict:
+        """Rotate closed months, apply retention and vacuum; returns what changed"""
+        result = {'moved_rows': self.rotate(now), 'dropped_rows': self.apply_retention(now)}
+        result['vacuumed_pages'] = self.vacuum()
+        with self._lock:
+            self._counters['passes'] += 1
+        return result
+
+    def rotate(self, now: Optional[datetime] = None) -> int:
+        """Move every month that closed more than grace seconds ago into its partition"""
+        if not self.enabled:
+            return 0
+        cutoff = _epoch(now or datetime.now(timezone.utc)) - self.grace
+        moved = 0
+        while True:
+            with self.database.connection(readonly=True) as conn:
+                # The month of the oldest live row decides what moves next;
+                # it takes every row up to the first one stamped after it
+                row = conn.execute('''
+                    SELECT id, timestamp_epoch FROM visitors
+                    WHERE timestamp_epoch IS NOT NULL ORDER BY id LIMIT 1
+                ''').fetchone()
+                if row is None:
+                    break
+                month = _month_start(row[1])
+                month_end = _epoch(_add_months(month, 1))
+                if month_end > cutoff:
+                    break
+                boundary = conn.execute(
+                    'SELECT MIN(id) FROM visitors WHERE timestamp_epoch >= ?', (month_end,)
+                ).fetchone()[0]
+                first_id, last_id = conn.execute('SELECT MIN(id), MAX(id) FROM visitors').fetchone()
+                if boundary is not None:
+                    last_id = boundary - 1
+                # Geo enrichment only updates the live table: stop before the
+                # first visit it has not resolved yet and move it next pass
+                pending = conn.execute(
+                    'SELECT MIN(id) FROM visitors WHERE country = ? AND id BETWEEN ? AND ?',
+                    (PENDING, first_id, last_id)
+                ).fetchone()[0]
+                if pending is not None:
+                    with self._lock:
+                        self._counters['pending_holds'] += 1
+                    if pending == first_id:
+                        break
+                    last_id = pending - 1
+                start_epoch, end_epoch = conn.execute('''
+                    SELECT MIN(timestamp_epoch), MAX(timestamp_epoch) FROM visitors
+                    WHERE id BETWEEN ? AND ?
+                ''', (first_id, last_id)).fetchone()
+            moved += self._move(f"{PARTITION_PREFIX}{month:%Y%m}", f'{month:%Y-%m}',
+                                first_id, last_id, start_epoch, end_epoch)
+        return moved
+
+    def apply_retention(self, now: Optional[datetime] = None) -> int:
+        """Drop partitions older than the retention window once the rollups hold them"""
+        if self.retention_months <= 0 or self.database.db_type != 'sqlite':
+            return 0
+        current = _month_start(_epoch(now or datetime.now(timezone.utc)))
+        oldest_kept = f'{_add_months(current, -self.retention_months):%Y-%m}'
+        dropped = 0
+        for partition in self.partitions():
+            if partition['month'] >= oldest_kept:
+                break
+            table = partition['table_name']
+            if not self._folded(table):
+                print(f"WARNING: Keeping {table}: the daily rollups do not account for all of its visits")
+                with self._lock:
+                    self._counters['skipped_unfolded'] += 1
+                continue
+
+            def drop(cursor):
+                count = cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                cursor.execute(f'DROP TABLE {table}')
+                cursor.execute('DELETE FROM visitor_partitions WHERE table_name = ?', (table,))
+                return count
+            rows = self.database.execute_write(drop)
+            dropped += rows
+            with self._lock:
+                self._counters['dropped_partitions'] += 1
+                self._counters['dropped_rows'] += rows
+        return dropped
+
+    def vacuum(self) -> int:
+        """Return free pages to the filesystem (needs auto_vacuum=INCREMENTAL); returns pages freed"""
+        if self.database.db_type != 'sqlite':
+            return 0
+        with self.database.connection(readonly=True) as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                # Free pages are still reused by new rows, just never released
+                return 0
+
+        def step(cursor):
+            pages = min(cursor.execute('PRAGMA freelist_count').fetchone()[0], VACUUM_CHUNK_PAGES)
+            # Each step of the pragma frees one page, and the driver steps a
+            # statement that returns no rows only once
+            for _ in range(pages):
+                cursor.execute('PRAGMA incremental_vacuum')
+            return pages
+
+        freed = 0
+        while True:
+            pages = self.database.execute_write(step)
+            freed += pages
+            if pages < VACUUM_CHUNK_PAGES:
+                break
+        with self._lock:
+            self._counters['vacuumed_pages'] += freed
+        return freed
+
+    def start(self) -> None:
+        """Run rotation and retention every interval seconds in a background thread"""
+        if not self.enabled or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='visitor-partitions', daemon=True)
+                self._thread.start()
+                self.database.on_shutdown(self.stop)
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        partitions = self.partitions()
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update({
+            'mode': self.mode if self.database.db_type == 'sqlite' else 'off',
+            'retention_months': self.retention_months,
+            'partitions': len(partitions),
+            'oldest_month': partitions[0]['month'] if partitions else None
+        })
+        return stats
+
+    def _load(self):
+        """(version, partitions, visitors columns), cached until the catalog changes.
+
+        Creating or dropping a partition changes the schema version and
+        extending one raises its last_id, so a rotation by another process is
+        seen on the next read.
+        """
+        if self.database.db_type != 'sqlite':
+            return None, [], []
+        with self.database.connection(readonly=True) as conn:
+            version = (conn.execute('PRAGMA schema_version').fetchone()[0],
+                       conn.execute('SELECT SUM(last_id) FROM visitor_partitions').fetchone()[0])
+            catalog = self._catalog
+            if version == catalog[0]:
+                return catalog
+            partitions = [dict(row) for row in conn.execute('''
+                SELECT table_name, month, first_id, last_id, start_epoch, end_epoch, row_count
+                FROM visitor_partitions ORDER BY month
+            ''')]
+            for partition in partitions:
+                partition['columns'] = [row[1] for row in conn.execute(f"PRAGMA table_info({partition['table_name']})")]
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(visitors)')]
+        self._catalog = (version, partitions, columns)
+        return self._catalog
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Visitor partition maintenance failed: {str(e)}")
+
+    def _move(self, table: str, month: str, first_id: int, last_id: int,
+              start_epoch: Optional[int], end_epoch: Optional[int]) -> int:
+        """Create (or extend) a partition and move visitors rows first_id..last_id into it"""
+        def create(cursor):
+            ddl = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'visitors'").fetchone()[0]
+            cursor.execute(ddl.replace('visitors', f'IF NOT EXISTS {table}', 1))
+            # A partition left by an interrupted rotation may predate newer columns
+            have = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+            for _, column, column_type, *_ in cursor.execute('PRAGMA table_info(visitors)').fetchall():
+                if column not in have:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+            for column in PARTITION_INDEXES:
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})')
+
+            # Extending a partition widens its ranges; scalar MIN/MAX would drop NULLs
+            existing = cursor.execute(
+                'SELECT first_id, last_id, start_epoch, end_epoch FROM visitor_partitions WHERE table_name = ?',
+                (table,)
+            ).fetchone()
+            ranges = [first_id, last_id, start_epoch, end_epoch]
+            if existing:
+                for i, (value, pick) in enumerate(zip(existing, (min, max, min, max))):
+                    known = [v for v in (value, ranges[i]) if v is not None]
+                    ranges[i] = pick(known) if known else None
+            cursor.execute('''
+                INSERT INTO visitor_partitions (table_name, month, first_id, last_id, start_epoch, end_epoch)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (table_name) DO UPDATE SET
+                    first_id = excluded.first_id, last_id = excluded.last_id,
+                    start_epoch = excluded.start_epoch, end_epoch = excluded.end_epoch
+            ''', (table, month, *ranges))
+            return [row[1] for row in cursor.execute('PRAGMA table_info(visitors)').fetchall()]
+
+        columns = ', '.join(self.database.execute_write(create))
+        insert = f'INSERT INTO {table} ({columns}) SELECT {columns} FROM visitors WHERE id >= ? AND id < ?'
+
+        def move(cursor, bounds):
+            # Copy and delete in one transaction, so every row is always in exactly one table
+            cursor.execute(insert, bounds)
+            moved = cursor.execute('DELETE FROM visitors WHERE id >= ? AND id < ?', bounds).rowcount
+            cursor.execute('UPDATE visitor_partitions SET row_count = row_count + ? WHERE table_name = ?',
+                           (moved, table))
+            return moved
+
+        moved = 0
+        for start in range(first_id, last_id + 1, self.batch_size):
+            bounds = (start, min(start + self.batch_size, last_id + 1))
+            moved += self.database.execute_write(lambda cursor: move(cursor, bounds))
+        print(f"Moved {moved} visits into {table}")
+        with self._lock:
+            self._counters['rotated_partitions'] += 1
+            self._counters['moved_rows'] += moved
+        return moved
+
+    def _folded(self, table: str) -> bool:
+        """True when every day's visits in the partition are counted in the daily rollups"""
+        with self.database.connection(readonly=True) as conn:
+            days = conn.execute(f'''
+                SELECT strftime('%Y-%m-%d 00:00:00', grouped.day * 86400, 'unixepoch'), grouped.visits
+                FROM (SELECT timestamp_epoch / 86400 AS day, COUNT(*) AS visits FROM {table}
+                      WHERE timestamp_epoch IS NOT NULL GROUP BY 1) grouped
+            ''').fetchall()
+            rolled_up = dict(conn.execute('''
+                SELECT bucket, visits FROM analytics_daily_rollups
+                WHERE dimension = 'total' AND value = '' AND bucket >= ? AND bucket <= ?
+            ''', (min(day for day, _ in days), max(day for day, _ in days))).fetchall()) if days else {}
+        # Rollups count the day's visits in every table, so they can only be larger
+        return all(rolled_up.get(day, 0) >= visits for day, visits in days)
+
+
+def create_visitor_partitions() -> VisitorPartitions:
+    """Build the partition manager from VISITOR_PARTITIONS and related settings"""
+    mode = os.getenv('VISITOR_PARTITIONS', 'off').lower()
+    if mode not in PARTITION_MODES:
+        print(f"WARNING: Unknown VISITOR_PARTITIONS '{mode}', using off")
+        mode = 'off'
+    return VisitorPartitions(
+        mode=mode,
+        retention_months=int(os.getenv('VISITOR_RETENTION_MONTHS', 0)),
+        grace=float(os.getenv('VISITOR_PARTITION_GRACE', 86400)),
+        batch_size=int(os.getenv('VISITOR_PARTITION_BATCH_SIZE', 10000)),
+        interval=float(os.getenv('VISITOR_PARTITION_INTERVAL', 3600))
+    )
+
+
+# Global manager used by the visitors readers and the maintenance thread
+visitor_partitions = create_visitor_partitions()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Visitor String Dictionaries
+user_agent, page_visited and referrer repeat across most visitors rows, so
+each distinct value is stored once in a lookup table and visitors rows
+reference it by integer id (user_agent_id, page_id, referrer_id). The
+ingest path resolves ids through an in-process LRU cache and only touches
+the lookup tables for values it has not seen.
+
+VISITOR_STORAGE selects what visitors rows keep:
+    inline      the ids and the original text columns (default)
+    normalized  the ids only; the text columns are left NULL
+
+Readers go through visitor_select(), which decodes the ids and falls back
+to the inline text for rows written without them, so both layouts (and a
+table part-way through migrate_visitor_strings.py) read the same. It also
+decodes the packed client address (see services/ip_storage.py).
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from database import db_config
+from services.ip_storage import ip_text_sql
+
+# visitors text column -> (lookup table, id column)
+DICTIONARIES = {
+    'user_agent': ('visitor_user_agents', 'user_agent_id'),
+    'page_visited': ('visitor_pages', 'page_id'),
+    'referrer': ('visitor_referrers', 'referrer_id')
+}
+
+# Positions of the dictionary columns in a visit_buffer row
+_POSITIONS = {'user_agent': 1, 'page_visited': 6, 'referrer': 7}
+
+_LOOKUP_CHUNK = 500
+
+
+def value_hash(value: str) -> str:
+    """Fixed-width key for the lookup tables' unique index"""
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def visitor_select(columns: Sequence[str], prefix: str = '', source: Optional[str] = None) -> Tuple[str, str]:
+    """SELECT list and FROM clause reading visitors columns with strings decoded.
+
+    Lookup tables join on differently named keys, so unqualified id,
+    timestamp, etc. in the caller's WHERE and ORDER BY stay unambiguous.
+    source replaces the visitors table, e.g. with the partition-aware
+    VisitorPartitions.source().
+    """
+    expressions, joins = [], []
+    for column in columns:
+        if column in DICTIONARIES:
+            table, id_column = DICTIONARIES[column]
+            expressions.append(f'COALESCE(visitors.{column}, {table}.value) AS {column}')
+            joins.append(f'LEFT JOIN {prefix}{table} ON {table}.{id_column} = visitors.{id_column}')
+        elif column == 'ip_address':
+            expressions.append(f"{ip_text_sql('visitors')} AS ip_address")
+        else:
+            expressions.append(f'visitors.{column}' if column == 'id' else column)
+    return ', '.join(expressions), ' '.join([source or f'{prefix}visitors'] + joins)
+
+
+class StringDictionary:
+    """Value -> id cache in front of one lookup table"""
+
+    def __init__(self, table: str, id_column: str, max_entries: int = 50000):
+        self.table = table
+        self.id_column = id_column
+        self.max_entries = max_entries
+
+        self._ids: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0}
+
+    def cached(self, value: str) -> Optional[int]:
+        with self._lock:
+            value_id = self._ids.get(value)
+            if value_id is None:
+                self._counters['misses'] += 1
+            else:
+                self._ids.move_to_end(value)
+                self._counters['hits'] += 1
+            return value_id
+
+    def remember(self, ids: Dict[str, int]) -> None:
+        """Cache ids once the transaction that created them has committed"""
+        with self._lock:
+            for value, value_id in ids.items():
+                self._ids[value] = value_id
+                self._ids.move_to_end(value)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+
+    def intern(self, cursor, values: Iterable[str], database=None) -> Dict[str, int]:
+        """Insert any missing values and return their ids; run inside a write"""
+        database = database or db_config
+        hashes = {value_hash(value): value for value in values}
+        if not hashes:
+            return {}
+        if database.db_type == 'mysql':
+            insert = f'INSERT IGNORE INTO {self.table} (value_hash, value) VALUES (%s, %s)'
+            placeholder = '%s'
+        else:
+            insert = f'INSERT INTO {self.table} (value_hash, value) VALUES (?, ?) ON CONFLICT (value_hash) DO NOTHING'
+            placeholder = '?'
+        cursor.executemany(insert, list(hashes.items()))
+
+        ids = {}
+        keys = list(hashes)
+        for start in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[start:start + _LOOKUP_CHUNK]
+            cursor.execute(
+                f"SELECT {self.id_column}, value_hash FROM {self.table} "
+                f"WHERE value_hash IN ({', '.join([placeholder] * len(chunk))})",
+                chunk
+            )
+            for row in cursor.fetchall():
+                if database.db_type == 'mysql':
+                    ids[hashes[row['value_hash']]] = row[self.id_column]
+                else:
+                    ids[hashes[row[1]]] = row[0]
+        return ids
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counters, entries=len(self._ids))
+
+
+class VisitorStrings:
+    """Encodes visitor rows for storage using the three string dictionaries"""
+
+    def __init__(self, normalized: bool = False, max_entries: int = 50000, database=None):
+        self.normalized = normalized
+        self.database = database or db_config
+        self.dictionaries = {
+            column: StringDictionary(table, id_column, max_entries)
+            for column, (table, id_column) in DICTIONARIES.items()
+        }
+
+    @property
+    def id_columns(self) -> Tuple[str, ...]:
+        return tuple(id_column for _, id_column in DICTIONARIES.values())
+
+    def encode_rows(self, rows: Sequence[Tuple]) -> List[Tuple]:
+        """Rows in visit_buffer order with user_agent_id, page_id and referrer_id appended.
+
+        Values missing from the cache are interned in their own write, so
+        this must not be called from inside a write operation.
+        """
+        ids = self.resolve({
+            column: [row[position] for row in rows] for column, position in _POSITIONS.items()
+        })
+        encoded = []
+        for row in rows:
+            values = list(row)
+            for column, position in _POSITIONS.items():
+                value = row[position]
+                values.append(ids[column][value] if value is not None else None)
+                if self.normalized and value is not None:
+                    values[position] = None
+            encoded.append(tuple(values))
+        return encoded
+
+    def resolve(self, values: Dict[str, Iterable[Optional[str]]]) -> Dict[str, Dict[str, int]]:
+        """Map each column's values to ids, interning the ones not cached"""
+        ids: Dict[str, Dict[str, int]] = {column: {} for column in values}
+        misses: Dict[str, Set[str]] = {column: set() for column in values}
+        for column, column_values in values.items():
+            dictionary = self.dictionaries[column]
+            for value in column_values:
+                if value is None or value in ids[column] or value in misses[column]:
+                    continue
+                value_id = dictionary.cached(value)
+                if value_id is None:
+                    misses[column].add(value)
+                else:
+                    ids[column][value] = value_id
+
+        if any(misses.values()):
+            interned = self.database.execute_write(lambda cursor: {
+                column: self.dictionaries[column].intern(cursor, column_misses, self.database)
+                for column, column_misses in misses.items() if column_misses
+            })
+            for column, column_ids in interned.items():
+                self.dictionaries[column].remember(column_ids)
+                ids[column].update(column_ids)
+        return ids
+
+    def stats(self) -> Dict:
+        stats = {column: dictionary.stats() for column, dictionary in self.dictionaries.items()}
+        stats['storage'] = 'normalized' if self.normalized else 'inline'
+        return stats
+
+
+# Global encoder used by the visit buffer
+visitor_strings = VisitorStrings(
+    normalized=os.getenv('VISITOR_STORAGE', 'inline').lower() == 'normalized',
+    max_entries=int(os.getenv('VISITOR_STRINGS_CACHE_SIZE', 50000))
+)
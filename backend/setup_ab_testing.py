@@ -9,6 +9,8 @@ import uuid
 from datetime import datetime, timedelta
 from ab_testing_schema import init_ab_testing_tables
 from database import db_config
+from services.bucketing import default_bucketing
+from services.ip_storage import ip_storage
 
 def create_sample_experiments():
     """Create sample experiments for testing"""
@@ -56,28 +58,30 @@ def create_sample_experiments():
             if db_config.db_type == 'mysql':
                 cursor.execute('''
                     INSERT INTO ab_experiments 
-                    (id, name, description, variants, traffic_split, status)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    (id, name, description, variants, traffic_split, status, bucketing)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
                 ''', (
                     experiment['id'],
                     experiment['name'],
                     experiment['description'],
                     json.dumps(experiment['variants']),
                     json.dumps(experiment['traffic_split']),
-                    experiment['status']
+                    experiment['status'],
+                    default_bucketing()
                 ))
             else:
                 cursor.execute('''
                     INSERT INTO ab_experiments 
-                    (id, name, description, variants, traffic_split, status)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (id, name, description, variants, traffic_split, status, bucketing)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     experiment['id'],
                     experiment['name'],
                     experiment['description'],
                     json.dumps(experiment['variants']),
                     json.dumps(experiment['traffic_split']),
-                    experiment['status']
+                    experiment['status'],
+                    default_bucketing()
                 ))
         
         conn.commit()
@@ -140,36 +144,37 @@ def create_sample_data():
                         assigned_variant = variant
                         break
                 
-                assignments.append((exp_id, user_id, assigned_variant, '127.0.0.1'))
+                assignments.append((exp_id, user_id, assigned_variant) + ip_storage.values('127.0.0.1'))
                 
                 # Simulate conversions (random 10-20% conversion rate)
                 import random
                 if random.random() < 0.15:  # 15% conversion rate
                     conversion_value = random.uniform(1.0, 10.0)
-                    conversions.append((exp_id, user_id, assigned_variant, 'default', conversion_value, '127.0.0.1'))
+                    conversions.append((exp_id, user_id, assigned_variant, 'default', conversion_value)
+                                       + ip_storage.values('127.0.0.1'))
             
             # Insert assignments
             if db_config.db_type == 'mysql':
                 cursor.executemany('''
-                    INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix)
+                    VALUES (%s, %s, %s, %s, %s, %s)
                 ''', assignments)
                 
                 cursor.executemany('''
                     INSERT INTO ab_conversions 
-                    (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address, ip_packed, ip_prefix)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 ''', conversions)
             else:
                 cursor.executemany('''
-                    INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address)
-                    VALUES (?, ?, ?, ?)
+                    INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address, ip_packed, ip_prefix)
+                    VALUES (?, ?, ?, ?, ?, ?)
                 ''', assignments)
                 
                 cursor.executemany('''
                     INSERT INTO ab_conversions 
-                    (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address)
-                    VALUES (?, ?, ?, ?, ?, ?)
+                    (experiment_id, user_id, variant, conversion_type, conversion_value, ip_address, ip_packed, ip_prefix)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ''', conversions)
         
         conn.commit()
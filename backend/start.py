@@ -50,6 +50,17 @@ def init_database():
         print(f"ERROR: Failed to initialize database: {str(e)}")
         sys.exit(1)
 
+def init_ab_testing():
+    """Create the A/B testing tables and load the active experiments"""
+    try:
+        from ab_testing_schema import init_ab_testing_tables
+        from services.experiment_registry import experiment_registry
+        init_ab_testing_tables()
+        experiment_registry.load()
+        print("A/B testing functionality initialized successfully")
+    except Exception as e:
+        print(f"Warning: Failed to initialize A/B testing tables: {str(e)}")
+
 def start_application():
     """Start the Flask application"""
     try:
@@ -58,6 +69,13 @@ def start_application():
         # Import and run the Flask app
         from app import app
         
+        # Flush buffered visits before exiting on SIGTERM (Render redeploys)
+        db_config.install_signal_handlers()
+        
+        # Monthly rotation and retention of the visitors table (VISITOR_PARTITIONS)
+        from services.visitor_partitions import visitor_partitions
+        visitor_partitions.start()
+        
         # Get configuration
         debug_mode = os.getenv('FLASK_ENV', 'development') != 'production'
         port = int(os.getenv('PORT', 5000))
@@ -80,5 +98,8 @@ if __name__ == '__main__':
     # Step 2: Initialize database
     init_database()
     
-    # Step 3: Start application
+    # Step 3: Initialize A/B testing and the experiment registry
+    init_ab_testing()
+    
+    # Step 4: Start application
     start_application()
\ No newline at end of file
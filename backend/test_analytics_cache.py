@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for the /api/analytics response cache.
+"""
+
+import sys
+import threading
+import time
+from services.analytics_cache import AnalyticsCache
+
+
+def test_serves_until_write():
+    """Payloads are reused until the write version changes"""
+    cache = AnalyticsCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'total_visitors': len(calls)}
+
+    assert cache.get_or_compute('summary', compute) == {'total_visitors': 1}
+    assert cache.get_or_compute('summary', compute) == {'total_visitors': 1}
+    cache.bump()
+    assert cache.get_or_compute('summary', compute) == {'total_visitors': 2}
+
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['stale'] == 1, stats
+    print("✅ Cached payload invalidated by a write")
+
+
+def test_max_staleness():
+    """Payloads expire after max_staleness even without writes"""
+    cache = AnalyticsCache(max_staleness=0.05)
+    calls = []
+    cache.get_or_compute('summary', lambda: calls.append(1))
+    time.sleep(0.1)
+    cache.get_or_compute('summary', lambda: calls.append(1))
+    assert len(calls) == 2
+    print("✅ Cached payload expires after the TTL")
+
+
+def test_write_during_compute():
+    """A write that lands mid-computation invalidates the result"""
+    cache = AnalyticsCache()
+
+    def compute():
+        cache.bump()
+        return 'computed before the write committed'
+
+    cache.get_or_compute('summary', compute)
+    cache.get_or_compute('summary', lambda: 'fresh')
+    assert cache.get_or_compute('summary', lambda: 'unused') == 'fresh'
+    print("✅ Writes during computation are not masked")
+
+
+def test_coalesces_concurrent_misses():
+    """Concurrent misses share one computation"""
+    cache = AnalyticsCache()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'payload'
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('summary', compute)))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1, len(calls)
+    assert results == ['payload'] * 20
+    assert cache.stats()['coalesced'] == 19
+    print("✅ Concurrent requests coalesced into one computation")
+
+
+def test_errors_are_not_cached():
+    """A failed computation reaches every waiter and is retried next time"""
+    cache = AnalyticsCache()
+
+    def fail():
+        raise RuntimeError('database unavailable')
+
+    try:
+        cache.get_or_compute('summary', fail)
+        assert False, 'expected the computation error'
+    except RuntimeError:
+        pass
+    assert cache.get_or_compute('summary', lambda: 'recovered') == 'recovered'
+    assert cache.stats()['errors'] == 1
+    print("✅ Failed computations are not cached")
+
+
+if __name__ == '__main__':
+    print("=== Analytics Cache Test ===")
+    try:
+        test_serves_until_write()
+        test_max_staleness()
+        test_write_during_compute()
+        test_coalesces_concurrent_misses()
+        test_errors_are_not_cached()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    print("✅ All tests passed!")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Test script for the analytics engines.
+Checks that DuckDB (Parquet snapshots) returns the same breakdowns and A/B
+variant stats as the primary database. DuckDB checks are skipped when the
+package is not installed.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'engine_test.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from services import analytics_engine as engine_module
+from services.analytics_engine import DuckDBAnalyticsEngine, SQLAnalyticsEngine
+
+EXPERIMENT_ID = 'engine-test'
+
+
+def seed():
+    def write(cursor):
+        cursor.executemany('''
+            INSERT INTO visitors (ip_address, user_agent, timestamp, country, city, github_user, page_visited, referrer)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (f'10.0.0.{i % 50}', 'agent', f'2024-03-{1 + i % 5:02d} {i % 24:02d}:30:00',
+             ['Korea', 'Iceland', None][i % 3], 'Seoul', 'octocat' if i % 4 == 0 else None,
+             f'/page{i % 6}', '' if i % 2 else 'https://github.com')
+            for i in range(600)
+        ])
+        cursor.execute('''
+            INSERT INTO ab_experiments (id, name, variants, traffic_split, status)
+            VALUES (?, 'Engine test', '["control", "treatment"]', '{"control": 50, "treatment": 50}', 'active')
+        ''', (EXPERIMENT_ID,))
+        cursor.executemany('''
+            INSERT INTO ab_assignments (experiment_id, user_id, variant, assigned_at)
+            VALUES (?, ?, ?, ?)
+        ''', [(EXPERIMENT_ID, f'user{i}', 'control' if i % 2 else 'treatment', f'2024-03-0{1 + i % 3} 12:00:00')
+              for i in range(200)])
+        cursor.executemany('''
+            INSERT INTO ab_conversions (experiment_id, user_id, variant, conversion_type, conversion_value, converted_at)
+            VALUES (?, ?, ?, 'signup', ?, '2024-03-04 12:00:00')
+        ''', [(EXPERIMENT_ID, f'user{i % 30}', 'control' if i % 2 else 'treatment', i * 1.5) for i in range(45)])
+    db_config.execute_write(write)
+
+
+def test_sql_breakdown():
+    """The sql engine groups by several dimensions within a time range"""
+    engine = SQLAnalyticsEngine()
+    rows = engine.visitor_breakdown(['country', 'day'], datetime(2024, 3, 2), datetime(2024, 3, 4))
+    assert sum(row['visits'] for row in rows) == 240, rows
+    assert {row['day'] for row in rows} == {'2024-03-02', '2024-03-03'}
+    assert {row['country'] for row in rows} == {'Korea', 'Iceland', 'Unknown'}
+    assert rows == sorted(rows, key=lambda row: -row['visits'])
+
+    assignments, conversions = engine.variant_stats(EXPERIMENT_ID)
+    assert assignments['control'] == {'count': 100, 'active_days': 3}, assignments
+    assert conversions['treatment']['count'] == 23 and conversions['treatment']['unique_converters'] == 15
+    print("✅ sql engine breakdowns and variant stats")
+
+
+def test_duckdb_matches_sql():
+    """Snapshot-backed DuckDB answers every query exactly like the row store"""
+    if engine_module.duckdb is None:
+        print("⚠️ duckdb not installed; skipping DuckDB checks (pip install duckdb)")
+        return
+    sql = SQLAnalyticsEngine()
+    duck = DuckDBAnalyticsEngine(mode='snapshot', snapshot_dir=tempfile.mkdtemp())
+    for dimensions in (['country'], ['page', 'referrer'], ['github', 'hour'], ['city', 'country', 'day']):
+        for start, end in ((None, None), (datetime(2024, 3, 2, 6), datetime(2024, 3, 4))):
+            expected = sql.visitor_breakdown(dimensions, start, end, limit=1000)
+            assert duck.visitor_breakdown(dimensions, start, end, limit=1000) == expected, dimensions
+
+    assert duck.variant_stats(EXPERIMENT_ID) == sql.variant_stats(EXPERIMENT_ID)
+    assert duck.variant_stats('missing') == ({}, {})
+
+    # New rows show up after the snapshot is refreshed
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "INSERT INTO ab_assignments (experiment_id, user_id, variant) VALUES (?, 'late', 'control')",
+        (EXPERIMENT_ID,)
+    ))
+    assert duck.variant_stats(EXPERIMENT_ID)[0]['control']['count'] == 100
+    duck.refresh()
+    assert duck.variant_stats(EXPERIMENT_ID)[0]['control']['count'] == 101
+    assert duck.stats()['refreshes'] == 2
+    duck.close()
+    print("✅ duckdb snapshot results match the row store")
+
+
+def test_endpoints_use_engine():
+    """group_by breakdowns and A/B results are served by the configured engine"""
+    from app import app
+    client = app.test_client()
+
+    response = client.get('/api/analytics?group_by=country,page&from=2024-03-01&to=2024-03-06&limit=5')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['engine'] == 'sql' and len(data['rows']) == 5
+    assert set(data['rows'][0]) == {'country', 'page', 'visits'}
+    assert client.get('/api/analytics?group_by=ip_address').status_code == 400
+    assert client.get('/api/analytics?group_by=country&from=soon').status_code == 400
+
+    results = client.get(f'/api/ab/results/{EXPERIMENT_ID}').get_json()
+    assert results['results']['control']['assignments'] == 101
+    assert results['total_conversions'] == 45
+    print("✅ Endpoints route through the analytics engine")
+
+
+def test_report_reads_on_one_connection():
+    """The experiment report passes one pooled connection down to its helpers"""
+    from services.ab_testing_service import ABTestingService
+    checkouts = db_config.pool_stats(readonly=True).get('checkouts', 0)
+    report = ABTestingService.generate_experiment_report(EXPERIMENT_ID)
+    assert 'error' not in report, report
+    assert report['results']['treatment'] == {'assignments': 100, 'conversions': 23, 'conversion_rate': 23.0,
+                                              'total_value': 759.0, 'avg_value': 33.0}
+    assert report['health_metrics']['total_assignments'] == sum(
+        variant['assignments'] for variant in report['results'].values())
+    assert db_config.pool_stats(readonly=True)['checkouts'] == checkouts + 1
+    print("✅ Experiment reports borrow a single connection")
+
+
+def test_endpoints_on_duckdb():
+    if engine_module.duckdb is None:
+        return
+    from app import app
+    client = app.test_client()
+    sql_report = json.loads(client.get(f'/api/ab/results/{EXPERIMENT_ID}').get_data())
+
+    original = engine_module.analytics_engine
+    duck = DuckDBAnalyticsEngine(mode='snapshot', snapshot_dir=tempfile.mkdtemp())
+    import app as app_module
+    import routes.ab_testing as ab_routes
+    app_module.analytics_engine = ab_routes.analytics_engine = duck
+    try:
+        data = client.get('/api/analytics?group_by=github').get_json()['data']
+        assert data['engine'] == 'duckdb' and sum(row['visits'] for row in data['rows']) == 600
+        assert json.loads(client.get(f'/api/ab/results/{EXPERIMENT_ID}').get_data()) == sql_report
+    finally:
+        app_module.analytics_engine = ab_routes.analytics_engine = original
+        duck.close()
+    print("✅ Endpoints answer identically on duckdb")
+
+
+def setup_module():
+    db_config.init_database()
+    init_ab_testing_tables()
+    seed()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Analytics Engine Test ===")
+    setup_module()
+    try:
+        test_sql_breakdown()
+        test_duckdb_matches_sql()
+        test_endpoints_use_engine()
+        test_report_reads_on_one_connection()
+        test_endpoints_on_duckdb()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script for the incrementally maintained analytics rollups.
+Checks that rollups written at ingest, adjusted by geo enrichment and
+backfilled on startup all match a direct GROUP BY over the visitors table.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'rollups_test.db').lstrip('/')
+
+from database import DatabaseConfig, db_config
+from services.analytics_rollups import ROLLUP_TABLES, apply_deltas, iter_time_series, visit_deltas
+from services.geo_enrichment import PENDING, GeoEnrichmentWorker
+from services.visit_buffer import VisitBuffer
+
+
+class StaticGeoClient:
+    """Geo client stand-in that resolves every address to one country"""
+
+    def lookup_batch(self, ip_addresses):
+        return {ip: {'country': 'Iceland', 'city': 'Reykjavik'} for ip in ip_addresses}
+
+
+def expected_counts(database):
+    """Daily counts computed the slow way, straight from visitors"""
+    with database.connection() as conn:
+        rows = conn.execute('''
+            SELECT strftime('%Y-%m-%d 00:00:00', timestamp), country, page_visited, referrer,
+                   github_user IS NOT NULL
+            FROM visitors
+        ''').fetchall()
+    counts = {}
+    for day, country, page, referrer, github in rows:
+        for key in (('total', day, ''), ('country', day, country or 'Unknown'),
+                    ('page', day, page or ''), ('referrer', day, referrer or ''),
+                    ('github', day, '1' if github else '0')):
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def rollup_counts(database, granularity='day'):
+    with database.connection() as conn:
+        rows = conn.execute(f'''
+            SELECT dimension, bucket, value, visits FROM {ROLLUP_TABLES[granularity]}
+            WHERE dimension != 'messages' AND visits != 0
+        ''').fetchall()
+    return {(dimension, bucket, value): visits for dimension, bucket, value, visits in rows}
+
+
+def test_rollups_follow_ingest_and_enrichment():
+    """Buffered visits and enrichment updates keep rollups exact"""
+    db_config.init_database()
+    buffer = VisitBuffer()
+    for i in range(40):
+        buffer.add(VisitBuffer.make_row(
+            f'8.8.{i % 4}.{i}', 'test-agent', PENDING if i % 2 else 'Korea', PENDING,
+            'octocat' if i % 5 == 0 else None, f'/page{i % 3}', 'https://github.com' if i % 7 == 0 else ''
+        ))
+    buffer.flush()
+    assert rollup_counts(db_config) == expected_counts(db_config)
+
+    worker = GeoEnrichmentWorker(StaticGeoClient(), database=db_config)
+    assert worker.run_once() == 20
+    counts = rollup_counts(db_config)
+    assert counts == expected_counts(db_config)
+    assert not any(key[0] == 'country' and key[2] == PENDING for key in counts)
+
+    hourly = sum(v for k, v in rollup_counts(db_config, 'hour').items() if k[0] == 'total')
+    assert hourly == 40, hourly
+    print("✅ Rollups match visitors after ingest and enrichment")
+
+
+def test_backfill_on_startup():
+    """Empty rollup tables are rebuilt from existing visitors on init"""
+    def wipe(cursor):
+        for table in ROLLUP_TABLES.values():
+            cursor.execute(f'DELETE FROM {table}')
+    db_config.execute_write(wipe)
+    assert rollup_counts(db_config) == {}
+
+    database = DatabaseConfig(os.environ['DATABASE_URL'])
+    database.init_database()
+    assert rollup_counts(database) == expected_counts(database)
+    database.shutdown()
+    print("✅ Rollups backfilled from existing visitors")
+
+
+def add_visits(timestamps):
+    rows = [('203.0.113.1', 'agent', timestamp, 'Korea', 'Seoul', None, '/', '') for timestamp in timestamps]
+    db_config.execute_write(lambda cursor: apply_deltas(cursor, visit_deltas(rows)))
+
+
+def test_time_series_buckets():
+    """Series are zero-filled and summed per hour, day and week"""
+    add_visits(['2024-03-04 10:15:00', '2024-03-04 10:45:00', '2024-03-05 23:59:59', '2024-03-12 00:00:00'])
+    start, end = datetime(2024, 3, 4, 9), datetime(2024, 3, 4, 12)
+
+    assert list(iter_time_series(start, end, 'hour')) == [
+        ('2024-03-04 09:00:00', 0), ('2024-03-04 10:00:00', 2), ('2024-03-04 11:00:00', 0)
+    ]
+    assert list(iter_time_series(datetime(2024, 3, 4), datetime(2024, 3, 7), 'day')) == [
+        ('2024-03-04 00:00:00', 2), ('2024-03-05 00:00:00', 1), ('2024-03-06 00:00:00', 0)
+    ]
+    assert list(iter_time_series(datetime(2024, 3, 6), datetime(2024, 3, 19), 'week')) == [
+        ('2024-03-04 00:00:00', 3), ('2024-03-11 00:00:00', 1), ('2024-03-18 00:00:00', 0)
+    ]
+    print("✅ Time series bucketed by hour, day and week")
+
+
+def test_time_series_endpoint():
+    """The endpoint validates ranges, caps buckets and streams long series"""
+    from app import app
+    client = app.test_client()
+
+    response = client.get('/api/analytics?from=2024-03-04&to=2024-03-07&granularity=day')
+    assert response.status_code == 200
+    assert [point['visits'] for point in response.get_json()['data']['series']] == [2, 1, 0]
+
+    response = client.get('/api/analytics?from=2024-01-01&to=2024-03-01&granularity=hour')
+    assert response.is_streamed
+    data = json.loads(response.get_data())['data']
+    assert len(data['series']) == data['buckets'] == 60 * 24
+
+    assert client.get('/api/analytics?from=2000-01-01&granularity=hour').status_code == 400
+    assert client.get('/api/analytics?from=yesterday').status_code == 400
+    assert client.get('/api/analytics?granularity=month&from=2024-01-01').status_code == 400
+    print("✅ Time series endpoint validates and streams")
+
+
+if __name__ == '__main__':
+    print("=== Analytics Rollups Test ===")
+    try:
+        test_rollups_follow_ingest_and_enrichment()
+        test_backfill_on_startup()
+        test_time_series_buckets()
+        test_time_series_endpoint()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        db_config.shutdown()
+    print("✅ All tests passed!")
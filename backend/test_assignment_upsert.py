@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for single-statement variant assignment.
+Checks that concurrent first requests from the same user all succeed with
+one stored assignment, that the stored variant wins over a recomputed one,
+and that users keep their variant after the experiment is paused.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'upsert_test.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from routes.ab_testing import store_assignment
+
+experiment_id = None  # created in setup_module, shared by the tests
+
+
+def create_experiment(client):
+    response = client.post('/api/ab/experiments', json={
+        'name': 'Upsert test', 'description': 'd', 'variants': ['control', 'b'],
+        'traffic_split': {'control': 50, 'b': 50}, 'status': 'active'
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['experiment_id']
+
+
+def test_concurrent_first_requests():
+    """Simultaneous first requests from one user share one assignment"""
+    from app import app
+    users, requests_per_user = 8, 12
+    barrier = threading.Barrier(users * requests_per_user)
+    responses = []
+    lock = threading.Lock()
+
+    def request_variant(user):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post(f'/api/ab/assign/{experiment_id}', json={},
+                               environ_base={'REMOTE_ADDR': f'10.2.0.{user}'})
+        with lock:
+            responses.append((user, response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=request_variant, args=(user,))
+               for user in range(users) for _ in range(requests_per_user)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    failures = [body for _, status, body in responses if status != 200]
+    assert not failures, failures[:3]
+    for user in range(users):
+        bodies = [body for u, _, body in responses if u == user]
+        assert len({body['variant'] for body in bodies}) == 1
+        assert sum(not body['existing_assignment'] for body in bodies) == 1
+    with db_config.connection() as conn:
+        stored = conn.execute('SELECT COUNT(*) FROM ab_assignments WHERE experiment_id = ?', (experiment_id,)).fetchone()
+    assert stored[0] == users
+    print(f"✅ {len(responses)} concurrent requests stored {users} assignments without errors")
+
+
+def test_stored_variant_wins():
+    """An existing assignment is returned even if the split now picks another variant"""
+    variant, existing = store_assignment(experiment_id, 'returning-user', 'b', '10.3.0.1')
+    assert (variant, existing) == ('b', False)
+    assert store_assignment(experiment_id, 'returning-user', 'control', '10.3.0.1') == ('b', True)
+    print("✅ Upsert reads back the stored variant")
+
+
+def test_paused_experiment_keeps_assignments():
+    """Assigned users keep their variant after a pause; new users get a 404"""
+    from app import app
+    client = app.test_client()
+    assigned = client.post(f'/api/ab/assign/{experiment_id}', json={},
+                           environ_base={'REMOTE_ADDR': '10.2.0.0'}).get_json()
+    assert client.put(f'/api/ab/experiments/{experiment_id}/status', json={'status': 'paused'}).status_code == 200
+
+    response = client.post(f'/api/ab/assign/{experiment_id}', json={}, environ_base={'REMOTE_ADDR': '10.2.0.0'})
+    assert response.status_code == 200
+    assert response.get_json()['variant'] == assigned['variant'] and response.get_json()['existing_assignment']
+    assert client.post(f'/api/ab/assign/{experiment_id}', json={},
+                       environ_base={'REMOTE_ADDR': '10.2.9.9'}).status_code == 404
+    print("✅ Paused experiments keep existing assignments")
+
+
+def setup_module():
+    global experiment_id
+    db_config.init_database()
+    init_ab_testing_tables()
+    from app import app
+    experiment_id = create_experiment(app.test_client())
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Assignment Upsert Test ===")
+    setup_module()
+    try:
+        test_concurrent_first_requests()
+        test_stored_variant_wins()
+        test_paused_experiment_keeps_assignments()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
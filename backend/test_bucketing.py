@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for variant bucketing.
+Checks that hash64 buckets are uniform and independent across
+experiments, that fine-grained splits get their share, that appending a
+variant moves no other user, and that md5 experiments keep the original
+assignments.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bucketing_test.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from routes.ab_testing import assign_variant
+from services.bucketing import BUCKETS, Bucketer
+from services.experiment_registry import experiment_registry
+
+# Fixed users, so the statistics below are deterministic: md5 hex ids as
+# get_user_id() makes them, plus short sequential ids
+_rng = random.Random(7)
+USERS = [f'{_rng.getrandbits(128):032x}' for _ in range(150000)] + [f'user{i}' for i in range(50000)]
+
+
+def chi_square(counts, expected):
+    return sum((count - expected) ** 2 / expected for count in counts)
+
+
+def test_uniform_buckets():
+    """Every one of the 10,000 buckets gets its share"""
+    bucketer = Bucketer('exp-uniform', {'control': 50, 'b': 50})
+    counts = [0] * BUCKETS
+    for user_id in USERS:
+        counts[bucketer.bucket(user_id)] += 1
+    # Critical value for 9,999 degrees of freedom at p = 0.001 is about 10,436
+    statistic = chi_square(counts, len(USERS) / BUCKETS)
+    assert statistic < 10436, statistic
+    print(f"✅ Buckets are uniform (chi-square {statistic:.0f}, 9999 df)")
+
+
+def test_independent_across_experiments():
+    """The per-experiment salt decorrelates buckets between experiments"""
+    first, second = Bucketer('exp-one', {'a': 50, 'b': 50}), Bucketer('exp-two', {'a': 50, 'b': 50})
+    table = [0] * 100
+    for user_id in USERS:
+        table[first.bucket(user_id) // 1000 * 10 + second.bucket(user_id) // 1000] += 1
+    # 10 x 10 contingency table, 81 degrees of freedom: critical value 124.8
+    statistic = chi_square(table, len(USERS) / 100)
+    assert statistic < 124.8, statistic
+    print(f"✅ Experiments bucket independently (chi-square {statistic:.0f}, 81 df)")
+
+
+def test_fine_grained_split():
+    """A 0.5% variant gets about 0.5% of users; splits need not be whole percents"""
+    bucketer = Bucketer('exp-fine', {'control': 49.75, 'b': 49.75, 'canary': 0.5})
+    assert bucketer.thresholds == [4975, 9950, 10000]
+    share = sum(bucketer.assign(user_id) == 'canary' for user_id in USERS) / len(USERS)
+    assert 0.0045 < share < 0.0055, share
+    thirds = Bucketer('exp-thirds', {'a': 33.33, 'b': 33.33, 'c': 33.34})
+    assert thirds.thresholds == [3333, 6666, 10000]
+    print(f"✅ Fine-grained splits get their share ({share:.2%} for 0.5%)")
+
+
+def test_appended_split_is_stable():
+    """Adding a variant at the end only moves users from the variant it takes traffic from"""
+    before = Bucketer('exp-stable', {'control': 50, 'b': 50})
+    after = Bucketer('exp-stable', {'control': 50, 'b': 40, 'c': 10})
+    moved = [user_id for user_id in USERS if before.assign(user_id) != after.assign(user_id)]
+    assert all(before.assign(user_id) == 'b' and after.assign(user_id) == 'c' for user_id in moved)
+    assert 0.09 < len(moved) / len(USERS) < 0.11
+
+    # Traffic that fell through to control is claimed without moving anyone else
+    partial = Bucketer('exp-stable', {'control': 45, 'b': 45})
+    extended = Bucketer('exp-stable', {'control': 45, 'b': 45, 'c': 10})
+    assert all(extended.assign(user_id) in ('c', partial.assign(user_id)) for user_id in USERS)
+    print(f"✅ Appending a variant moved only {len(moved) / len(USERS):.1%} of users, all from b to c")
+
+
+def test_md5_experiments_keep_assignments():
+    """Experiments created before hash64 keep the original variants; new ones use hash64"""
+    split = {'control': 40, 'a': 30, 'b': 30}
+    md5 = Bucketer('exp-legacy', split, 'md5')
+    assert all(md5.assign(user_id) == assign_variant('exp-legacy', user_id, split) for user_id in USERS[:20000])
+
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "INSERT INTO ab_experiments (id, name, variants, traffic_split, status) VALUES (?, ?, ?, ?, 'active')",
+        ('exp-legacy', 'Legacy', json.dumps(list(split)), json.dumps(split))
+    ))
+    legacy = experiment_registry.get('exp-legacy')
+    assert legacy.bucketer.scheme == 'md5'
+    assert all(legacy.assign(user_id) == assign_variant('exp-legacy', user_id, split) for user_id in USERS[:2000])
+
+    from app import app
+    client = app.test_client()
+    response = client.post('/api/ab/experiments', json={
+        'name': 'Fine', 'description': 'd', 'variants': ['a', 'b'],
+        'traffic_split': {'a': 99.99, 'b': 0.01}, 'status': 'active'
+    })
+    assert response.status_code == 201, response.get_json()
+    experiment = experiment_registry.get(response.get_json()['experiment_id'])
+    assert experiment.bucketer.scheme == 'hash64' and experiment.bucketer.thresholds == [9999, 10000]
+    assert client.post('/api/ab/experiments', json={
+        'name': 'Bad', 'description': 'd', 'variants': ['control'], 'traffic_split': {'control': 100},
+        'bucketing': 'crc'
+    }).status_code == 400
+    print("✅ md5 experiments keep their assignments; new experiments use hash64")
+
+
+def setup_module():
+    db_config.init_database()
+    init_ab_testing_tables()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Bucketing Test ===")
+    setup_module()
+    try:
+        test_uniform_buckets()
+        test_independent_across_experiments()
+        test_fine_grained_split()
+        test_appended_split_is_stable()
+        test_md5_experiments_keep_assignments()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
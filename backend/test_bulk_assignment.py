@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script for the bulk assignment endpoint.
+Checks that one request assigns the user to every active experiment with a
+single write, that repeat calls only read, that a requested list keeps
+stored variants of paused experiments, and that the variants agree with
+the per-experiment endpoint.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bulk_test.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from services.experiment_registry import experiment_registry
+
+USER = {'REMOTE_ADDR': '10.7.0.1'}
+
+experiment_ids = []  # created in setup_module, shared by the tests
+
+
+def fetch(query, params=()):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query, params).fetchall()]
+
+
+def create_experiments(client, count):
+    ids = []
+    for i in range(count):
+        response = client.post('/api/ab/experiments', json={
+            'name': f'Bulk {i}', 'description': 'd', 'variants': ['a', 'b', 'c'],
+            'traffic_split': {'a': 40, 'b': 30, 'c': 30}, 'status': 'active'
+        })
+        assert response.status_code == 201, response.get_json()
+        ids.append(response.get_json()['experiment_id'])
+    return ids
+
+
+def test_assigns_every_active_experiment():
+    """One call, one write, one row per active experiment"""
+    from app import app
+    client = app.test_client()
+
+    submitted = db_config.writer_stats()['submitted']
+    response = client.post('/api/ab/assign', json={}, environ_base=USER)
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert db_config.writer_stats()['submitted'] == submitted + 1
+    assert sorted(body['assignments']) == sorted(experiment_ids) and body['not_found'] == []
+    assert not any(assignment['existing_assignment'] for assignment in body['assignments'].values())
+    assert fetch('SELECT COUNT(*) FROM ab_assignments WHERE user_id = ?', (body['user_id'],)) == [(5,)]
+
+    # Repeat page loads only read
+    again = client.post('/api/ab/assign', json={}, environ_base=USER).get_json()
+    assert db_config.writer_stats()['submitted'] == submitted + 1
+    assert {k: v['variant'] for k, v in again['assignments'].items()} == \
+        {k: v['variant'] for k, v in body['assignments'].items()}
+    assert all(assignment['existing_assignment'] for assignment in again['assignments'].values())
+
+    # The per-experiment endpoint sees the same assignments
+    for experiment_id, assignment in body['assignments'].items():
+        single = client.post(f'/api/ab/assign/{experiment_id}', json={}, environ_base=USER).get_json()
+        assert single['variant'] == assignment['variant'] and single['existing_assignment']
+    print("✅ Bulk assignment covers every active experiment in one write")
+
+
+def test_requested_experiments():
+    """A requested list returns stored variants of paused experiments and lists unknown ids"""
+    from app import app
+    client = app.test_client()
+    paused, active = experiment_ids[0], create_experiments(client, 1)[0]
+    assert client.put(f'/api/ab/experiments/{paused}/status', json={'status': 'paused'}).status_code == 200
+    stored = fetch('SELECT variant FROM ab_assignments WHERE experiment_id = ?', (paused,))[0][0]
+
+    body = client.post('/api/ab/assign', json={'experiment_ids': [paused, active, 'no-such-experiment', active]},
+                       environ_base=USER).get_json()
+    assert body['assignments'] == {
+        paused: {'variant': stored, 'existing_assignment': True},
+        active: {'variant': body['assignments'][active]['variant'], 'existing_assignment': False},
+    }
+    assert body['not_found'] == ['no-such-experiment']
+
+    # A new user gets nothing for the paused experiment
+    other = client.post('/api/ab/assign', json={'experiment_ids': [paused]},
+                        environ_base={'REMOTE_ADDR': '10.7.0.2'}).get_json()
+    assert other['assignments'] == {} and other['not_found'] == [paused]
+
+    assert client.post('/api/ab/assign', json={'experiment_ids': 'all'}).status_code == 400
+    assert client.post('/api/ab/assign', json={'experiment_ids': ['x'] * 101}).status_code == 400
+    print("✅ Requested experiments keep stored variants and report unknown ids")
+
+
+def test_unknown_ids_share_one_check():
+    """A list of unknown ids costs one version check, not one per id"""
+    from app import app
+    client = app.test_client()
+    time.sleep(experiment_registry.miss_check_interval)
+    checks = experiment_registry.stats()['version_checks']
+    missing = [f'missing-{i}' for i in range(50)]
+    body = client.post('/api/ab/assign', json={'experiment_ids': missing}, environ_base=USER).get_json()
+    assert body['assignments'] == {} and body['not_found'] == missing
+    assert experiment_registry.stats()['version_checks'] <= checks + 2  # refresh plus one forced check
+    print("✅ Unknown ids are looked up with one registry refresh")
+
+
+def setup_module():
+    db_config.init_database()
+    init_ab_testing_tables()
+    from app import app
+    experiment_ids.extend(create_experiments(app.test_client(), 5))
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Bulk Assignment Test ===")
+    setup_module()
+    try:
+        test_assigns_every_active_experiment()
+        test_requested_experiments()
+        test_unknown_ids_share_one_check()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
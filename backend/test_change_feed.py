@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test script for the id-watermark change feed.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'changes_test.db').lstrip('/')
+os.environ['EXPORT_API_TOKEN'] = 'test-token'
+
+from database import db_config
+from services.change_feed import ChangeFeed
+from services.visit_buffer import VisitBuffer
+
+HEADERS = {'Authorization': 'Bearer test-token'}
+
+
+def add_visits(buffer, count):
+    for i in range(count):
+        buffer.add(VisitBuffer.make_row(f'10.0.0.{i}', 'agent', 'Korea', 'Seoul', None, '/', ''))
+    buffer.flush()
+
+
+def test_batches_by_watermark():
+    """Polls return at most one batch after the watermark, in id order"""
+    feed = ChangeFeed(max_batch=4)
+    add_visits(VisitBuffer(), 10)
+
+    rows, next_id = feed.poll('visitors', 0, limit=100)
+    assert [row['id'] for row in rows] == [1, 2, 3, 4] and next_id == 4
+    rows, next_id = feed.poll('visitors', 8)
+    assert [row['id'] for row in rows] == [9, 10] and next_id == 10
+    rows, next_id = feed.poll('visitors', 10)
+    assert rows == [] and next_id == 10
+    print("✅ Polls return bounded batches after the watermark")
+
+
+def test_long_poll_wakes_on_write():
+    """A waiting poll returns as soon as new rows are committed"""
+    from services.change_feed import change_feed
+    change_feed.recheck_interval = 60  # only a notify can wake it in time
+    buffer = VisitBuffer()
+    threading.Timer(0.3, add_visits, args=(buffer, 2)).start()
+
+    started = time.monotonic()
+    rows, next_id = change_feed.poll('visitors', 10, wait=10)
+    elapsed = time.monotonic() - started
+    assert [row['id'] for row in rows] == [11, 12], rows
+    assert 0.2 < elapsed < 2, elapsed
+    print(f"✅ Long-poll woke after {elapsed:.2f}s when rows were flushed")
+
+
+def test_long_poll_times_out():
+    feed = ChangeFeed(recheck_interval=0.05)
+    started = time.monotonic()
+    rows, next_id = feed.poll('visitors', 12, wait=0.3)
+    assert rows == [] and next_id == 12
+    assert time.monotonic() - started >= 0.3
+    print("✅ Long-poll returns empty after the wait")
+
+
+def test_offsets_via_api():
+    """Consumers resume from their committed offset; offsets never move back"""
+    from app import app
+    client = app.test_client()
+    assert client.get('/api/changes/visitors').status_code == 401
+    assert client.get('/api/changes/contact_messages', headers=HEADERS).status_code == 404
+
+    body = client.get('/api/changes/visitors?consumer=warehouse&limit=5', headers=HEADERS).get_json()
+    assert body['after_id'] == 0 and body['next_after_id'] == 5
+
+    response = client.put('/api/changes/visitors/offsets/warehouse', json={'last_id': 5}, headers=HEADERS)
+    assert response.get_json()['last_id'] == 5
+    client.put('/api/changes/visitors/offsets/warehouse', json={'last_id': 3}, headers=HEADERS)
+
+    body = client.get('/api/changes/visitors?consumer=warehouse&limit=5', headers=HEADERS).get_json()
+    assert [row['id'] for row in body['rows']] == [6, 7, 8, 9, 10]
+    print("✅ Consumer offsets stored and resumed")
+
+
+def test_settle_holds_back_tail():
+    """With a settle time, new ids are served only once they have settled"""
+    feed = ChangeFeed(settle=0.3)
+    add_visits(VisitBuffer(), 2)
+    rows, next_id = feed.poll('visitors', 12)
+    assert rows == [] and next_id == 12
+    assert feed.stats()['settling_holds'] == 1
+
+    time.sleep(0.35)
+    rows, next_id = feed.poll('visitors', 12)
+    assert [row['id'] for row in rows] == [13, 14] and next_id == 14
+
+    # Rows committed after the settled sample wait for the next one
+    add_visits(VisitBuffer(), 1)
+    rows, next_id = feed.poll('visitors', 14, wait=2)
+    assert [row['id'] for row in rows] == [15] and next_id == 15
+    print("✅ Settle time holds back the unsettled tail")
+
+
+def test_pending_visits_held_back():
+    """A visitors batch stops before the first row still waiting for geo enrichment"""
+    feed = ChangeFeed()
+    buffer = VisitBuffer()
+    buffer.add(VisitBuffer.make_row('10.0.1.1', 'agent', 'Korea', 'Seoul', None, '/', ''))
+    buffer.add(VisitBuffer.make_row('10.0.1.2', 'agent', 'pending', 'pending', None, '/', ''))
+    buffer.add(VisitBuffer.make_row('10.0.1.3', 'agent', 'Korea', 'Busan', None, '/', ''))
+    buffer.flush()
+
+    rows, next_id = feed.poll('visitors', 15)
+    assert [row['id'] for row in rows] == [16] and next_id == 16
+    rows, next_id = feed.poll('visitors', 16)
+    assert rows == [] and next_id == 16
+
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "UPDATE visitors SET country = 'Korea', city = 'Incheon' WHERE id = 17"
+    ))
+    rows, next_id = feed.poll('visitors', 16)
+    assert [(row['id'], row['city']) for row in rows] == [(17, 'Incheon'), (18, 'Busan')]
+    assert ChangeFeed(hold_pending=False).poll('visitors', 15)[0][1]['id'] == 17
+    print("✅ Pending visits are served after enrichment")
+
+
+def test_old_pending_visits_served():
+    """A pending row older than max_pending_age no longer holds the batch back"""
+    buffer = VisitBuffer()
+    buffer.add(('10.0.1.4', 'agent', '2024-01-01 00:00:00', 'pending', 'pending', None, '/', ''))
+    buffer.add(VisitBuffer.make_row('10.0.1.5', 'agent', 'pending', 'pending', None, '/', ''))
+    buffer.flush()
+
+    feed = ChangeFeed(max_pending_age=60)
+    rows, next_id = feed.poll('visitors', 18)
+    assert [(row['id'], row['country']) for row in rows] == [(19, 'pending')] and next_id == 19
+    assert feed.stats()['pending_served'] == 1 and feed.stats()['pending_holds'] == 1
+    assert [row['id'] for row in ChangeFeed(max_pending_age=0).poll('visitors', 18)[0]] == [19, 20]
+    print("✅ Stale pending visits are served instead of stalling the feed")
+
+
+def setup_module():
+    db_config.init_database()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Change Feed Test ===")
+    setup_module()
+    try:
+        test_batches_by_watermark()
+        test_long_poll_wakes_on_write()
+        test_long_poll_times_out()
+        test_offsets_via_api()
+        test_settle_holds_back_tail()
+        test_pending_visits_held_back()
+        test_old_pending_visits_served()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded database connection pool.
+Checks that the pool never opens more than max_size connections, that a
+checkout waits for a release and times out with PoolTimeoutError, that idle
+connections are evicted down to min_size, and that dead connections are
+replaced.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pool_test.db').lstrip('/')
+
+from database import ConnectionPool, PoolTimeoutError, db_config
+
+
+def make_pool(**kwargs):
+    return ConnectionPool(
+        connect=lambda: sqlite3.connect(':memory:', check_same_thread=False),
+        validate=lambda conn: conn.execute('SELECT 1'),
+        **kwargs
+    )
+
+
+def test_bounded_size_and_timeout():
+    """A full pool makes checkouts wait, then fail after checkout_timeout"""
+    pool = make_pool(max_size=2, checkout_timeout=0.2)
+    first, second = pool.acquire(), pool.acquire()
+    assert pool.stats()['size'] == 2 and pool.stats()['occupancy'] == 1.0
+
+    started = time.monotonic()
+    try:
+        pool.acquire()
+        raise AssertionError('checkout from a full pool did not time out')
+    except PoolTimeoutError:
+        pass
+    assert 0.2 <= time.monotonic() - started < 1
+    assert pool.stats()['timeouts'] == 1 and pool.stats()['created'] == 2
+
+    pool.release(first)
+    assert pool.acquire() is first  # reused, not a third connection
+    pool.release(first)
+    pool.release(second)
+    pool.close()
+    print("✅ Pool stays within max_size and times out when exhausted")
+
+
+def test_waiter_gets_released_connection():
+    """A waiting checkout is handed the next connection released"""
+    pool = make_pool(max_size=1, checkout_timeout=5)
+    conn = pool.acquire()
+    threading.Timer(0.1, pool.release, args=(conn,)).start()
+
+    started = time.monotonic()
+    assert pool.acquire() is conn
+    assert 0.05 < time.monotonic() - started < 2
+    assert pool.stats()['waits'] == 1 and pool.stats()['created'] == 1
+    pool.release(conn)
+    pool.close()
+    print("✅ Waiting checkouts are woken by a release")
+
+
+def test_idle_eviction_keeps_min_size():
+    """Connections idle past idle_timeout are closed, down to min_size"""
+    pool = make_pool(min_size=1, max_size=3, idle_timeout=0.1)
+    connections = [pool.acquire() for _ in range(3)]
+    for conn in connections:
+        pool.release(conn)
+    assert pool.stats()['idle'] == 3
+
+    time.sleep(0.15)
+    conn = pool.acquire()
+    assert pool.stats()['evicted'] == 2 and pool.stats()['size'] == 1
+    pool.release(conn)
+    pool.close()
+    print("✅ Idle connections are evicted down to min_size")
+
+
+def test_dead_connection_replaced():
+    """A connection that fails validation is discarded and a new one opened"""
+    pool = make_pool(max_size=1)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+
+    fresh = pool.acquire()
+    assert fresh is not conn and fresh.execute('SELECT 1').fetchone() == (1,)
+    assert pool.stats()['invalidated'] == 1 and pool.stats()['size'] == 1
+    pool.release(fresh)
+    pool.close()
+    print("✅ Dead connections are replaced")
+
+
+def test_database_config_pool():
+    """db_config.connection() borrows from the pool and returns the connection"""
+    db_config.pool_max_size = 2
+    with db_config.connection() as conn:
+        conn.execute('SELECT COUNT(*) FROM visitors').fetchone()
+        assert db_config.pool_stats()['in_use'] == 1
+    stats = db_config.pool_stats()
+    assert stats['in_use'] == 0 and stats['max_size'] == 2 and stats['checkouts'] >= 1
+    print("✅ db_config.connection() uses the pool")
+
+
+def setup_module():
+    db_config.init_database()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Connection Pool Test ===")
+    setup_module()
+    try:
+        test_bounded_size_and_timeout()
+        test_waiter_gets_released_connection()
+        test_idle_eviction_keeps_min_size()
+        test_dead_connection_replaced()
+        test_database_config_pool()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
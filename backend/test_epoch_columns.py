@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script for the integer epoch columns of the SQLite event tables.
+Checks that every write path fills them, that hour/day breakdowns and A/B
+day counts match the text timestamps, and that the migration upgrades a
+database stored without them.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'epoch_test.db').lstrip('/')
+
+from database import DatabaseConfig, db_config
+from ab_testing_schema import init_ab_testing_tables
+from migrate_epoch_columns import migrate
+from services.analytics_engine import SQLAnalyticsEngine
+from services.visit_buffer import VisitBuffer
+
+EXPERIMENT_ID = 'epoch-test'
+
+
+def fetch(query, params=()):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query, params).fetchall()]
+
+
+def mismatched(table):
+    """Rows whose epoch copy disagrees with the text timestamp"""
+    column = DatabaseConfig.EVENT_TIME_COLUMNS[table]
+    return fetch(f'''
+        SELECT COUNT(*) FROM {table}
+        WHERE {column}_epoch IS NOT {DatabaseConfig.epoch_sql(column)}
+    ''')[0][0]
+
+
+def seed(cursor):
+    cursor.executemany(
+        'INSERT INTO visitors (ip_address, timestamp, country, page_visited) VALUES (?, ?, ?, ?)',
+        [('10.0.0.1', f'2024-03-{1 + i % 9:02d} {i % 24:02d}:{i % 60:02d}:00', ['Korea', 'Iceland'][i % 2], '/')
+         for i in range(300)]
+    )
+    cursor.execute('''
+        INSERT INTO ab_experiments (id, name, variants, traffic_split, status)
+        VALUES (?, 'Epoch test', '["a", "b"]', '{"a": 50, "b": 50}', 'active')
+    ''', (EXPERIMENT_ID,))
+    cursor.executemany(
+        'INSERT INTO ab_assignments (experiment_id, user_id, variant, assigned_at) VALUES (?, ?, ?, ?)',
+        [(EXPERIMENT_ID, f'user{i}', 'ab'[i % 2], f'2024-03-{1 + i % 7:02d} 23:59:59') for i in range(70)]
+    )
+    cursor.execute("INSERT INTO ab_conversions (experiment_id, user_id, variant) VALUES (?, 'user1', 'b')",
+                   (EXPERIMENT_ID,))
+    cursor.execute("INSERT INTO contact_messages (name, email, subject, message) VALUES ('a', 'b', 'c', 'd')")
+
+
+def test_writes_fill_epoch():
+    """Buffered visits, explicit timestamps and column defaults all get an epoch"""
+    db_config.execute_write(seed)
+    buffer = VisitBuffer()
+    for _ in range(5):
+        buffer.add(VisitBuffer.make_row('10.0.0.2', 'agent', 'Korea', 'Seoul', None, '/', ''))
+    buffer.flush()
+
+    for table in ('visitors', 'ab_assignments', 'ab_conversions', 'contact_messages'):
+        assert mismatched(table) == 0, table
+    assert fetch('SELECT COUNT(*) FROM visitors WHERE timestamp_epoch IS NULL') == [(0,)]
+    print("✅ Every write path fills the epoch columns")
+
+
+def test_buckets_match_text():
+    """Hour and day breakdowns and ranges agree with grouping the text timestamps"""
+    engine = SQLAnalyticsEngine()
+    start, end = datetime(2024, 3, 2, 6), datetime(2024, 3, 5)
+    rows = engine.visitor_breakdown(['country', 'hour'], start, end, limit=1000)
+    expected = fetch('''
+        SELECT country, strftime('%Y-%m-%d %H:00:00', timestamp), COUNT(*) FROM visitors
+        WHERE timestamp >= '2024-03-02 06:00:00' AND timestamp < '2024-03-05 00:00:00'
+        GROUP BY 1, 2
+    ''')
+    assert sorted((row['country'], row['hour'], row['visits']) for row in rows) == sorted(expected)
+
+    days = {row['day']: row['visits'] for row in engine.visitor_breakdown(['day'], limit=1000)}
+    assert days == dict(fetch("SELECT strftime('%Y-%m-%d', timestamp), COUNT(*) FROM visitors GROUP BY 1"))
+
+    assignments, _ = engine.variant_stats(EXPERIMENT_ID)
+    assert assignments == {'a': {'count': 35, 'active_days': 7}, 'b': {'count': 35, 'active_days': 7}}, assignments
+    print("✅ Epoch buckets match the text timestamps")
+
+
+def test_index_use():
+    """Range filters and A/B day counts are answered from the epoch indexes"""
+    def plan(query, params=()):
+        with db_config.connection() as conn:
+            return ' '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params))
+
+    assert 'idx_visitors_timestamp_epoch' in plan(
+        'SELECT COUNT(*) FROM visitors WHERE timestamp_epoch >= ? AND timestamp_epoch < ?', (0, 1)
+    )
+    assert 'COVERING INDEX idx_ab_assignments_assigned_at_epoch' in plan('''
+        SELECT variant, COUNT(*), COUNT(DISTINCT assigned_at_epoch / 86400) FROM ab_assignments
+        WHERE experiment_id = ? GROUP BY variant
+    ''', (EXPERIMENT_ID,))
+    print("✅ Queries use the epoch indexes")
+
+
+def test_migration():
+    """A database stored without epoch columns is upgraded in batches"""
+    conn = db_config.get_connection()
+    for table, column in DatabaseConfig.EVENT_TIME_COLUMNS.items():
+        epoch = f'{column}_epoch'
+        conn.execute(f'DROP TRIGGER trg_{table}_{epoch}')
+        conn.execute(f'DROP INDEX idx_{table}_{epoch}')
+        conn.execute(f'ALTER TABLE {table} DROP COLUMN {epoch}')
+    conn.commit()
+    conn.close()
+
+    assert migrate(batch_size=50, log=lambda message: None) == 377
+    for table in ('visitors', 'ab_assignments', 'ab_conversions', 'contact_messages'):
+        assert mismatched(table) == 0, table
+    assert fetch("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'idx_%_epoch'") == [(5,)]
+    assert fetch("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'trg_%_epoch'") == [(5,)]
+    assert migrate(log=lambda message: None) == 0
+
+    # Startup leaves a migrated database alone
+    database = DatabaseConfig(os.environ['DATABASE_URL'])
+    database.init_database()
+    database.shutdown()
+    test_buckets_match_text()
+    print("✅ Migration fills and indexes the epoch columns")
+
+
+def setup_module():
+    db_config.init_database()
+    init_ab_testing_tables()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Epoch Columns Test ===")
+    setup_module()
+    try:
+        test_writes_fill_epoch()
+        test_buckets_match_text()
+        test_index_use()
+        test_migration()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
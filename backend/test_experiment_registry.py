@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process experiment registry.
+Checks that assignments match assign_variant(), that repeated assignments
+are served without reloading experiments, and that changes made through
+the API, by another worker or by plain SQL are picked up through the
+version stamp.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'registry_test.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from routes.ab_testing import assign_variant
+from services.experiment_registry import ExperimentConfig, ExperimentRegistry, experiment_registry
+
+
+def create_experiment(client, split, status='active'):
+    response = client.post('/api/ab/experiments', json={
+        'name': 'Registry test', 'description': 'd', 'variants': list(split),
+        'traffic_split': split, 'status': status
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['experiment_id']
+
+
+def test_matches_assign_variant():
+    """md5 experiments pick the same variant as the original linear walk"""
+    for split in ({'control': 50, 'b': 50}, {'control': 40, 'a': 30, 'b': 30},
+                  {'control': 0, 'a': 100}, {'control': 33, 'a': 33, 'b': 33}):
+        config = ExperimentConfig('exp', list(split), split, 'md5')
+        for i in range(2000):
+            assert config.assign(f'user{i}') == assign_variant('exp', f'user{i}', split), (split, i)
+    print("✅ Registry assignment matches assign_variant()")
+
+
+def test_hot_path_skips_experiments_table():
+    """Assignments after the first reload only check the version stamp"""
+    from app import app
+    client = app.test_client()
+    experiment_id = create_experiment(client, {'control': 50, 'b': 50})
+
+    reloads = experiment_registry.stats()['reloads']
+    experiment_registry.check_interval = 60
+    try:
+        for i in range(200):
+            response = client.post(f'/api/ab/assign/{experiment_id}', json={},
+                                   environ_base={'REMOTE_ADDR': f'10.1.{i // 50}.{i % 50}'})
+            assert response.status_code == 200, response.get_json()
+    finally:
+        experiment_registry.check_interval = 5
+    assert experiment_registry.stats()['reloads'] == reloads + 1  # the create invalidated it once
+    assert client.post('/api/ab/assign/no-such-experiment', json={}).status_code == 404
+    print("✅ Assignment reads experiments from the registry")
+
+
+def test_version_stamp_invalidation():
+    """API writes, another worker's writes and manual SQL all bump the stamp"""
+    from app import app
+    client = app.test_client()
+    experiment_id = create_experiment(client, {'control': 50, 'b': 50})
+    other_worker = ExperimentRegistry(check_interval=0.2)
+    assert other_worker.get(experiment_id) is not None
+
+    # Paused through this worker's API: the other worker notices within its interval
+    assert client.put(f'/api/ab/experiments/{experiment_id}/status', json={'status': 'paused'}).status_code == 200
+    assert client.post(f'/api/ab/assign/{experiment_id}', json={}).status_code == 404
+    assert experiment_id in {config.id for config in other_worker.active()}
+    time.sleep(0.25)
+    assert experiment_id not in {config.id for config in other_worker.active()}
+
+    # Reactivated by plain SQL: the trigger bumps the stamp, and an unknown
+    # id forces a check instead of waiting for the interval
+    version = other_worker.stats()['version']
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "UPDATE ab_experiments SET status = 'active' WHERE id = ?", (experiment_id,)
+    ))
+    assert other_worker.get(experiment_id).traffic_split == {'control': 50, 'b': 50}
+    assert other_worker.stats()['version'] > version
+    time.sleep(experiment_registry.miss_check_interval)  # this worker's 404 above used its check
+    assert client.post(f'/api/ab/assign/{experiment_id}', json={}).status_code == 200
+    print("✅ Version stamp invalidates every registry")
+
+
+def test_unknown_ids_check_once_per_interval():
+    """Lookups of missing ids share one forced version check per interval"""
+    registry = ExperimentRegistry(check_interval=60, miss_check_interval=0.3)
+    registry.load()
+    checks = registry.stats()['version_checks']
+    for i in range(50):
+        assert registry.get(f'missing-{i}') is None
+    assert registry.stats()['version_checks'] == checks + 1
+    assert registry.stats()['skipped_miss_checks'] == 49
+
+    # An experiment added by another worker is found on the next allowed check
+    from app import app
+    experiment_id = create_experiment(app.test_client(), {'control': 50, 'b': 50})
+    assert registry.get(experiment_id) is None
+    time.sleep(0.35)
+    assert registry.get(experiment_id) is not None
+    print("✅ Unknown ids force at most one version check per interval")
+
+
+def setup_module():
+    db_config.init_database()
+    init_ab_testing_tables()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Experiment Registry Test ===")
+    setup_module()
+    try:
+        test_matches_assign_variant()
+        test_hot_path_skips_experiments_table()
+        test_version_stamp_invalidation()
+        test_unknown_ids_check_once_per_interval()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
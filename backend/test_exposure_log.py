@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for stateless assignment with the asynchronous exposure log.
+Checks that assignment answers without a database write, that exposures
+reach ab_assignments in batches exactly once per user, and that
+conversions credit the logged exposure.
+"""
+
+import os
+import sys
+import tempfile
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'exposure_test.db').lstrip('/')
+os.environ['AB_ASSIGNMENT_MODE'] = 'stateless'
+os.environ['AB_EXPOSURE_FLUSH_MS'] = '60000'  # flushed by hand below
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from services.bucketing import Bucketer
+from services.experiment_registry import experiment_registry
+from services.exposure_log import ExposureLog, exposure_log
+
+SPLIT = {'control': 50, 'b': 50}
+
+experiment_id = None  # created in setup_module, shared by the tests
+
+
+def fetch(query, params=()):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query, params).fetchall()]
+
+
+def expected(experiment_id, user_id):
+    """The variant the stored-assignment path would pick"""
+    return Bucketer(experiment_id, experiment_registry.get(experiment_id).traffic_split).assign(user_id)
+
+
+def create_experiment(client):
+    response = client.post('/api/ab/experiments', json={
+        'name': 'Exposure test', 'description': 'd', 'variants': list(SPLIT),
+        'traffic_split': SPLIT, 'status': 'active'
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['experiment_id']
+
+
+def test_assignment_skips_database():
+    """Variants come from memory; exposures are written later in one batch"""
+    from app import app
+    client = app.test_client()
+    submitted = db_config.writer_stats()['submitted']
+
+    variants = {}
+    for i in range(20):
+        for _ in range(3):
+            response = client.post(f'/api/ab/assign/{experiment_id}', json={},
+                                   environ_base={'REMOTE_ADDR': f'10.4.0.{i}'})
+            assert response.status_code == 200, response.get_json()
+            body = response.get_json()
+            assert body['variant'] == expected(experiment_id, body['user_id'])
+            variants[body['user_id']] = body['variant']
+    assert db_config.writer_stats()['submitted'] == submitted
+    assert fetch('SELECT COUNT(*) FROM ab_assignments') == [(0,)]
+    assert exposure_log.stats()['deduplicated'] == 40
+
+    assert exposure_log.flush() == 20
+    assert dict(fetch('SELECT user_id, variant FROM ab_assignments WHERE experiment_id = ?',
+                      (experiment_id,))) == variants
+    assert client.post('/api/ab/assign/no-such-experiment', json={}).status_code == 404
+    print("✅ Stateless assignment logs each exposure once, after responding")
+
+
+def test_idempotent_flush():
+    """The same user logged by two workers or after a restart keeps one row"""
+    workers = [ExposureLog(mode='stateless'), ExposureLog(mode='stateless')]
+    for worker in workers:
+        worker.add(experiment_id, 'shared-user', 'b', '10.5.0.1')
+        worker.add(experiment_id, 'shared-user', 'b', '10.5.0.1')
+    assert [worker.flush() for worker in workers] == [1, 1]
+    assert fetch('SELECT COUNT(*) FROM ab_assignments WHERE user_id = ?', ('shared-user',)) == [(1,)]
+    assert sum(worker.stats()['failed_rows'] for worker in workers) == 0
+    for worker in workers:
+        worker.close()
+    print("✅ Exposure writes are idempotent")
+
+
+def test_conversion_needs_exposure():
+    """Conversions credit the logged exposure, queued or flushed, and need one"""
+    from app import app
+    client = app.test_client()
+    environ = {'REMOTE_ADDR': '10.6.0.1'}
+    response = client.post('/api/ab/convert', json={'experiment_id': experiment_id}, environ_base=environ)
+    assert response.status_code == 400, response.get_json()
+    assert fetch('SELECT COUNT(*) FROM ab_assignments WHERE ip_address = ?', ('10.6.0.1',)) == [(0,)]
+
+    # Still queued: the pending exposure is credited
+    body = client.post(f'/api/ab/assign/{experiment_id}', json={}, environ_base=environ).get_json()
+    user_id, variant = body['user_id'], body['variant']
+    response = client.post('/api/ab/convert', json={'experiment_id': experiment_id}, environ_base=environ)
+    assert response.status_code == 200 and response.get_json()['variant'] == variant
+    assert fetch('SELECT variant FROM ab_conversions WHERE user_id = ?', (user_id,)) == [(variant,)]
+
+    # Once paused, conversions still credit the flushed exposure
+    assert exposure_log.flush() == 1
+    assert client.put(f'/api/ab/experiments/{experiment_id}/status', json={'status': 'paused'}).status_code == 200
+    response = client.post('/api/ab/convert', json={'experiment_id': experiment_id}, environ_base=environ)
+    assert response.status_code == 200 and response.get_json()['variant'] == variant
+    response = client.post('/api/ab/convert', json={'experiment_id': experiment_id},
+                           environ_base={'REMOTE_ADDR': '10.6.0.2'})
+    assert response.status_code == 400
+    assert client.post('/api/ab/convert', json={'experiment_id': 'no-such-experiment'}).status_code == 400
+    print("✅ Conversions need a logged exposure")
+
+
+def setup_module():
+    global experiment_id
+    db_config.init_database()
+    init_ab_testing_tables()
+    from app import app
+    experiment_id = create_experiment(app.test_client())
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Exposure Log Test ===")
+    setup_module()
+    try:
+        test_assignment_skips_database()
+        test_idempotent_flush()
+        test_conversion_needs_exposure()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
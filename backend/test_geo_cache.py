@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for the geo lookup cache.
+Checks LRU eviction, entry expiry with the shorter negative TTL, prefix
+hits, reloading from the geo_cache table, retrying a failed load and
+pruning expired rows during a flush.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'geo_cache_test.db').lstrip('/')
+
+from database import db_config
+from services.geo_cache import GeoCache
+
+SEOUL = {'country': 'South Korea', 'city': 'Seoul'}
+UNKNOWN = {'country': 'Unknown', 'city': 'Unknown'}
+
+
+def fetch(query, params=()):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query, params).fetchall()]
+
+
+def test_lru_eviction():
+    """The least recently used entry goes first once max_entries is reached"""
+    cache = GeoCache(max_entries=3, prefix_aggregation=False)
+    for ip in ('8.8.8.1', '8.8.8.2', '8.8.8.3'):
+        cache.put(ip, SEOUL)
+    assert cache.get('8.8.8.1') == SEOUL  # now the most recently used
+    cache.put('8.8.8.4', SEOUL)
+    assert cache.get('8.8.8.2') is None
+    assert all(cache.get(ip) == SEOUL for ip in ('8.8.8.1', '8.8.8.3', '8.8.8.4'))
+    assert cache.stats()['evictions'] == 1 and cache.stats()['entries'] == 3
+    print("✅ Least recently used entries are evicted")
+
+
+def test_ttl_and_negative_ttl():
+    """Unknown results expire after negative_ttl, resolved ones after ttl"""
+    cache = GeoCache(ttl=0.6, negative_ttl=0.2, prefix_aggregation=False)
+    cache.put('9.9.9.1', SEOUL)
+    cache.put('9.9.9.2', UNKNOWN)
+    assert cache.get('9.9.9.2') == UNKNOWN and cache.stats()['negative_hits'] == 1
+
+    time.sleep(0.3)
+    assert cache.get('9.9.9.2') is None
+    assert cache.get('9.9.9.1') == SEOUL
+    time.sleep(0.4)
+    assert cache.get('9.9.9.1') is None
+    assert cache.stats()['expirations'] == 2
+    print("✅ Entries expire, negatives sooner")
+
+
+def test_prefix_hits():
+    """Neighbours in the same /24 or /48 share a lookup; negatives stay per IP"""
+    cache = GeoCache()
+    cache.put('1.2.3.4', SEOUL)
+    assert cache.get('1.2.3.99') == SEOUL and cache.get('1.2.4.1') is None
+    cache.put('2001:db8:1::1', SEOUL)
+    assert cache.get('2001:db8:1:ffff::2') == SEOUL
+    cache.put('5.6.7.8', UNKNOWN)
+    assert cache.get('5.6.7.9') is None
+    assert cache.stats()['prefix_hits'] == 2
+    print("✅ Prefix entries serve neighbouring addresses")
+
+
+def test_reload_from_table():
+    """A new cache loads unexpired entries that an earlier one persisted"""
+    first = GeoCache()
+    first.put('4.4.4.4', SEOUL)
+    assert first.flush() == 2  # the IP and its /24
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "INSERT INTO geo_cache (cache_key, country, city, expires_at) VALUES ('3.3.3.3', 'X', 'Y', ?)",
+        (int(time.time()) - 10,)
+    ))
+
+    second = GeoCache()
+    assert second.get('4.4.4.4') == SEOUL and second.get('4.4.4.5') == SEOUL
+    assert second.get('3.3.3.3') is None
+    print("✅ Persisted entries are reloaded")
+
+
+def test_failed_load_is_retried():
+    """A load that fails is tried again instead of leaving the cache empty"""
+    cache = GeoCache(load_retry_interval=0.2)
+    load_rows, calls = cache._load_rows, []
+
+    def failing_load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('no such table: geo_cache')
+        return load_rows()
+
+    cache._load_rows = failing_load
+    assert cache.get('4.4.4.4') is None
+    assert cache.get('4.4.4.4') is None and len(calls) == 1  # waits for the retry interval
+    time.sleep(0.25)
+    assert cache.get('4.4.4.4') == SEOUL and len(calls) == 2
+    print("✅ Failed loads are retried")
+
+
+def test_flush_prunes_expired_rows():
+    """Expired rows are deleted from the table by a flush once per prune_interval"""
+    cache = GeoCache(prune_interval=0.2)
+    cache.put('6.6.6.6', SEOUL)
+    cache.flush()
+    assert fetch("SELECT COUNT(*) FROM geo_cache WHERE cache_key = '3.3.3.3'") == [(1,)]
+
+    time.sleep(0.25)
+    cache.flush()
+    assert fetch("SELECT COUNT(*) FROM geo_cache WHERE cache_key = '3.3.3.3'") == [(0,)]
+    assert fetch("SELECT COUNT(*) FROM geo_cache WHERE cache_key = '6.6.6.6'") == [(1,)]
+    assert cache.stats()['prunes'] == 1
+    print("✅ Flushes prune expired rows")
+
+
+def setup_module():
+    db_config.init_database()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Geo Cache Test ===")
+    setup_module()
+    try:
+        test_lru_eviction()
+        test_ttl_and_negative_ttl()
+        test_prefix_hits()
+        test_reload_from_table()
+        test_failed_load_is_retried()
+        test_flush_prunes_expired_rows()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
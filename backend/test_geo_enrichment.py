@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test script for the background geo enrichment worker.
+Runs a local HTTP stub in place of ip-api.com, so no network access is needed.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from database import DatabaseConfig
+from services.geo_enrichment import PENDING, GeoApiClient, GeoEnrichmentWorker
+
+STUB_LOCATIONS = {
+    '8.8.8.8': {'country': 'United States', 'city': 'Mountain View'},
+    '1.1.1.1': {'country': 'Australia', 'city': 'Sydney'}
+}
+
+
+class StubGeoApiHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the ip-api.com /batch and /json endpoints"""
+    
+    fail_next = 0
+    batch_calls = 0
+    
+    def do_POST(self):
+        StubGeoApiHandler.batch_calls += 1
+        if StubGeoApiHandler.fail_next > 0:
+            StubGeoApiHandler.fail_next -= 1
+            self._reply(429, {'message': 'rate limited'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        ips = json.loads(self.rfile.read(length))
+        self._reply(200, [self._result(ip) for ip in ips])
+    
+    def do_GET(self):
+        self._reply(200, self._result(self.path.rsplit('/', 1)[-1]))
+    
+    def _result(self, ip):
+        if ip in STUB_LOCATIONS:
+            return dict(STUB_LOCATIONS[ip], status='success', query=ip)
+        return {'status': 'fail', 'message': 'reserved range', 'query': ip}
+    
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    """Start the stub API on a free local port and return (server, base_url)"""
+    server = HTTPServer(('127.0.0.1', 0), StubGeoApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def make_database():
+    db_dir = tempfile.mkdtemp()
+    database = DatabaseConfig('sqlite:///' + os.path.join(db_dir, 'geo_test.db').lstrip('/'))
+    database.init_database()
+    return database
+
+
+def insert_pending_visits(database, ips):
+    database.execute_write(lambda cursor: cursor.executemany(
+        'INSERT INTO visitors (ip_address, country, city, page_visited) VALUES (?, ?, ?, ?)',
+        [(ip, PENDING, PENDING, '/') for ip in ips]
+    ))
+
+
+def fetch_locations(database):
+    with database.connection() as conn:
+        rows = conn.execute('SELECT ip_address, country, city FROM visitors ORDER BY id').fetchall()
+    return [tuple(row) for row in rows]
+
+
+def test_backfills_pending_visits():
+    """Pending rows are resolved in one batch request and backfilled"""
+    server, base_url = start_stub_server()
+    database = make_database()
+    try:
+        StubGeoApiHandler.batch_calls = 0
+        insert_pending_visits(database, ['8.8.8.8', '1.1.1.1', '8.8.8.8', '10.0.0.1', '192.0.2.1'])
+        
+        worker = GeoEnrichmentWorker(GeoApiClient(base_url), database=database)
+        updated = worker.run_once()
+        
+        assert updated == 5, f'expected 5 updated rows, got {updated}'
+        assert StubGeoApiHandler.batch_calls == 1, 'private IPs should not reach the API'
+        assert fetch_locations(database) == [
+            ('8.8.8.8', 'United States', 'Mountain View'),
+            ('1.1.1.1', 'Australia', 'Sydney'),
+            ('8.8.8.8', 'United States', 'Mountain View'),
+            ('10.0.0.1', 'Unknown', 'Unknown'),
+            ('192.0.2.1', 'Unknown', 'Unknown')
+        ]
+        print("✅ Pending visits backfilled from the stub API")
+    finally:
+        server.shutdown()
+        database.shutdown()
+
+
+def test_retries_after_api_failure():
+    """A failed batch is retried after backoff and eventually succeeds"""
+    server, base_url = start_stub_server()
+    database = make_database()
+    try:
+        StubGeoApiHandler.fail_next = 1
+        insert_pending_visits(database, ['1.1.1.1'])
+        
+        worker = GeoEnrichmentWorker(GeoApiClient(base_url), database=database, retry_backoff=0)
+        assert worker.run_once() == 0, 'first pass should fail against the rate-limited stub'
+        assert fetch_locations(database) == [('1.1.1.1', PENDING, PENDING)]
+        assert worker.stats()['retrying_ips'] == 1
+        
+        assert worker.run_once() == 1, 'second pass should resolve the IP'
+        assert fetch_locations(database) == [('1.1.1.1', 'Australia', 'Sydney')]
+        print("✅ Failed lookups are retried")
+    finally:
+        server.shutdown()
+        database.shutdown()
+
+
+def test_backed_off_ips_do_not_fill_the_batch():
+    """IPs waiting out a backoff are paged past, so later pending IPs still resolve"""
+    server, base_url = start_stub_server()
+    database = make_database()
+    try:
+        insert_pending_visits(database, ['10.0.0.1', '10.0.0.2', '8.8.8.8'])
+        worker = GeoEnrichmentWorker(GeoApiClient(base_url), database=database, batch_size=2)
+        with worker._lock:
+            for ip in ('10.0.0.1', '10.0.0.2'):
+                worker._attempts[ip] = (1, float('inf'))
+
+        assert worker.run_once() == 1
+        assert fetch_locations(database) == [
+            ('10.0.0.1', PENDING, PENDING), ('10.0.0.2', PENDING, PENDING),
+            ('8.8.8.8', 'United States', 'Mountain View')
+        ]
+        print("✅ Backed-off IPs do not starve newer ones")
+    finally:
+        server.shutdown()
+        database.shutdown()
+
+
+def test_gives_up_after_max_attempts():
+    """IPs that keep failing are marked Unknown instead of staying pending"""
+    server, base_url = start_stub_server()
+    database = make_database()
+    try:
+        StubGeoApiHandler.fail_next = 2
+        insert_pending_visits(database, ['8.8.8.8'])
+        
+        worker = GeoEnrichmentWorker(GeoApiClient(base_url), database=database,
+                                     max_attempts=2, retry_backoff=0)
+        worker.run_once()
+        worker.run_once()
+        
+        assert fetch_locations(database) == [('8.8.8.8', 'Unknown', 'Unknown')]
+        assert worker.stats()['given_up'] == 1
+        print("✅ Persistently failing IPs are given up on")
+    finally:
+        StubGeoApiHandler.fail_next = 0
+        server.shutdown()
+        database.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Geo Enrichment Test ===")
+    try:
+        test_backfills_pending_visits()
+        test_retries_after_api_failure()
+        test_backed_off_ips_do_not_fill_the_batch()
+        test_gives_up_after_max_attempts()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    print("✅ All tests passed!")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline GeoIP database.
+Builds small range tables and checks IPv4, IPv6 and IPv4-mapped IPv6
+lookups, range boundaries, a database with no ranges, and rejection of
+overlapping ranges and corrupt files.
+"""
+
+import os
+import sys
+import tempfile
+
+from services.geoip import GeoIPDatabase, GeoIPFormatError, build_database
+
+RANGES = [
+    ('1.0.0.0', '1.0.0.255', 'Australia', 'Sydney'),
+    ('8.8.4.0', '8.8.8.255', 'United States', 'Mountain View'),
+    ('211.234.0.0', '211.234.255.255', 'South Korea', 'Seoul'),
+    ('255.255.255.0', '255.255.255.255', 'Nowhere', ''),
+    ('2001:db8::', '2001:db8:0:ffff:ffff:ffff:ffff:ffff', 'Germany', 'Berlin'),
+    ('2400:cb00::', '2400:cbff:ffff:ffff:ffff:ffff:ffff:ffff', 'South Korea', 'Seoul'),
+]
+
+TMP_DIR = tempfile.mkdtemp()
+
+
+def build(name, ranges):
+    path = os.path.join(TMP_DIR, name)
+    build_database(ranges, path)
+    return path
+
+
+def test_ipv4_lookups():
+    """Addresses resolve inside ranges, including both ends, and miss outside"""
+    db = GeoIPDatabase(build('v4.bin', RANGES))
+    assert db.lookup('8.8.8.8') == {'country': 'United States', 'city': 'Mountain View'}
+    assert db.lookup('8.8.4.0')['city'] == 'Mountain View'
+    assert db.lookup('8.8.8.255')['city'] == 'Mountain View'
+    assert db.lookup('211.234.10.1') == {'country': 'South Korea', 'city': 'Seoul'}
+    assert db.lookup('255.255.255.255') == {'country': 'Nowhere', 'city': 'Unknown'}
+    for ip in ('0.255.255.255', '1.0.1.0', '8.8.3.255', '8.8.9.0', '10.0.0.1'):
+        assert db.lookup(ip) is None, ip
+    assert db.lookup('not an ip') is None and db.lookup('') is None
+    assert db.stats()['ipv4_ranges'] == 4 and db.stats()['locations'] == 5
+    db.close()
+    print("✅ IPv4 addresses resolve within their ranges")
+
+
+def test_ipv6_lookups():
+    """IPv6 ranges are searched on 16-byte keys; IPv4-mapped addresses use the IPv4 table"""
+    db = GeoIPDatabase(build('v6.bin', RANGES))
+    assert db.lookup('2001:db8::1') == {'country': 'Germany', 'city': 'Berlin'}
+    assert db.lookup('2001:db8:0:ffff:ffff:ffff:ffff:ffff')['city'] == 'Berlin'
+    assert db.lookup('2001:db8:1::') is None
+    assert db.lookup('2400:cb00:1234::5') == {'country': 'South Korea', 'city': 'Seoul'}
+    assert db.lookup('::1') is None and db.lookup('ffff::1') is None
+
+    assert db.lookup('::ffff:8.8.8.8') == {'country': 'United States', 'city': 'Mountain View'}
+    assert db.lookup('::ffff:211.234.0.1')['city'] == 'Seoul'
+    assert db.lookup('::ffff:10.0.0.1') is None
+    assert db.stats()['ipv6_ranges'] == 2
+    db.close()
+    print("✅ IPv6 and IPv4-mapped addresses resolve")
+
+
+def test_empty_database():
+    """A database without ranges loads and misses every lookup"""
+    db = GeoIPDatabase(build('empty.bin', []))
+    assert db.lookup('8.8.8.8') is None and db.lookup('2001:db8::1') is None
+    assert db.lookup('::ffff:8.8.8.8') is None
+    assert db.stats()['ipv4_ranges'] == 0 and db.stats()['ipv6_ranges'] == 0
+    db.close()
+
+    # Only IPv6 ranges: IPv4 lookups still miss cleanly
+    db = GeoIPDatabase(build('v6only.bin', RANGES[4:]))
+    assert db.lookup('8.8.8.8') is None and db.lookup('2001:db8::1')['city'] == 'Berlin'
+    db.close()
+    print("✅ Empty tables miss every lookup")
+
+
+def test_invalid_input():
+    """Overlapping ranges are rejected at build time; bad files fail to open"""
+    try:
+        build('overlap.bin', [('1.0.0.0', '1.0.0.255', 'A', 'a'), ('1.0.0.128', '1.0.1.0', 'B', 'b')])
+        raise AssertionError('overlapping ranges were accepted')
+    except ValueError:
+        pass
+
+    corrupt = os.path.join(TMP_DIR, 'corrupt.bin')
+    with open(build('truncated.bin', RANGES), 'rb') as f:
+        data = f.read()
+    with open(corrupt, 'wb') as f:
+        f.write(data[:-3])
+    try:
+        GeoIPDatabase(corrupt)
+        raise AssertionError('truncated file was accepted')
+    except GeoIPFormatError:
+        pass
+
+    empty_file = os.path.join(TMP_DIR, 'zero.bin')
+    open(empty_file, 'wb').close()
+    assert GeoIPDatabase.open_optional(empty_file) is None
+    assert GeoIPDatabase.open_optional(os.path.join(TMP_DIR, 'missing.bin')) is None
+    assert GeoIPDatabase.open_optional(None) is None
+    print("✅ Invalid ranges and files are rejected")
+
+
+if __name__ == '__main__':
+    print("=== GeoIP Database Test ===")
+    try:
+        test_ipv4_lookups()
+        test_ipv6_lookups()
+        test_empty_database()
+        test_invalid_input()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    print("✅ All tests passed!")
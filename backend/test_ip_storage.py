@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Test script for packed IP address storage.
+Covers the packing helpers, every insert site, CIDR lookups on the prefix
+and packed indexes, geo enrichment of rows without address text and the
+migration of rows stored as plain text.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'ip_test.db').lstrip('/')
+
+from database import db_config
+from ab_testing_schema import init_ab_testing_tables
+from migrate_ip_storage import address_bytes, migrate
+from services import visit_buffer as visit_buffer_module
+from services.data_export import TableExport
+from services.geo_enrichment import PENDING, GeoEnrichmentWorker
+from services.ip_storage import IPStorage, anonymize, inet6_aton, inet6_ntoa, network_filter
+from services.visit_buffer import VisitBuffer
+
+EXPERIMENT_ID = 'ip-test'
+
+
+class StaticGeoClient:
+    """Geo client stand-in that resolves every address to one country"""
+
+    def lookup_batch(self, ip_addresses):
+        return {ip: {'country': 'Iceland', 'city': 'Reykjavik'} for ip in ip_addresses}
+
+
+def fetch(query, params=()):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query, params).fetchall()]
+
+
+def exported(table):
+    return [json.loads(line) for line in b''.join(TableExport(table).chunks()).decode().splitlines()]
+
+
+def add_visits(ips, mode):
+    """Flush visits through the buffer with the given IP_STORAGE mode"""
+    original = visit_buffer_module.ip_storage
+    visit_buffer_module.ip_storage = IPStorage(mode)
+    try:
+        buffer = VisitBuffer()
+        for ip in ips:
+            buffer.add(VisitBuffer.make_row(ip, 'agent', PENDING, PENDING, None, f'/{mode}', ''))
+        buffer.flush()
+    finally:
+        visit_buffer_module.ip_storage = original
+
+
+def test_packing_helpers():
+    """Addresses pack to 4 or 16 bytes and anonymize to their /24 or /48"""
+    assert inet6_aton('192.0.2.33') == bytes([192, 0, 2, 33])
+    assert inet6_aton('::ffff:192.0.2.33') == bytes([192, 0, 2, 33])
+    assert len(inet6_aton('2001:db8::1')) == 16
+    assert inet6_aton('not an ip') is None and inet6_aton(None) is None
+    assert inet6_ntoa(inet6_aton('2001:db8::1')) == '2001:db8::1'
+    assert inet6_ntoa(anonymize('192.0.2.33')) == '192.0.2.0'
+    assert inet6_ntoa(anonymize('2001:db8:aa:bb::1')) == '2001:db8:aa::'
+
+    assert IPStorage('inline').values('192.0.2.33') == ('192.0.2.33', bytes([192, 0, 2, 33]), bytes([192, 0, 2, 0]))
+    assert IPStorage('packed').values('192.0.2.33') == (None, bytes([192, 0, 2, 33]), bytes([192, 0, 2, 0]))
+    assert IPStorage('anonymized').values('192.0.2.33') == (None, None, bytes([192, 0, 2, 0]))
+    assert IPStorage('packed').values('unknown') == ('unknown', None, None)
+    print("✅ Packing helpers")
+
+
+def test_ingest_modes_read_back():
+    """Every storage mode decodes on read; anonymized rows read as their network"""
+    add_visits(['198.51.100.7', '2001:db8:1:2::9'], 'inline')
+    add_visits(['198.51.100.8', '2001:db8:1:3::9'], 'packed')
+    add_visits(['198.51.100.9'], 'anonymized')
+
+    assert fetch("SELECT COUNT(*) FROM visitors WHERE page_visited = '/packed' AND ip_address IS NULL") == [(2,)]
+    assert fetch("SELECT COUNT(*) FROM visitors WHERE page_visited = '/anonymized' AND ip_packed IS NULL") == [(1,)]
+    assert [row['ip_address'] for row in exported('visitors')] == [
+        '198.51.100.7', '2001:db8:1:2::9', '198.51.100.8', '2001:db8:1:3::9', '198.51.100.0'
+    ]
+    print("✅ Ingest modes read back through the decoder")
+
+
+def test_network_lookups():
+    """CIDR filters use the prefix index at /24 and wider, ip_packed when narrower"""
+    def matching(cidr):
+        condition, params = network_filter(cidr)
+        return fetch(f'SELECT COUNT(*) FROM visitors WHERE {condition}', params)[0][0]
+
+    assert matching('198.51.100.0/24') == 3
+    assert matching('198.51.0.0/16') == 3
+    assert matching('198.51.100.0/29') == 1  # the anonymized row only knows its /24
+    assert matching('198.51.100.8/32') == 1
+    assert matching('2001:db8:1::/48') == 2
+    assert matching('2001:db8::/32') == 2
+    assert matching('0.0.0.0/0') == 3  # IPv4 bounds never match IPv6 values
+
+    condition, params = network_filter('198.51.100.0/24')
+    with db_config.connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN SELECT id FROM visitors WHERE {condition}', params))
+    assert 'idx_visitors_ip_prefix' in plan, plan
+
+    from app import app
+    client = app.test_client()
+    response = client.get('/api/analytics/recent-visitors?network=198.51.100.0/24&fields=ip_address')
+    assert [row['ip_address'] for row in json.loads(response.get_data())['data']] == [
+        '198.51.100.0', '198.51.100.8', '198.51.100.7'
+    ]
+    assert client.get('/api/analytics/recent-visitors?network=nope').status_code == 400
+    print("✅ Network lookups use the address indexes")
+
+
+def test_endpoint_inserts():
+    """Contact messages and A/B assignments and conversions store packed addresses"""
+    db_config.execute_write(lambda cursor: cursor.execute('''
+        INSERT INTO ab_experiments (id, name, variants, traffic_split, status)
+        VALUES (?, 'IP test', '["control"]', '{"control": 100}', 'active')
+    ''', (EXPERIMENT_ID,)))
+
+    from app import app
+    client = app.test_client()
+    assert client.post(f'/api/ab/assign/{EXPERIMENT_ID}', json={}).status_code == 200
+    assert client.post('/api/ab/convert', json={'experiment_id': EXPERIMENT_ID}).status_code == 200
+    client.post('/api/contact', json={'name': 'Ada', 'email': 'ada@example.com',
+                                      'subject': 'Hello there', 'message': 'A message long enough to pass.'})
+
+    loopback = (inet6_aton('127.0.0.1'), anonymize('127.0.0.1'))
+    for table in ('ab_assignments', 'ab_conversions', 'contact_messages'):
+        assert fetch(f'SELECT ip_packed, ip_prefix FROM {table}') == [loopback], table
+    print("✅ Endpoint inserts store packed addresses")
+
+
+def test_enrichment_without_text():
+    """Pending visits stored without address text still get resolved"""
+    worker = GeoEnrichmentWorker(StaticGeoClient())
+    add_visits(['8.8.4.4', '8.8.4.4'], 'packed')
+    add_visits(['1.1.1.1'], 'anonymized')
+    assert worker.run_once() == 8  # the earlier documentation-range rows resolve to Unknown
+    assert fetch('SELECT COUNT(*) FROM visitors WHERE country = ?', (PENDING,)) == [(0,)]
+    assert fetch("SELECT COUNT(*) FROM visitors WHERE country = 'Iceland'") == [(3,)]
+    print("✅ Geo enrichment resolves packed and anonymized rows")
+
+
+def test_migration():
+    """Plain-text rows pack, clear and read back unchanged"""
+    def seed(cursor):
+        cursor.executemany('INSERT INTO visitors (ip_address, page_visited) VALUES (?, ?)',
+                           [(f'192.0.2.{i}', '/legacy') for i in range(20)] + [('2001:db8::5', '/legacy')])
+        cursor.execute("INSERT INTO contact_messages (name, email, subject, message, ip_address) "
+                       "VALUES ('a', 'a@example.com', 's', 'm', '192.0.2.1')")
+        cursor.execute("INSERT INTO ab_assignments (experiment_id, user_id, variant, ip_address) "
+                       "VALUES (?, 'legacy', 'control', '192.0.2.2')", (EXPERIMENT_ID,))
+    db_config.execute_write(seed)
+    before = {table: exported(table) for table in ('visitors', 'contact_messages', 'ab_assignments')}
+
+    assert migrate(log=lambda message: None) == 23
+    assert migrate(log=lambda message: None) == 0
+    condition, params = network_filter('192.0.2.0/24')
+    assert fetch(f'SELECT COUNT(*) FROM visitors WHERE {condition}', params) == [(20,)]
+
+    text_bytes = address_bytes()['visitors'][0]
+    assert migrate(mode='packed', log=lambda message: None) == 28
+    assert fetch('SELECT COUNT(*) FROM visitors WHERE ip_address IS NOT NULL') == [(0,)]
+    assert address_bytes()['visitors'][0] == 0 and text_bytes > 0
+    assert {table: exported(table) for table in before} == before
+
+    assert migrate(mode='anonymized', log=lambda message: None) == 32
+    assert fetch('SELECT COUNT(*) FROM visitors WHERE ip_packed IS NOT NULL') == [(0,)]
+    assert exported('contact_messages')[-1]['ip_address'] == '192.0.2.0'
+    print("✅ Migration packs and anonymizes stored addresses")
+
+
+def setup_module():
+    db_config.init_database()
+    init_ab_testing_tables()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== IP Storage Test ===")
+    setup_module()
+    try:
+        test_packing_helpers()
+        test_ingest_modes_read_back()
+        test_network_lookups()
+        test_endpoint_inserts()
+        test_enrichment_without_text()
+        test_migration()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared sliding-window rate limiter.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from flask import Flask
+
+# The app-level test below needs a scratch database and one trusted proxy
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'rate_limit_test.db').lstrip('/')
+os.environ['TRUSTED_PROXY_COUNT'] = '1'
+
+import rate_limiter
+from rate_limiter import SharedMemoryLimiter, SlidingWindowLimiter, create_limiter, limiter, rate_limit
+
+
+def test_limits_within_window():
+    """Requests over the limit are rejected with a positive retry-after"""
+    limiter = SlidingWindowLimiter()
+    results = [limiter.hit('client', 5, 60) for _ in range(6)]
+
+    assert all(allowed for allowed, _ in results[:5])
+    allowed, retry_after = results[5]
+    assert not allowed
+    assert 1 <= retry_after <= 120
+    print("✅ Requests over the limit are rejected")
+
+
+def test_window_slides():
+    """The previous window's count decays as the window slides"""
+    limiter = SlidingWindowLimiter()
+    for _ in range(4):
+        assert limiter.hit('client', 4, 0.2)[0]
+    assert not limiter.hit('client', 4, 0.2)[0]
+
+    time.sleep(0.5)
+    assert limiter.hit('client', 4, 0.2)[0]
+    print("✅ Limits reset once the window has passed")
+
+
+def test_memory_is_bounded():
+    """A scan from many IPs never grows past max_keys, and idle keys are swept"""
+    limiter = SlidingWindowLimiter(stripes=4, max_keys=100, sweep_interval=0.05)
+    for i in range(1000):
+        limiter.hit(f'10.0.{i // 256}.{i % 256}', 10, 0.01)
+
+    stats = limiter.stats()
+    assert stats['keys'] <= 100, stats
+    assert stats['evictions'] + stats['expired'] >= 900, stats
+
+    time.sleep(0.1)
+    for i in range(4):
+        limiter.hit(f'fresh-{i}', 10, 60)
+    assert limiter.stats()['expired'] > 0
+    print("✅ Key count is capped and idle keys are swept")
+
+
+def test_thread_safety():
+    """Concurrent hits on one key never admit more than the limit"""
+    limiter = SlidingWindowLimiter()
+    admitted = []
+
+    def worker():
+        for _ in range(100):
+            if limiter.hit('shared', 250, 60)[0]:
+                admitted.append(1)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(admitted) == 250, len(admitted)
+    print("✅ Concurrent requests respect the limit")
+
+
+def test_decorator_sets_retry_after():
+    """The decorator returns 429 with a Retry-After header"""
+    app = Flask(__name__)
+
+    @app.route('/limited')
+    @rate_limit(max_requests=2, window=60)
+    def limited():
+        return 'ok'
+
+    limiter.reset()
+    client = app.test_client()
+    assert client.get('/limited').status_code == 200
+    assert client.get('/limited').status_code == 200
+    response = client.get('/limited')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    print("✅ Rate-limited responses carry Retry-After")
+
+
+def test_budgets_per_endpoint_unless_scoped():
+    """Endpoints have separate budgets; a shared scope makes them draw from one"""
+    app = Flask(__name__)
+
+    @app.route('/first')
+    @rate_limit(max_requests=1, window=60)
+    def first():
+        return 'ok'
+
+    @app.route('/second')
+    @rate_limit(max_requests=1, window=60)
+    def second():
+        return 'ok'
+
+    @app.route('/scoped-a')
+    @rate_limit(max_requests=2, window=60, scope='forms')
+    def scoped_a():
+        return 'ok'
+
+    @app.route('/scoped-b')
+    @rate_limit(max_requests=2, window=60, scope='forms')
+    def scoped_b():
+        return 'ok'
+
+    limiter.reset()
+    client = app.test_client()
+    assert [client.get(path).status_code for path in ('/first', '/second', '/first')] == [200, 200, 429]
+    assert [client.get(path).status_code for path in ('/scoped-a', '/scoped-b', '/scoped-a')] == [200, 200, 429]
+    print("✅ Budgets are per endpoint unless a scope is shared")
+
+
+def test_app_keys_on_forwarded_client():
+    """Behind the proxy, clients are told apart by X-Forwarded-For, as track_visit stores them"""
+    from app import app
+    from database import db_config
+    from services.visit_buffer import visit_buffer
+    db_config.init_database()
+    try:
+        limiter.reset()
+        client = app.test_client()
+        proxy = {'REMOTE_ADDR': '10.0.0.1'}
+        statuses = [client.post('/api/track-visit', json={'page': '/'}, environ_base=proxy,
+                                headers={'X-Forwarded-For': '203.0.113.7'}).status_code for _ in range(21)]
+        assert statuses == [200] * 20 + [429], statuses
+        response = client.post('/api/track-visit', json={'page': '/'}, environ_base=proxy,
+                               headers={'X-Forwarded-For': '198.51.100.9, 203.0.113.8'})
+        assert response.status_code == 200
+
+        visit_buffer.flush()
+        with db_config.connection() as conn:
+            rows = conn.execute('SELECT ip_address, COUNT(*) FROM visitors GROUP BY 1 ORDER BY 1').fetchall()
+        assert [tuple(row) for row in rows] == [('203.0.113.7', 20), ('203.0.113.8', 1)], rows
+    finally:
+        db_config.shutdown()
+    print("✅ The app keys limits and visits on the forwarded client address")
+
+
+def _shared_worker(path, queue):
+    limiter = SharedMemoryLimiter(path, slots=1024, stripes=8)
+    admitted = sum(1 for _ in range(200) if limiter.hit('shared', 300, 60)[0])
+    limiter.close()
+    queue.put(admitted)
+
+
+def test_shared_limit_across_processes():
+    """Worker processes share one budget through the mmap'd file"""
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.bin')
+    SharedMemoryLimiter(path, slots=1024, stripes=8).close()
+
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_shared_worker, args=(path, queue)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    admitted = sum(queue.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+
+    assert admitted == 300, admitted
+    print("✅ Shared backend enforces one limit across processes")
+
+
+def test_shared_memory_is_bounded():
+    """The shared table reuses slots instead of growing"""
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.bin')
+    limiter = SharedMemoryLimiter(path, slots=256, stripes=4)
+    size = os.path.getsize(path)
+    for i in range(2000):
+        assert limiter.hit(f'10.1.{i // 256}.{i % 256}', 5, 60)[0]
+
+    stats = limiter.stats()
+    assert os.path.getsize(path) == size
+    assert stats['keys'] <= 256 and stats['evictions'] > 0, stats
+    limiter.close()
+    print("✅ Shared backend stays within its fixed size")
+
+
+def test_shared_falls_back_without_fcntl():
+    """Without fcntl (Windows) the shared backend falls back to memory"""
+    fcntl, rate_limiter.fcntl = rate_limiter.fcntl, None
+    try:
+        assert isinstance(create_limiter('shared'), SlidingWindowLimiter)
+    finally:
+        rate_limiter.fcntl = fcntl
+    print("✅ Shared backend falls back to memory without fcntl")
+
+
+def benchmark_hit(iterations=200000):
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.bin')
+    for limiter in (SlidingWindowLimiter(), SharedMemoryLimiter(path)):
+        started = time.perf_counter()
+        for i in range(iterations):
+            limiter.hit(f'10.0.0.{i % 200}', 1000000, 60)
+        elapsed = time.perf_counter() - started
+        print(f"ℹ️  {limiter.name}: {elapsed / iterations * 1e6:.2f} µs per check over {iterations} checks")
+
+
+if __name__ == '__main__':
+    print("=== Rate Limiter Test ===")
+    try:
+        test_limits_within_window()
+        test_window_slides()
+        test_memory_is_bounded()
+        test_thread_safety()
+        test_decorator_sets_retry_after()
+        test_budgets_per_endpoint_unless_scoped()
+        test_app_keys_on_forwarded_client()
+        test_shared_limit_across_processes()
+        test_shared_memory_is_bounded()
+        test_shared_falls_back_without_fcntl()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    benchmark_hit()
+    print("✅ All tests passed!")
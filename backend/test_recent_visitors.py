@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the keyset-paginated recent visitors endpoint.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'recent_test.db').lstrip('/')
+
+from database import db_config
+from app import app
+
+
+def insert_visits(count):
+    db_config.execute_write(lambda cursor: cursor.executemany(
+        'INSERT INTO visitors (ip_address, user_agent, country, page_visited) VALUES (?, ?, ?, ?)',
+        [(f'10.0.{i // 256}.{i % 256}', 'agent ' * 50, 'Korea', f'/p{i}') for i in range(count)]
+    ))
+
+
+def test_pages_with_before_id():
+    """Pages walk the table newest first without gaps or repeats"""
+    client = app.test_client()
+    seen = []
+    before_id = None
+    while True:
+        url = '/api/analytics/recent-visitors?limit=7' + (f'&before_id={before_id}' if before_id else '')
+        body = client.get(url).get_json()
+        seen.extend(row['id'] for row in body['data'])
+        before_id = body['next_before_id']
+        if before_id is None:
+            break
+
+    assert seen == list(range(50, 0, -1)), seen
+    print("✅ Keyset pages cover every row once, newest first")
+
+
+def test_field_selection():
+    """Only requested columns are returned, and id is always included"""
+    client = app.test_client()
+    body = client.get('/api/analytics/recent-visitors?limit=1&fields=country,page_visited').get_json()
+    assert set(body['data'][0]) == {'id', 'country', 'page_visited'}
+    assert client.get('/api/analytics/recent-visitors?fields=password').status_code == 400
+    print("✅ Field selection limits the columns")
+
+
+def test_ndjson():
+    """NDJSON output has one visitor per line"""
+    client = app.test_client()
+    response = client.get('/api/analytics/recent-visitors?limit=5&format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [50, 49, 48, 47, 46]
+    print("✅ NDJSON streamed line by line")
+
+
+def test_summary_has_no_rows():
+    """The analytics summary no longer ships raw visitor rows"""
+    body = app.test_client().get('/api/analytics').get_json()
+    assert 'recent_visitors' not in body['data']
+    print("✅ Summary omits raw visitor rows")
+
+
+def benchmark_deep_page():
+    """Deep pages cost the same as the first page"""
+    insert_visits(200000)
+    client = app.test_client()
+    for label, url in (('first page', '/api/analytics/recent-visitors?limit=20'),
+                       ('deep page', '/api/analytics/recent-visitors?limit=20&before_id=100')):
+        started = time.perf_counter()
+        for i in range(50):
+            client.get(url, environ_base={'REMOTE_ADDR': f'127.0.0.{i}'}).get_data()
+        print(f"ℹ️  {label}: {(time.perf_counter() - started) / 50 * 1000:.2f} ms")
+
+
+def setup_module():
+    db_config.init_database()
+    insert_visits(50)
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Recent Visitors Test ===")
+    setup_module()
+    try:
+        test_pages_with_before_id()
+        test_field_selection()
+        test_ndjson()
+        test_summary_has_no_rows()
+        benchmark_deep_page()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite production profile.
+Checks WAL mode, that read-only pool connections see committed rows but
+reject writes, and that the read-only URI works for database paths with
+characters that are special in URIs.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+# A scratch directory whose name needs escaping in a file: URI
+DB_DIR = os.path.join(tempfile.mkdtemp(), 'odd ?name #with %41 chars')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'profile_test.db').lstrip('/')
+os.environ['SQLITE_PROFILE'] = 'production'
+
+from database import db_config
+
+
+def write_visit(page):
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "INSERT INTO visitors (ip_address, user_agent, page_visited) VALUES ('10.0.0.1', 'agent', ?)", (page,)
+    ))
+
+
+def test_wal_profile():
+    with db_config.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    print("✅ Write connections run in WAL mode")
+
+
+def test_readonly_sees_writes_at_odd_path():
+    """The read-only URI opens the configured file, not a truncated path"""
+    write_visit('/profile')
+    with db_config.connection(readonly=True) as conn:
+        rows = conn.execute("SELECT COUNT(*) FROM visitors WHERE page_visited = '/profile'").fetchone()
+        assert rows[0] == 1
+        assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+    assert os.listdir(DB_DIR) and all(name.startswith('profile_test.db') for name in os.listdir(DB_DIR))
+    assert db_config.pool_stats(readonly=True)['checkouts'] >= 1
+    print("✅ Read-only connections open paths containing '?', '#' and '%'")
+
+
+def test_readonly_rejects_writes():
+    """Inserts, updates and schema changes fail on read-only connections"""
+    statements = (
+        "INSERT INTO visitors (ip_address, user_agent, page_visited) VALUES ('10.0.0.2', 'agent', '/x')",
+        "UPDATE visitors SET page_visited = '/changed'",
+        'CREATE TABLE scratch (id INTEGER)',
+    )
+    for statement in statements:
+        with db_config.connection(readonly=True) as conn:
+            try:
+                conn.execute(statement)
+                raise AssertionError(f'read-only connection accepted: {statement}')
+            except sqlite3.OperationalError as e:
+                assert 'readonly' in str(e) or 'read-only' in str(e) or 'query_only' in str(e), e
+    with db_config.connection(readonly=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM visitors WHERE page_visited != '/profile'").fetchone()[0] == 0
+    print("✅ Read-only connections reject writes")
+
+
+def setup_module():
+    db_config.init_database()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== SQLite Profile Test ===")
+    setup_module()
+    try:
+        test_wal_profile()
+        test_readonly_sees_writes_at_odd_path()
+        test_readonly_rejects_writes()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the single SQLite writer thread.
+Checks that queued writes share one transaction, that an operation that
+fails only rolls back its own savepoint, that a full queue raises
+WriteQueueFullError and that close() commits what is still queued.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'writer_test.db')
+
+# Keep the global database away from the real file; the writer under test
+# gets its own connections to DB_PATH
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'unused.db').lstrip('/')
+
+from database import SQLiteWriter, WriteQueueFullError
+
+
+def connect():
+    return sqlite3.connect(DB_PATH, check_same_thread=False)
+
+
+def fetch(query):
+    conn = connect()
+    try:
+        return conn.execute(query).fetchall()
+    finally:
+        conn.close()
+
+
+def insert(value):
+    def operation(cursor):
+        cursor.execute('INSERT INTO items (value) VALUES (?)', (value,))
+        return cursor.lastrowid
+    return operation
+
+
+def failing(cursor):
+    # Writes a row, then fails: the row must not survive
+    cursor.execute("INSERT INTO items (value) VALUES ('from-failed-op')")
+    cursor.execute('INSERT INTO no_such_table VALUES (1)')
+
+
+def test_savepoint_isolation():
+    """One failing operation in a batch rolls back only its own writes"""
+    writer = SQLiteWriter(connect)
+    # Queued before the thread starts, so all four are drained into one batch
+    futures = [writer.submit(insert('a')), writer.submit(failing),
+               writer.submit(insert('b')), writer.submit(insert('c'))]
+    writer.start()
+
+    assert futures[0].result(5) == 1
+    try:
+        futures[1].result(5)
+        raise AssertionError('failing operation did not raise')
+    except sqlite3.OperationalError as e:
+        assert 'no_such_table' in str(e), e
+    assert [future.result(5) for future in futures[2:]] == [2, 3]
+    assert fetch('SELECT value FROM items ORDER BY id') == [('a',), ('b',), ('c',)]
+
+    stats = writer.stats()
+    assert stats['batches'] == 1 and stats['committed'] == 3 and stats['failed'] == 1
+    writer.close()
+    print("✅ A failed operation rolls back only its own savepoint")
+
+
+def test_queue_full_and_close():
+    """Submitters get WriteQueueFullError when the queue is full; close() drains it"""
+    writer = SQLiteWriter(connect, max_queue=2)
+    futures = [writer.submit(insert('d')), writer.submit(insert('e'))]
+    try:
+        writer.submit(insert('f'), timeout=0.1)
+        raise AssertionError('submit to a full queue did not raise')
+    except WriteQueueFullError:
+        pass
+
+    writer.start()
+    writer.close()
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert fetch("SELECT value FROM items WHERE value IN ('d', 'e', 'f') ORDER BY id") == [('d',), ('e',)]
+    print("✅ Full queues are rejected and close() commits queued writes")
+
+
+def setup_module():
+    setup = connect()
+    setup.execute('CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT NOT NULL)')
+    setup.commit()
+    setup.close()
+
+
+if __name__ == '__main__':
+    print("=== SQLite Writer Test ===")
+    setup_module()
+    try:
+        test_savepoint_isolation()
+        test_queue_full_and_close()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    print("✅ All tests passed!")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test script for the write-behind visit buffer.
+Checks that rows are flushed once flush_size are pending or the oldest is
+flush_interval old, that a full buffer applies backpressure, that close()
+writes what is pending, that a failed flush keeps its rows and retries them with backoff,
+ahead of rows added since, and that rows are dropped only after the
+shutdown retries are used up.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'buffer_test.db').lstrip('/')
+
+from database import db_config
+from services.visit_buffer import VisitBuffer, VisitBufferFullError
+
+
+def fetch(query, params=()):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query, params).fetchall()]
+
+
+def visit(page):
+    return VisitBuffer.make_row('10.0.0.1', 'agent', 'Korea', 'Seoul', None, page, '')
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FailingWrites:
+    """Make db_config.execute_write fail the next `failures` times"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.failed = 0
+
+    def __enter__(self):
+        self.original = db_config.execute_write
+
+        def execute_write(operation, timeout=30):
+            if self.failures > 0:
+                self.failures -= 1
+                self.failed += 1
+                raise RuntimeError('database is locked')
+            return self.original(operation, timeout)
+
+        db_config.execute_write = execute_write
+        return self
+
+    def __exit__(self, *exc):
+        db_config.execute_write = self.original
+
+
+def count(prefix):
+    return fetch('SELECT COUNT(*) FROM visitors WHERE page_visited LIKE ?', (prefix + '%',))[0][0]
+
+
+def test_flush_on_size():
+    """flush_size pending rows are written without waiting for the interval"""
+    buffer = VisitBuffer(flush_size=5, flush_interval=60)
+    for i in range(4):
+        buffer.add(visit(f'/size/{i}'))
+    time.sleep(0.1)
+    assert count('/size/') == 0 and buffer.stats()['pending'] == 4
+
+    buffer.add(visit('/size/4'))
+    assert wait_for(lambda: count('/size/') == 5)
+    assert buffer.stats()['flushes'] == 1 and buffer.stats()['last_flush_size'] == 5
+    buffer.close()
+    print("✅ Buffer flushes when flush_size rows are pending")
+
+
+def test_flush_on_age():
+    """A lone row is written once it is flush_interval old"""
+    buffer = VisitBuffer(flush_size=1000, flush_interval=0.2)
+    started = time.monotonic()
+    buffer.add(visit('/age'))
+    assert count('/age') == 0
+    assert wait_for(lambda: count('/age') == 1)
+    assert time.monotonic() - started >= 0.2
+
+    # The idle flush thread is woken by the next row, not only by flush_size
+    buffer.add(visit('/age'))
+    assert wait_for(lambda: count('/age') == 2, timeout=2)
+    buffer.close()
+    print("✅ Buffer flushes rows older than flush_interval")
+
+
+def test_backpressure():
+    """A full buffer makes add() wait, then raise VisitBufferFullError"""
+    buffer = VisitBuffer(flush_size=1000, flush_interval=60, max_rows=2, enqueue_timeout=0.1)
+    buffer.add(visit('/full/0'))
+    buffer.add(visit('/full/1'))
+    started = time.monotonic()
+    try:
+        buffer.add(visit('/full/2'))
+        raise AssertionError('add() to a full buffer did not raise')
+    except VisitBufferFullError:
+        pass
+    assert time.monotonic() - started >= 0.1 and buffer.stats()['rejected'] == 1
+
+    # A waiting add() goes through as soon as a flush frees space
+    buffer.enqueue_timeout = 5
+    threading.Timer(0.1, buffer.flush).start()
+    buffer.add(visit('/full/2'))
+    assert buffer.stats()['pending'] == 1 and count('/full/') == 2
+    buffer.close()
+    assert count('/full/') == 3
+    print("✅ Full buffer applies backpressure")
+
+
+def test_close_flushes_pending_rows():
+    """close() writes pending rows and refuses new ones"""
+    buffer = VisitBuffer(flush_size=1000, flush_interval=60)
+    for i in range(3):
+        buffer.add(visit(f'/close/{i}'))
+    buffer.close()
+    assert count('/close/') == 3
+    try:
+        buffer.add(visit('/close/late'))
+        raise AssertionError('add() after close() did not raise')
+    except VisitBufferFullError:
+        pass
+    print("✅ close() flushes pending rows")
+
+
+def test_failed_flush_is_retried():
+    """Rows of a failed flush are retried first, after a backoff"""
+    buffer = VisitBuffer(flush_size=1000, flush_interval=0.02, retry_backoff=0.05)
+    with FailingWrites(2) as writes:
+        buffer.add(visit('/first'))
+        buffer.add(visit('/second'))
+        assert wait_for(lambda: buffer.stats()['retries'] >= 1)
+        buffer.add(visit('/third'))
+        assert wait_for(lambda: buffer.stats()['flushed'] == 3)
+    stats = buffer.stats()
+    assert writes.failed == 2 and stats['retries'] == 2 and stats['dropped_rows'] == 0, stats
+    assert fetch("SELECT page_visited FROM visitors WHERE page_visited IN ('/first', '/second', '/third') "
+                 "ORDER BY id") == [('/first',), ('/second',), ('/third',)]
+    buffer.close()
+    print("✅ Failed flushes are retried in order")
+
+
+def test_shutdown_drops_only_after_retries():
+    """close() retries a failing flush, then drops the rows and counts them"""
+    buffer = VisitBuffer(flush_size=1000, flush_interval=60, retry_backoff=0.01, shutdown_retries=2)
+    buffer.add(visit('/lost'))
+    with FailingWrites(10) as writes:
+        buffer.close()
+    assert writes.failed == 3  # the first attempt and two retries
+    assert buffer.stats()['dropped_rows'] == 1 and buffer.stats()['pending'] == 0
+
+    # A flush that recovers within the retries loses nothing
+    buffer = VisitBuffer(flush_size=1000, flush_interval=60, retry_backoff=0.01, shutdown_retries=2)
+    buffer.add(visit('/kept'))
+    with FailingWrites(2):
+        buffer.close()
+    assert buffer.stats()['dropped_rows'] == 0
+    assert fetch("SELECT COUNT(*) FROM visitors WHERE page_visited = '/kept'") == [(1,)]
+    print("✅ Shutdown drops rows only after its retries")
+
+
+def setup_module():
+    db_config.init_database()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Visit Buffer Test ===")
+    setup_module()
+    try:
+        test_flush_on_size()
+        test_flush_on_age()
+        test_backpressure()
+        test_close_flushes_pending_rows()
+        test_failed_flush_is_retried()
+        test_shutdown_drops_only_after_retries()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
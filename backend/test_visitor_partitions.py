@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Test script for the monthly visitors partitions.
+Checks that rotation moves closed months out of the live table without
+changing what readers see, that it leaves visits still pending geo
+enrichment in the live table, that breakdowns only read the partitions in
+range, and that retention drops old partitions only once the rollups hold
+them and returns their pages to the filesystem.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'partition_test.db').lstrip('/')
+
+from database import db_config
+from services.analytics_engine import SQLAnalyticsEngine
+from services.data_export import TableExport
+from services.geo_enrichment import PENDING
+from services.visit_buffer import VisitBuffer
+from services.visitor_partitions import VisitorPartitions
+
+NOW = datetime(2024, 5, 15)
+
+
+def fetch(query, params=()):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query, params).fetchall()]
+
+
+def exported():
+    return [json.loads(line) for line in b''.join(TableExport('visitors').chunks()).decode().splitlines()]
+
+
+def seed():
+    """Visits on the 1st-28th of January to May 2024, through the buffer so the rollups count them"""
+    buffer = VisitBuffer()
+    for month in range(1, 6):
+        for i in range(200):
+            timestamp = f'2024-{month:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:00'
+            buffer.add((f'10.0.{month}.{i % 250}', 'agent', timestamp, ['Korea', 'Iceland'][i % 2], 'Seoul',
+                        None, f'/page/{i % 7}', ''))
+    buffer.flush()
+
+
+def test_rotation_keeps_readers_whole():
+    """Closed months move to partitions; exports, breakdowns and pages read the same"""
+    seed()
+    engine = SQLAnalyticsEngine()
+    before_rows = exported()
+    before_breakdown = engine.visitor_breakdown(['day', 'page'], limit=1000)
+    from app import app
+    client = app.test_client()
+    before_page = client.get('/api/analytics/recent-visitors?limit=50&before_id=450').get_json()['data']
+
+    partitions = VisitorPartitions(mode='monthly', batch_size=64)
+    assert partitions.rotate(datetime(2024, 5, 1, 12)) == 600  # April is still in its grace period
+
+    # A visit geo enrichment has not resolved yet stays live, with everything after it
+    pending_id = fetch("SELECT MIN(id) + 50 FROM visitors")[0][0]
+    country = fetch('SELECT country FROM visitors WHERE id = ?', (pending_id,))[0][0]
+    set_country = lambda value: db_config.execute_write(lambda cursor: cursor.execute(
+        'UPDATE visitors SET country = ? WHERE id = ?', (value, pending_id)
+    ))
+    set_country(PENDING)
+    assert partitions.rotate(NOW) == 50
+    assert partitions.rotate(NOW) == 0 and partitions.stats()['pending_holds'] == 3
+    set_country(country)
+    assert partitions.rotate(NOW) == 150
+    assert partitions.rotate(NOW) == 0
+    assert [p['table_name'] for p in partitions.partitions()] == [
+        'visitors_p202401', 'visitors_p202402', 'visitors_p202403', 'visitors_p202404'
+    ]
+    assert [p['row_count'] for p in partitions.partitions()] == [200] * 4
+    assert fetch("SELECT COUNT(*), MIN(timestamp) >= '2024-05-01' FROM visitors") == [(200, 1)]
+
+    assert exported() == before_rows
+    assert engine.visitor_breakdown(['day', 'page'], limit=1000) == before_breakdown
+    assert client.get('/api/analytics/recent-visitors?limit=50&before_id=450').get_json()['data'] == before_page
+    print("✅ Rotation keeps exports, breakdowns and pagination whole")
+
+
+def test_partition_pruning():
+    """Time-bounded breakdowns only read the partitions overlapping the range"""
+    partitions = VisitorPartitions(mode='monthly')
+    start, end = datetime(2024, 3, 10), datetime(2024, 3, 20)
+    assert partitions.tables(start, end) == ['visitors_p202403', 'visitors']
+    assert partitions.tables(datetime(2024, 5, 2)) == ['visitors']
+
+    rows = SQLAnalyticsEngine().visitor_breakdown(['country'], start, end)
+    expected = fetch('''
+        SELECT country, COUNT(*) FROM visitors_p202403
+        WHERE timestamp >= '2024-03-10' AND timestamp < '2024-03-20' GROUP BY 1
+    ''')
+    assert sorted((row['country'], row['visits']) for row in rows) == sorted(expected)
+    with db_config.connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT COUNT(*) FROM visitors_p202403 WHERE timestamp_epoch >= ?', (0,)
+        ))
+    assert 'idx_visitors_p202403_timestamp_epoch' in plan, plan
+    print("✅ Breakdowns prune partitions outside the range")
+
+
+def test_retention():
+    """Old partitions are dropped once folded into the rollups, then vacuumed"""
+    from app import app
+    client = app.test_client()
+    totals = client.get('/api/analytics').get_json()['data']
+    pages_before = fetch('PRAGMA page_count')[0][0]
+    assert fetch('PRAGMA auto_vacuum') == [(2,)]
+
+    # A day missing from the rollups keeps its partition
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "UPDATE analytics_daily_rollups SET visits = 1 WHERE dimension = 'total' AND bucket = '2024-02-03 00:00:00'"
+    ))
+    partitions = VisitorPartitions(mode='monthly', retention_months=2)
+    assert partitions.apply_retention(NOW) == 200
+    assert [p['month'] for p in partitions.partitions()] == ['2024-02', '2024-03', '2024-04']
+    assert partitions.stats()['skipped_unfolded'] == 1
+
+    db_config.execute_write(lambda cursor: cursor.execute(
+        "UPDATE analytics_daily_rollups SET visits = 8 WHERE dimension = 'total' AND bucket = '2024-02-03 00:00:00'"
+    ))
+    result = partitions.run_once(NOW)
+    assert result['dropped_rows'] == 200 and result['vacuumed_pages'] > 0, result
+    assert [p['month'] for p in partitions.partitions()] == ['2024-03', '2024-04']
+    assert fetch("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'visitors_p%' ORDER BY 1") == [
+        ('visitors_p202403',), ('visitors_p202404',)
+    ]
+    assert fetch('PRAGMA freelist_count') == [(0,)]
+    assert fetch('PRAGMA page_count')[0][0] < pages_before
+
+    # All-time totals come from the rollups and survive the dropped months
+    assert client.get('/api/analytics').get_json()['data']['total_visitors'] == totals['total_visitors']
+    assert len(exported()) == 600
+    print("✅ Retention drops folded partitions and releases their pages")
+
+
+def setup_module():
+    db_config.init_database()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Visitor Partitions Test ===")
+    setup_module()
+    try:
+        test_rotation_keeps_readers_whole()
+        test_partition_pruning()
+        test_retention()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for dictionary-encoded visitor strings.
+Covers interning at ingest, normalized storage, decoding on read, the
+migration of rows stored as plain text and id-based analytics grouping.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Point the global database at a scratch file before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'strings_test.db').lstrip('/')
+
+from database import DatabaseConfig, db_config
+from migrate_visitor_strings import migrate, storage_bytes
+from services.analytics_engine import SQLAnalyticsEngine
+from services.analytics_rollups import ROLLUP_TABLES
+from services.data_export import TableExport
+from services.visit_buffer import VISIT_COLUMNS, VisitBuffer
+from services.visitor_strings import VisitorStrings, visitor_strings
+
+AGENTS = ['Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0', 'curl/8.4.0', 'GitHub-Hookshot/abc']
+PAGES = ['/', '/projects', '/contact']
+
+
+def make_rows(count):
+    return [VisitBuffer.make_row(f'10.0.0.{i % 200}', AGENTS[i % 3], 'Korea', 'Seoul', None,
+                                 PAGES[i % 3], 'https://github.com' if i % 2 else '')
+            for i in range(count)]
+
+
+def fetch(query):
+    with db_config.connection() as conn:
+        return [tuple(row) for row in conn.execute(query).fetchall()]
+
+
+def exported_rows():
+    return [json.loads(line) for line in b''.join(TableExport('visitors').chunks()).decode().splitlines()]
+
+
+def test_ingest_interns_strings():
+    """Flushed visits store ids; repeated values are served from the cache"""
+    buffer = VisitBuffer()
+    for row in make_rows(30):
+        buffer.add(row)
+    buffer.flush()
+
+    assert fetch('SELECT COUNT(*) FROM visitor_user_agents') == [(3,)]
+    assert fetch('SELECT COUNT(*) FROM visitor_pages') == [(3,)]
+    assert fetch('SELECT COUNT(*) FROM visitor_referrers') == [(2,)]
+    assert fetch('SELECT COUNT(*) FROM visitors WHERE page_id IS NULL OR user_agent_id IS NULL') == [(0,)]
+
+    misses = visitor_strings.stats()['page_visited']['misses']
+    for row in make_rows(30):
+        buffer.add(row)
+    buffer.flush()
+    stats = visitor_strings.stats()['page_visited']
+    assert stats['misses'] == misses and stats['hits'] >= 3, stats
+    assert fetch('SELECT COUNT(*) FROM visitor_pages') == [(3,)]
+    print("✅ Ingest interns strings once and reuses cached ids")
+
+
+def test_normalized_rows_decode():
+    """Rows stored without their text read back identically"""
+    normalized = VisitorStrings(normalized=True)
+    rows = normalized.encode_rows(make_rows(3))
+    assert all(row[1] is None and row[6] is None and row[8] is not None for row in rows), rows
+    assert rows[1][7] is None and rows[1][-1] is not None  # referrer text cleared, id kept
+
+    columns = VISIT_COLUMNS + normalized.id_columns
+    db_config.execute_write(lambda cursor: cursor.executemany(
+        f"INSERT INTO visitors ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        rows
+    ))
+    added = exported_rows()[-3:]
+    assert [(row['user_agent'], row['page_visited'], row['referrer']) for row in added] == [
+        (AGENTS[0], PAGES[0], ''), (AGENTS[1], PAGES[1], 'https://github.com'), (AGENTS[2], PAGES[2], '')
+    ], added
+    print("✅ Normalized rows decode through the dictionaries")
+
+
+def test_migration_and_grouping():
+    """Plain-text rows group the same before and after migration"""
+    db_config.execute_write(lambda cursor: cursor.executemany(
+        'INSERT INTO visitors (ip_address, user_agent, page_visited, referrer) VALUES (?, ?, ?, ?)',
+        [('10.1.0.1', AGENTS[i % 3], PAGES[i % 3] if i % 5 else '/legacy', None) for i in range(40)]
+    ))
+    engine = SQLAnalyticsEngine()
+    expected = engine.visitor_breakdown(['page', 'referrer'])
+    assert {'page': '/legacy', 'referrer': '', 'visits': 8} in expected, expected
+    exported = exported_rows()
+
+    assert migrate(log=lambda message: None) == 40
+    assert fetch('SELECT COUNT(*) FROM visitors WHERE page_id IS NULL') == [(0,)]
+    assert engine.visitor_breakdown(['page', 'referrer']) == expected
+    assert migrate(log=lambda message: None) == 0
+
+    size = storage_bytes()
+    assert migrate(normalize=True, log=lambda message: None) == 100
+    assert fetch('SELECT COUNT(*) FROM visitors WHERE page_visited IS NOT NULL OR user_agent IS NOT NULL') == [(0,)]
+    assert engine.visitor_breakdown(['page', 'referrer']) == expected
+    assert exported_rows() == exported
+    assert size > 0
+    print("✅ Migration fills ids and normalizes without changing results")
+
+
+def test_rollup_backfill_groups_on_ids():
+    """Startup rollup backfill decodes page and referrer ids"""
+    def wipe(cursor):
+        for table in ROLLUP_TABLES.values():
+            cursor.execute(f'DELETE FROM {table}')
+    db_config.execute_write(wipe)
+
+    database = DatabaseConfig(os.environ['DATABASE_URL'])
+    database.init_database()
+    with database.connection() as conn:
+        pages = dict(conn.execute('''
+            SELECT value, SUM(visits) FROM analytics_daily_rollups WHERE dimension = 'page' GROUP BY value
+        ''').fetchall())
+    database.shutdown()
+    expected = {row['page']: row['visits'] for row in SQLAnalyticsEngine().visitor_breakdown(['page'])}
+    assert pages == expected, (pages, expected)
+    print("✅ Rollup backfill groups on dictionary ids")
+
+
+def setup_module():
+    db_config.init_database()
+
+
+def teardown_module():
+    db_config.shutdown()
+
+
+if __name__ == '__main__':
+    print("=== Visitor String Dictionaries Test ===")
+    setup_module()
+    try:
+        test_ingest_interns_strings()
+        test_normalized_rows_decode()
+        test_migration_and_grouping()
+        test_rollup_backfill_groups_on_ids()
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
+    finally:
+        teardown_module()
+    print("✅ All tests passed!")
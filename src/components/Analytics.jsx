@@ -20,7 +20,14 @@ function Analytics() {
       setLoading(true);
       setError(null);
       
-      const response = await apiService.getAnalytics();
+      // Summary totals and the visitor rows come from separate endpoints
+      const [response, recent] = await Promise.all([
+        apiService.getAnalytics(),
+        apiService.getRecentVisitors({
+          limit: 10,
+          fields: 'ip_address,timestamp,country,city,page_visited'
+        }).catch(() => null)
+      ]);
       
       if (response && response.data) {
         // Ensure all expected fields exist with defaults
@@ -30,7 +37,7 @@ function Analytics() {
           total_messages: response.data.total_messages || 0,
           visitors_by_country: response.data.visitors_by_country || [],
           visitors_by_page: response.data.visitors_by_page || [],
-          recent_visitors: response.data.recent_visitors || []
+          recent_visitors: recent?.data || []
         });
       } else {
         // Handle empty response
@@ -249,13 +256,13 @@ function Analytics() {
                     <span>Page</span>
                     <span>Time</span>
                   </div>
-                  {analytics.recent_visitors.slice(0, 10).map((visitor, index) => (
-                    <div key={index} className="analytics-row">
-                      <span>{visitor[1]?.substring(0, 12) || 'Unknown'}...</span>
-                      <span>{visitor[3] || "Unknown"}</span>
-                      <span>{visitor[4] || "Unknown"}</span>
-                      <span>{visitor[7] || "Home"}</span>
-                      <span>{visitor[2] ? new Date(visitor[2]).toLocaleDateString() : 'Unknown'}</span>
+                  {analytics.recent_visitors.slice(0, 10).map((visitor) => (
+                    <div key={visitor.id} className="analytics-row">
+                      <span>{visitor.ip_address?.substring(0, 12) || 'Unknown'}...</span>
+                      <span>{visitor.country || "Unknown"}</span>
+                      <span>{visitor.city || "Unknown"}</span>
+                      <span>{visitor.page_visited || "Home"}</span>
+                      <span>{visitor.timestamp ? new Date(visitor.timestamp).toLocaleDateString() : 'Unknown'}</span>
                     </div>
                   ))}
                 </>
@@ -11,6 +11,7 @@ export const API_CONFIG = {
   ENDPOINTS: {
     CONTACT: '/api/contact',
     ANALYTICS: '/api/analytics',
+    RECENT_VISITORS: '/api/analytics/recent-visitors',
     TRACK_VISIT: '/api/track-visit',
     DOWNLOAD_RESUME: '/api/download-resume',
     HEALTH: '/api/health'
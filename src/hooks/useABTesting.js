@@ -156,23 +156,32 @@ export const useMultipleABTests = (experiments) => {
 
         const getVariants = async () => {
             setLoading(true);
-            const newVariants = {};
+            let newVariants = {};
             const newErrors = {};
 
-            await Promise.all(
-                experiments.map(async (experiment) => {
-                    try {
-                        const variant = await abTestingService.getVariant(
-                            experiment.id, 
-                            experiment.options || {}
-                        );
-                        newVariants[experiment.id] = variant;
-                    } catch (err) {
-                        newErrors[experiment.id] = err.message;
-                        newVariants[experiment.id] = 'control'; // Fallback
-                    }
-                })
-            );
+            // One bulk request for the experiments without options; those
+            // with options (e.g. forceRefresh) keep their own request
+            const bulk = experiments.filter((experiment) => !experiment.options);
+            const single = experiments.filter((experiment) => experiment.options);
+            try {
+                const [bulkVariants, singleVariants] = await Promise.all([
+                    bulk.length > 0
+                        ? abTestingService.getVariants(bulk.map((experiment) => experiment.id))
+                        : {},
+                    Promise.all(single.map((experiment) => (
+                        abTestingService.getVariant(experiment.id, experiment.options)
+                    )))
+                ]);
+                newVariants = { ...bulkVariants };
+                single.forEach((experiment, index) => {
+                    newVariants[experiment.id] = singleVariants[index];
+                });
+            } catch (err) {
+                experiments.forEach((experiment) => {
+                    newErrors[experiment.id] = err.message;
+                    newVariants[experiment.id] = 'control'; // Fallback
+                });
+            }
 
             setVariants(newVariants);
             setErrors(newErrors);
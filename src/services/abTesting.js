@@ -126,6 +126,76 @@ class ABTestingService {
         }
     }
 
+    /**
+     * Get variant assignments for several experiments in one request.
+     * Without experimentIds, the user is assigned to every active experiment.
+     * options.forceRefresh skips the cache, as in getVariant().
+     * Returns { experimentId: variant }.
+     */
+    async getVariants(experimentIds = null, options = {}) {
+        const variants = {};
+        const pending = [];
+        for (const experimentId of experimentIds || []) {
+            const cacheKey = `variant_${experimentId}`;
+            if (this.cache.has(cacheKey) && !options.forceRefresh) {
+                variants[experimentId] = this.cache.get(cacheKey);
+            } else {
+                pending.push(experimentId);
+            }
+        }
+        if (experimentIds && pending.length === 0) {
+            return variants;
+        }
+
+        try {
+            const response = await fetch(`${this.apiBaseUrl}/assign`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(experimentIds ? { experiment_ids: pending } : {})
+            });
+
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            const data = await response.json();
+
+            if (data.status === 'success') {
+                const assignments = this.getStoredAssignments();
+                const assignedAt = new Date().toISOString();
+                for (const [experimentId, assignment] of Object.entries(data.assignments)) {
+                    this.cache.set(`variant_${experimentId}`, assignment.variant);
+                    assignments[experimentId] = {
+                        variant: assignment.variant,
+                        assignedAt,
+                        userId: data.user_id
+                    };
+                    variants[experimentId] = assignment.variant;
+                }
+                localStorage.setItem('ab_assignments', JSON.stringify(assignments));
+                for (const experimentId of data.not_found) {
+                    variants[experimentId] = 'control';
+                }
+                return variants;
+            } else {
+                throw new Error(data.error || 'Failed to get variant assignments');
+            }
+        } catch (error) {
+            console.error('Error getting variant assignments:', error);
+
+            // Fallback to stored assignments or default
+            const assignments = this.getStoredAssignments();
+            for (const experimentId of pending) {
+                variants[experimentId] = assignments[experimentId]
+                    ? assignments[experimentId].variant
+                    : 'control';
+            }
+            return variants;
+        }
+    }
+
     /**
      * Track conversion event
      */
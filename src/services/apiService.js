@@ -144,6 +144,25 @@ export const apiService = {
     }
   },
 
+  /**
+   * Get one page of recent visitors, newest first
+   * @param {Object} params - limit, before_id (cursor from next_before_id) and fields
+   * @returns {Promise} Visitor rows and the next_before_id cursor
+   */
+  async getRecentVisitors(params = {}) {
+    try {
+      const query = new URLSearchParams(params).toString();
+      const url = `${API_CONFIG.ENDPOINTS.RECENT_VISITORS}${query ? `?${query}` : ''}`;
+      return await retryApiCall(
+        () => apiClient.get(url),
+        API_CONFIG.RETRY_ATTEMPTS,
+        API_CONFIG.RETRY_DELAY
+      );
+    } catch (error) {
+      throw handleApiError(error, 'Recent Visitors Fetch');
+    }
+  },
+
   /**
    * Track visitor information
    * @param {Object} visitData - Visit tracking data
@@ -335,7 +354,7 @@ export const apiUtils = {
       totalMessages: data.total_messages || 0,
       visitorsByCountry: data.visitors_by_country || [],
       visitorsByPage: data.visitors_by_page || [],
-      recentVisitors: data.recent_visitors || []
+      visitorsByReferrer: data.visitors_by_referrer || []
     };
   }
 };
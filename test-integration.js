@@ -234,12 +234,12 @@ async function testAnalyticsAPI() {
       const analyticsData = data.data;
       const hasRealData = analyticsData.total_visitors > 0 || 
                          analyticsData.visitors_by_country.length > 0 ||
-                         analyticsData.recent_visitors.length > 0;
+                         analyticsData.visitors_by_page.length > 0;
       
       logTest('Analytics API', true, 
         `Analytics data retrieved - Visitors: ${analyticsData.total_visitors}, ` +
         `Countries: ${analyticsData.visitors_by_country.length}, ` +
-        `Recent: ${analyticsData.recent_visitors.length}, ` +
+        `Pages: ${analyticsData.visitors_by_page.length}, ` +
         `Has real data: ${hasRealData}`
       );
       return { success: true, hasRealData };